@@ -260,16 +260,19 @@ class AuthManager:
 
         # به‌روزرسانی زمان آخرین ورود
         last_login = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.db.execute_query("UPDATE users SET last_login = ? WHERE id = ?", (last_login, user[0]))
-
-        # ثبت فعالیت ورود
         ip_address = socket.gethostbyname(socket.gethostname())
-        self.db.log_activity(
-            user_id=user[0],
-            activity_type="login",
-            description=f"ورود به سیستم با نام کاربری {username}",
-            ip_address=ip_address
-        )
+
+        # زمان ورود و فعالیت ورود در یک واحد کاری ثبت می‌شوند
+        with self.db.transaction():
+            self.db.execute_query("UPDATE users SET last_login = ? WHERE id = ?", (last_login, user[0]))
+
+            # ثبت فعالیت ورود
+            self.db.log_activity(
+                user_id=user[0],
+                activity_type="login",
+                description=f"ورود به سیستم با نام کاربری {username}",
+                ip_address=ip_address
+            )
 
         self.login_dialog.accept()
 
@@ -722,26 +725,28 @@ class AuthManager:
             is_active = 1 if is_active_check.isChecked() else 0
 
             try:
-                if password:
-                    # اگر رمز عبور وارد شده باشد، آن را نیز به‌روزرسانی می‌کنیم
-                    self.db.execute_query(
-                        "UPDATE users SET password = ?, full_name = ?, email = ?, role = ?, is_active = ? WHERE id = ?",
-                        (password, full_name, email, role, is_active, user_id)
-                    )
-                else:
-                    # در غیر این صورت، رمز عبور را تغییر نمی‌دهیم
-                    self.db.execute_query(
-                        "UPDATE users SET full_name = ?, email = ?, role = ?, is_active = ? WHERE id = ?",
-                        (full_name, email, role, is_active, user_id)
+                # به‌روزرسانی کاربر و ثبت فعالیت در یک واحد کاری
+                with self.db.transaction():
+                    if password:
+                        # اگر رمز عبور وارد شده باشد، آن را نیز به‌روزرسانی می‌کنیم
+                        self.db.execute_query(
+                            "UPDATE users SET password = ?, full_name = ?, email = ?, role = ?, is_active = ? WHERE id = ?",
+                            (password, full_name, email, role, is_active, user_id)
+                        )
+                    else:
+                        # در غیر این صورت، رمز عبور را تغییر نمی‌دهیم
+                        self.db.execute_query(
+                            "UPDATE users SET full_name = ?, email = ?, role = ?, is_active = ? WHERE id = ?",
+                            (full_name, email, role, is_active, user_id)
+                        )
+
+                    # ثبت فعالیت
+                    self.db.log_activity(
+                        user_id=self.current_user['id'],
+                        activity_type="user_management",
+                        description=f"ویرایش کاربر: {user[1]}"
                     )
 
-                # ثبت فعالیت
-                self.db.log_activity(
-                    user_id=self.current_user['id'],
-                    activity_type="user_management",
-                    description=f"ویرایش کاربر: {user[1]}"
-                )
-
                 self.load_users()
                 QMessageBox.information(self.user_management_dialog, 'موفقیت', 'اطلاعات کاربر با موفقیت به‌روزرسانی شد.')
 
@@ -785,18 +790,20 @@ class AuthManager:
 
         if reply == QMessageBox.Yes:
             try:
-                # حذف فعالیت‌های کاربر
-                self.db.execute_query("DELETE FROM user_activities WHERE user_id = ?", (user_id,))
-
-                # حذف کاربر
-                self.db.execute_query("DELETE FROM users WHERE id = ?", (user_id,))
-
-                # ثبت فعالیت
-                self.db.log_activity(
-                    user_id=self.current_user['id'],
-                    activity_type="user_management",
-                    description=f"حذف کاربر: {username}"
-                )
+                # حذف کاربر، فعالیت‌های او و ثبت فعالیت حذف یا همه با هم انجام می‌شوند یا هیچ‌کدام
+                with self.db.transaction(durable=True):
+                    # حذف فعالیت‌های کاربر
+                    self.db.execute_query("DELETE FROM user_activities WHERE user_id = ?", (user_id,))
+
+                    # حذف کاربر
+                    self.db.execute_query("DELETE FROM users WHERE id = ?", (user_id,))
+
+                    # ثبت فعالیت
+                    self.db.log_activity(
+                        user_id=self.current_user['id'],
+                        activity_type="user_management",
+                        description=f"حذف کاربر: {username}"
+                    )
 
                 self.load_users()
                 self.load_activities()
@@ -838,14 +845,16 @@ class AuthManager:
         status_text = 'غیرفعال' if new_status == 0 else 'فعال'
 
         try:
-            self.db.execute_query("UPDATE users SET is_active = ? WHERE id = ?", (new_status, user_id))
+            # تغییر وضعیت و ثبت فعالیت در یک واحد کاری
+            with self.db.transaction():
+                self.db.execute_query("UPDATE users SET is_active = ? WHERE id = ?", (new_status, user_id))
 
-            # ثبت فعالیت
-            self.db.log_activity(
-                user_id=self.current_user['id'],
-                activity_type="user_management",
-                description=f"تغییر وضعیت کاربر {username} به {status_text}"
-            )
+                # ثبت فعالیت
+                self.db.log_activity(
+                    user_id=self.current_user['id'],
+                    activity_type="user_management",
+                    description=f"تغییر وضعیت کاربر {username} به {status_text}"
+                )
 
             self.load_users()
             QMessageBox.information(self.user_management_dialog, 'موفقیت', f'وضعیت کاربر به {status_text} تغییر یافت.')
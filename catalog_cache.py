@@ -0,0 +1,388 @@
+"""
+ماژول حافظه نهان ستونی کاتالوگ محصولات
+محصولات در آرایه‌های فشرده NumPy (یک آرایه برای هر ستون) در حافظه نگه داشته می‌شوند و
+پنجره‌های گزارش و آمار به جای پیمایش دوباره جدول products از این آرایه‌ها می‌خوانند.
+تغییرات از جدول product_changes (مهاجرت 7) خوانده می‌شوند و فقط سطرهای تغییر یافته
+دوباره بارگذاری می‌شوند.
+"""
+
+import threading
+
+import numpy as np
+
+from repository import ProductRepository, product_changes_since
+
+
+# ستون‌های نگهداری‌شده در حافظه نهان
+CATALOG_COLUMNS = (
+    'id', 'name', 'price', 'discount_price', 'category', 'category_id',
+    'stock', 'min_stock', 'barcode', 'image',
+)
+
+# ستون‌هایی که در آرایه‌ها نگهداری می‌شوند؛ نام دسته‌بندی از category_id و جدول
+# categories ساخته می‌شود تا تغییر نام دسته‌بندی نیازی به بارگذاری دوباره محصولات نداشته باشد
+_STORED_COLUMNS = tuple(name for name in CATALOG_COLUMNS if name != 'category')
+
+# ستون‌های عددی با نوع float64؛ مقدار NULL به صورت NaN نگهداری می‌شود
+NUMERIC_COLUMNS = ('price', 'discount_price', 'stock', 'min_stock')
+
+# ستون‌های صحیح با نوع int64؛ category_id خالی با 0 نگهداری می‌شود (مانند category_summary)
+INTEGER_COLUMNS = ('id', 'category_id')
+
+# ستون‌هایی که مقدار آنها در خروجی rows() به عدد صحیح تبدیل می‌شود
+_INTEGER_OUTPUT = ('id', 'category_id', 'stock', 'min_stock')
+
+# اگر تعداد محصولات تغییر یافته بیشتر از این مقدار باشد، کل کاتالوگ دوباره خوانده می‌شود
+FULL_RELOAD_THRESHOLD = 5000
+
+_INITIAL_CAPACITY = 64
+
+# کلیدهای مرتب‌سازی فهرست محصولات؛ معادل SORT_EXPRESSIONS در repository.py
+SORT_KEYS = ('name', 'price', 'stock')
+
+
+def _number(value):
+    """تبدیل مقدار ستون عددی به float (مقادیر خالی یا نامعتبر NaN می‌شوند)"""
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _empty_column(name, capacity):
+    if name in NUMERIC_COLUMNS:
+        return np.full(capacity, np.nan, dtype=np.float64)
+    if name in INTEGER_COLUMNS:
+        return np.zeros(capacity, dtype=np.int64)
+    return np.empty(capacity, dtype=object)
+
+
+class ProductCatalog:
+    """حافظه نهان ستونی محصولات
+
+    ترتیب سطرها در آرایه‌ها معنای خاصی ندارد (حذف با جابه‌جایی آخرین سطر انجام
+    می‌شود)؛ برای مرتب‌سازی از argsort() استفاده کنید. آرایه‌های برگردانده‌شده
+    توسط column() تا refresh() بعدی معتبر هستند و نباید تغییر داده شوند.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._lock = threading.RLock()
+        self._size = 0
+        self._columns = {name: _empty_column(name, _INITIAL_CAPACITY) for name in _STORED_COLUMNS}
+        self._positions = {}
+        # نام دسته‌بندی‌ها بر اساس شناسه و ستون category ساخته‌شده برای نسخه فعلی
+        self._category_names = {}
+        self._category_column = None
+        self._category_version = None
+        # شماره آخرین تغییر اعمال‌شده از product_changes (None یعنی هنوز بارگذاری نشده)
+        self._last_seq = None
+        # با هر تغییر داده‌ها افزایش می‌یابد؛ ترتیب‌های محاسبه‌شده به آن وابسته‌اند
+        self.version = 0
+        self._orders = {}
+        self._orders_version = None
+
+    def __len__(self):
+        return self._size
+
+    # ---- همگام‌سازی با پایگاه داده ----
+
+    @property
+    def loaded(self):
+        return self._last_seq is not None
+
+    def refresh(self, conn=None):
+        """اعمال تغییرات ثبت‌شده از آخرین همگام‌سازی
+
+        اگر تغییری نباشد فقط دو جستجوی کلید اصلی و خواندن جدول کوچک categories
+        انجام می‌شود.
+
+        Args:
+            conn (sqlite3.Connection): اتصال خواندنی در دسترس (مثلاً در کارهای نخ کارگر)؛
+                اگر داده نشود یک اتصال از مجموعه اتصال‌ها گرفته می‌شود
+
+        Returns:
+            bool: True اگر داده‌های حافظه نهان تغییر کرده باشند
+        """
+        if conn is None:
+            with self.manager.reader() as conn:
+                return self.refresh(conn)
+
+        with self._lock:
+            # شماره آخرین تغییر پیش از خواندن سطرها گرفته می‌شود؛ تغییری که در این فاصله
+            # ثبت شود در همگام‌سازی بعدی دوباره (و بی‌ضرر) اعمال می‌شود
+            max_seq, changed = product_changes_since(conn, self._last_seq)
+            category_names = dict(conn.execute("SELECT id, name FROM categories").fetchall())
+            renamed = category_names != self._category_names
+            self._category_names = category_names
+            if changed == []:
+                if renamed:
+                    self.version += 1
+                return renamed
+
+            # بارگذاری اول، پایگاه داده جایگزین‌شده، یا تغییراتی که دیگر در جدول نیستند
+            if changed is None or len(changed) > FULL_RELOAD_THRESHOLD:
+                self._load_all(conn)
+            else:
+                self._patch(conn, changed)
+
+            self._last_seq = max_seq
+            self.version += 1
+            return True
+
+    def invalidate(self):
+        """کنار گذاشتن داده‌ها؛ refresh() بعدی کل کاتالوگ را دوباره می‌خواند"""
+        with self._lock:
+            self._last_seq = None
+
+    def _load_all(self, conn):
+        rows = conn.execute(
+            "SELECT " + ", ".join(_STORED_COLUMNS) + " FROM products"
+        ).fetchall()
+        size = len(rows)
+        capacity = max(_INITIAL_CAPACITY, size + size // 4)
+
+        columns = {}
+        values_by_column = zip(*rows) if rows else [()] * len(_STORED_COLUMNS)
+        for name, values in zip(_STORED_COLUMNS, values_by_column):
+            column = _empty_column(name, capacity)
+            if name in NUMERIC_COLUMNS:
+                column[:size] = np.fromiter((_number(v) for v in values), np.float64, count=size)
+            elif name in INTEGER_COLUMNS:
+                column[:size] = np.fromiter((v or 0 for v in values), np.int64, count=size)
+            else:
+                column[:size] = values
+            columns[name] = column
+
+        self._columns = columns
+        self._size = size
+        self._positions = {int(product_id): i for i, product_id in enumerate(columns['id'][:size].tolist())}
+
+    def _patch(self, conn, product_ids):
+        """بارگذاری دوباره محصولات تغییر یافته و حذف محصولات حذف‌شده"""
+        products = ProductRepository(conn).get_many(product_ids)
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None:
+                self._remove(product_id)
+                continue
+
+            position = self._positions.get(product_id)
+            if position is None:
+                self._ensure_capacity(self._size + 1)
+                position = self._size
+                self._size += 1
+                self._positions[product_id] = position
+            self._store(position, product)
+
+    def _store(self, position, product):
+        for name in _STORED_COLUMNS:
+            value = getattr(product, name)
+            if name in NUMERIC_COLUMNS:
+                value = _number(value)
+            elif name in INTEGER_COLUMNS:
+                value = value or 0
+            self._columns[name][position] = value
+
+    def _remove(self, product_id):
+        position = self._positions.pop(product_id, None)
+        if position is None:
+            return
+        last = self._size - 1
+        if position != last:
+            # آخرین سطر به جای سطر حذف‌شده منتقل می‌شود
+            for column in self._columns.values():
+                column[position] = column[last]
+            self._positions[int(self._columns['id'][position])] = position
+        for name, column in self._columns.items():
+            column[last] = _empty_column(name, 1)[0]
+        self._size = last
+
+    def _ensure_capacity(self, size):
+        capacity = len(self._columns['id'])
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for name, column in self._columns.items():
+            grown = _empty_column(name, capacity)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    # ---- خواندن ----
+
+    def column(self, name):
+        """آرایه یک ستون (فقط سطرهای موجود)"""
+        if name == 'category':
+            return self._categories()
+        return self._columns[name][:self._size]
+
+    def _categories(self):
+        """نام دسته‌بندی هر سطر از روی category_id (برای هر نسخه داده یک بار ساخته می‌شود)"""
+        with self._lock:
+            if self._category_version != self.version:
+                names = self._category_names
+                column = np.empty(self._size, dtype=object)
+                column[:] = [names.get(category_id) for category_id in self.column('category_id').tolist()]
+                self._category_column = column
+                self._category_version = self.version
+            return self._category_column
+
+    def position(self, product_id):
+        """شماره سطر یک محصول در آرایه‌ها یا None"""
+        return self._positions.get(int(product_id))
+
+    def argsort(self, name, descending=False):
+        """ترتیب سطرها بر اساس یک ستون (مقادیر خالی مانند SQLite ابتدا قرار می‌گیرند)"""
+        values = self.column(name)
+        if name in NUMERIC_COLUMNS:
+            order = np.argsort(np.where(np.isnan(values), -np.inf, values), kind='stable')
+        elif name in INTEGER_COLUMNS:
+            order = np.argsort(values, kind='stable')
+        else:
+            keys = [(value is not None, str(value) if value is not None else '') for value in values.tolist()]
+            order = np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int64)
+        return order[::-1] if descending else order
+
+    # ---- مرتب‌سازی و فیلتر درون حافظه ----
+
+    def _sort_key(self, sort):
+        """مقادیر کلید مرتب‌سازی بدون NULL، همانند SORT_EXPRESSIONS"""
+        if sort == 'price':
+            discount = self.column('discount_price')
+            key = np.where(np.isnan(discount), self.column('price'), discount)
+            return np.nan_to_num(key, nan=0.0)
+        if sort == 'stock':
+            return np.nan_to_num(self.column('stock'), nan=0.0)
+        names = np.empty(self._size, dtype=object)
+        names[:] = ['' if name is None else str(name) for name in self.column('name').tolist()]
+        return names
+
+    def ordered(self, sort='name', category_id=None):
+        """ترتیب سطرها بر اساس (کلید مرتب‌سازی، شناسه) و در صورت نیاز فقط یک دسته‌بندی
+
+        نتیجه برای هر نسخه داده نگه داشته می‌شود، پس تغییر پیاپی مرتب‌سازی و
+        فیلتر روی داده‌های بدون تغییر هزینه‌ای جز یک جستجوی دیکشنری ندارد.
+
+        Returns:
+            tuple: (شماره سطرها، کلیدهای مرتب، شناسه‌های مرتب)
+        """
+        sort = sort if sort in SORT_KEYS else 'name'
+        with self._lock:
+            if self._orders_version != self.version:
+                self._orders = {}
+                self._orders_version = self.version
+
+            cache_key = (sort, category_id)
+            order = self._orders.get(cache_key)
+            if order is not None:
+                return order
+
+            full = self._orders.get((sort, None))
+            if full is None:
+                ids = self.column('id')
+                by_id = np.argsort(ids, kind='stable')
+                keys = self._sort_key(sort)[by_id]
+                # مرتب‌سازی پایدار کلید روی سطرهای مرتب‌شده با شناسه، ترتیب (کلید، شناسه) می‌دهد
+                by_key = np.argsort(keys, kind='stable')
+                positions = by_id[by_key]
+                full = self._orders[(sort, None)] = (positions, keys[by_key], ids[positions])
+            if category_id is None:
+                return full
+
+            positions, keys, ids = full
+            selected = self.column('category_id')[positions] == int(category_id)
+            order = self._orders[cache_key] = (positions[selected], keys[selected], ids[selected])
+            return order
+
+    def page(self, columns, sort='name', category_id=None, after=None, limit=500, ids=None):
+        """یک صفحه از محصولات مرتب‌شده، با همان قالب سطرهای page_query در repository.py
+
+        Args:
+            columns (tuple): نام ستون‌های کاتالوگ
+            sort (str): یکی از SORT_KEYS
+            category_id (int): محدود کردن به یک دسته‌بندی یا None
+            after (tuple): کلید (کلید مرتب‌سازی، شناسه) آخرین سطر صفحه قبل
+            limit (int): تعداد سطرهای صفحه
+            ids (list): فقط این شناسه‌ها (برای به‌روزرسانی سطرهای تغییر یافته)
+
+        Returns:
+            list: تاپل‌های ستون‌ها؛ دو مقدار آخر هر سطر کلید مرتب‌سازی و شناسه هستند
+        """
+        with self._lock:
+            positions, keys, sorted_ids = self.ordered(sort, category_id)
+            if ids is not None:
+                wanted = np.isin(sorted_ids, np.array([int(i) for i in ids], dtype=np.int64))
+                selected = np.flatnonzero(wanted)
+            else:
+                start = 0
+                if after is not None:
+                    # سطرهای هم‌کلید به ترتیب شناسه هستند
+                    low = int(np.searchsorted(keys, after[0], side='left'))
+                    high = int(np.searchsorted(keys, after[0], side='right'))
+                    start = low + int(np.searchsorted(sorted_ids[low:high], after[1], side='right'))
+                selected = np.arange(start, min(start + int(limit), len(positions)))
+
+            rows = self.rows(columns, positions[selected])
+            key_values = keys[selected].tolist()
+            if sort == 'stock':
+                key_values = [int(value) for value in key_values]
+            return [row + (key, product_id)
+                    for row, key, product_id in zip(rows, key_values, sorted_ids[selected].tolist())]
+
+    def rows(self, columns=CATALOG_COLUMNS, positions=None):
+        """ساخت سطرهای تاپل از آرایه‌ها
+
+        Args:
+            columns (tuple): نام ستون‌ها به ترتیب مورد نظر
+            positions: آرایه شماره سطرها یا ماسک بولی (None یعنی همه سطرها)
+
+        Returns:
+            list: فهرست تاپل‌ها با None به جای مقادیر خالی
+        """
+        values_by_column = []
+        for name in columns:
+            values = self.column(name)
+            if positions is not None:
+                values = values[positions]
+            if name in NUMERIC_COLUMNS:
+                integer = name in _INTEGER_OUTPUT
+                values = [None if v != v else (int(v) if integer else v) for v in values.tolist()]
+            elif name == 'category_id':
+                values = [v or None for v in values.tolist()]
+            else:
+                values = values.tolist()
+            values_by_column.append(values)
+        return list(zip(*values_by_column))
+
+    def get(self, product_id, columns=CATALOG_COLUMNS):
+        """یک محصول به صورت تاپل یا None"""
+        position = self.position(product_id)
+        if position is None:
+            return None
+        return self.rows(columns, np.array([position]))[0]
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(manager, refresh=True):
+    """دریافت حافظه نهان مشترک کاتالوگ برای یک مدیر اتصال، به‌روزشده با آخرین تغییرات
+
+    Args:
+        manager (ConnectionManager): مدیر اتصال پایگاه داده
+        refresh (bool): همگام‌سازی با آخرین تغییرات پیش از برگرداندن
+
+    Returns:
+        ProductCatalog: نمونه مشترک این مدیر اتصال
+    """
+    with _catalogs_lock:
+        catalog = _catalogs.get(id(manager))
+        if catalog is None or catalog.manager is not manager:
+            catalog = ProductCatalog(manager)
+            _catalogs[id(manager)] = catalog
+    if refresh:
+        catalog.refresh()
+    return catalog
@@ -0,0 +1,441 @@
+"""
+ماژول مدیریت اتصال به پایگاه داده
+این ماژول یک اتصال نویسنده و مجموعه‌ای از اتصال‌های خواندنی مشترک را برای همه بخش‌های برنامه فراهم می‌کند
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from query_profiler import ProfilingConnection, ProfilingCursor
+
+
+# مسیر پیش‌فرض فایل پایگاه داده
+DEFAULT_DB_NAME = 'products.db'
+
+# تنظیمات پیش‌فرض PRAGMA برای همه اتصال‌ها
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',   # در حالت WAL بدون از دست رفتن یکپارچگی، fsync کمتری انجام می‌شود
+    'cache_size': -32000,      # حدود 32 مگابایت حافظه نهان صفحات (مقدار منفی یعنی کیلوبایت)
+    'mmap_size': 268435456,    # نگاشت 256 مگابایت از فایل در حافظه
+    'busy_timeout': 5000,      # انتظار 5 ثانیه‌ای به جای خطای database is locked
+    'temp_store': 'MEMORY',
+}
+
+# آستانه‌های پیش‌فرض ثبت گروهی: تعداد واحدهای کاری یا ثانیه‌های انتظار پیش از COMMIT
+DEFAULT_GROUP_COMMIT_SIZE = 50
+DEFAULT_GROUP_COMMIT_INTERVAL = 0.25
+
+
+class _WriterCursor(ProfilingCursor):
+    """مکان‌نمای اتصال نویسنده که هر دستور و خواندن نتیجه را زیر قفل نوشتن انجام می‌دهد
+
+    بنابراین دستورات نخ رابط کاربری هرگز وسط تراکنش یک کار پس‌زمینه (مثلاً یک
+    نقطه بازیابی وارد کردن فایل) اجرا نمی‌شوند و سطرهای ثبت‌نشده آن را نمی‌بینند.
+    """
+
+    def execute(self, sql, parameters=()):
+        with self.connection._locked(sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with self.connection._locked(sql):
+            return super().executemany(sql, seq_of_parameters)
+
+    def fetchone(self):
+        with self.connection._locked():
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        with self.connection._locked():
+            return super().fetchmany() if size is None else super().fetchmany(size)
+
+    def fetchall(self):
+        with self.connection._locked():
+            return super().fetchall()
+
+    def __next__(self):
+        with self.connection._locked():
+            return super().__next__()
+
+
+class _WriterConnection(ProfilingConnection):
+    """اتصال نویسنده‌ای که از واحدهای کاری در انتظار ثبت محافظت می‌کند
+
+    کدهای قدیمی‌تر پس از خطا rollback() را صدا می‌زنند. اگر واحدهای کاری
+    کامل‌شده‌ای در انتظار ثبت باشند، فقط تغییرات پس از آخرین واحد کامل
+    برگردانده می‌شود و بقیه ثبت می‌گردند.
+
+    کدهای قدیمی‌تر بیرون از transaction() هم تغییر می‌دهند و خودشان commit()
+    یا rollback() را صدا می‌زنند؛ تراکنش ضمنی چنین کدی قفل نوشتن را تا همان
+    commit() یا rollback() نگه می‌دارد تا نخ دیگری وسط آن ننویسد یا آن را ثبت نکند.
+    """
+
+    manager = None
+    # آیا قفل نوشتن برای یک تراکنش ضمنی کد قدیمی نگه داشته شده است
+    _implicit_lock = False
+
+    def cursor(self, factory=_WriterCursor):
+        return super().cursor(factory)
+
+    @contextmanager
+    def _locked(self, sql=None):
+        manager = self.manager
+        if manager is None:
+            # هنگام پیکربندی اتصال، پیش از ثبت در مدیر اتصال
+            yield
+            return
+        with manager.write_lock:
+            started = not self.in_transaction
+            yield
+            if (sql is not None and started and self.in_transaction and manager._depth == 0
+                    and not self._implicit_lock and sql.lstrip()[:5].upper() != 'BEGIN'):
+                # sqlite3 پیش از این دستور تراکنش ضمنی باز کرده است
+                manager.write_lock.acquire()
+                self._implicit_lock = True
+
+    def _release_implicit_lock(self):
+        if self._implicit_lock:
+            self._implicit_lock = False
+            self.manager.write_lock.release()
+
+    def commit(self):
+        with self._locked():
+            super().commit()
+            if self.manager is not None:
+                self.manager._reset_pending()
+                self._release_implicit_lock()
+
+    def rollback(self):
+        with self._locked():
+            manager = self.manager
+            if manager is not None and manager._pending and self.in_transaction:
+                try:
+                    self.execute("ROLLBACK TO group_mark")
+                except sqlite3.OperationalError:
+                    super().rollback()
+                    manager._reset_pending()
+                    self._release_implicit_lock()
+                else:
+                    self.commit()
+                return
+            super().rollback()
+            if manager is not None:
+                manager._reset_pending()
+                self._release_implicit_lock()
+
+
+class ConnectionManager:
+    """کلاس مدیریت اتصال‌های پایگاه داده
+
+    یک اتصال نویسنده (که همه تغییرات از طریق آن انجام می‌شود) و یک مجموعه
+    کوچک از اتصال‌های فقط‌خواندنی در اختیار اجزای برنامه قرار می‌دهد. پایگاه داده
+    در حالت WAL باز می‌شود تا خواننده‌ها پشت نوشتن‌ها متوقف نشوند.
+    """
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, read_pool_size=3, pragmas=None,
+                 group_commit_size=DEFAULT_GROUP_COMMIT_SIZE,
+                 group_commit_interval=DEFAULT_GROUP_COMMIT_INTERVAL):
+        self.db_name = db_name
+        self.read_pool_size = read_pool_size
+        self.group_commit_size = group_commit_size
+        self.group_commit_interval = group_commit_interval
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        # قفل نوشتن برای جلوگیری از استفاده هم‌زمان چند نخ از اتصال نویسنده
+        self.write_lock = threading.RLock()
+
+        self._writer = None
+        self._readers = queue.Queue()
+        self._readers_created = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
+        # وضعیت واحدهای کاری: عمق تو در تویی، تعداد واحدهای ثبت‌نشده و زمان اولین آن‌ها
+        self._depth = 0
+        self._pending = 0
+        self._pending_since = None
+        self._flush_timer = None
+
+    def _is_memory_db(self):
+        return self.db_name == ':memory:' or self.db_name.startswith('file::memory:')
+
+    def _configure(self, conn, read_only=False):
+        """اعمال تنظیمات PRAGMA روی یک اتصال جدید"""
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+
+    def _open(self, read_only=False):
+        # حافظه نهان دستورات آماده‌شده بزرگ‌تر از پیش‌فرض برای مخزن‌های داده
+        factory = ProfilingConnection if read_only else _WriterConnection
+        conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                               cached_statements=256, factory=factory)
+        if not read_only:
+            conn.manager = self
+        self._configure(conn, read_only)
+        return conn
+
+    @property
+    def writer(self):
+        """اتصال نویسنده مشترک (در اولین استفاده ایجاد می‌شود)"""
+        if self._writer is None:
+            with self.write_lock:
+                if self._writer is None:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError("Connection manager is closed")
+                    conn = self._open()
+                    if not self._is_memory_db():
+                        # حالت WAL در خود فایل ذخیره می‌شود و برای همه نمونه‌های برنامه اعمال می‌گردد
+                        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+                        if mode.lower() != 'wal':
+                            print(f"Warning: could not enable WAL mode (journal_mode={mode})")
+                    self._writer = conn
+        return self._writer
+
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._readers_created < self.read_pool_size:
+                self._readers_created += 1
+                try:
+                    return self._open(read_only=True)
+                except Exception:
+                    self._readers_created -= 1
+                    raise
+
+        # همه اتصال‌های خواندنی در حال استفاده هستند؛ منتظر آزاد شدن یکی می‌مانیم
+        return self._readers.get()
+
+    def _release_reader(self, conn):
+        if self._closed:
+            conn.close()
+        else:
+            self._readers.put(conn)
+
+    @contextmanager
+    def reader(self):
+        """دریافت موقت یک اتصال فقط‌خواندنی از مجموعه اتصال‌ها
+
+        برای پایگاه داده درون حافظه، اتصال‌های جداگانه داده مشترکی نمی‌بینند،
+        بنابراین در این حالت اتصال نویسنده برگردانده می‌شود.
+        """
+        if self._is_memory_db():
+            with self.write_lock:
+                yield self.writer
+            return
+
+        # خواننده‌ها باید تغییرات ثبت‌شده در واحدهای کاری قبلی را ببینند
+        if self._pending:
+            self.flush()
+
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._release_reader(conn)
+
+    @contextmanager
+    def transaction(self, durable=False):
+        """اجرای یک واحد کاری منطقی روی اتصال نویسنده
+
+        چند عملیات مرتبط (مثلاً ذخیره محصول، ثبت تاریخچه موجودی و ثبت فعالیت)
+        داخل یک بلوک with قرار می‌گیرند و یا همه اعمال می‌شوند یا هیچ‌کدام.
+        بلوک‌های تو در تو به صورت SAVEPOINT اجرا می‌شوند.
+
+        واحدهای کامل‌شده بلافاصله COMMIT نمی‌شوند؛ چند واحد پشت سر هم در یک
+        تراکنش جمع می‌شوند و وقتی تعداد آن‌ها به group_commit_size برسد یا
+        group_commit_interval ثانیه بگذرد، با یک COMMIT (و یک fsync) ثبت می‌شوند.
+
+        Args:
+            durable (bool): در صورت True، بلافاصله پس از پایان بلوک COMMIT انجام می‌شود
+
+        Yields:
+            sqlite3.Connection: اتصال نویسنده
+        """
+        with self.write_lock:
+            conn = self.writer
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            savepoint = f"unit_{self._depth}"
+            conn.execute(f"SAVEPOINT {savepoint}")
+            self._depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._depth -= 1
+                if conn.in_transaction:
+                    conn.execute(f"ROLLBACK TO {savepoint}")
+                    conn.execute(f"RELEASE {savepoint}")
+                    if self._depth == 0:
+                        # تراکنش بیرونی نباید قفل نوشتن را بی‌مدت نگه دارد (نمونه‌های دیگر برنامه
+                        # منتظر می‌مانند)؛ واحدهای کامل قبلی با زمان‌سنج و در غیر این صورت فوراً ثبت می‌شوند
+                        if self._pending:
+                            self._schedule_flush()
+                        else:
+                            self.flush()
+                raise
+            self._depth -= 1
+
+            if not conn.in_transaction:
+                # کد داخل بلوک خودش COMMIT کرده است
+                return
+            conn.execute(f"RELEASE {savepoint}")
+            if self._depth > 0:
+                return
+
+            # نشانه پایان آخرین واحد کامل؛ rollback بعدی فقط تا این نقطه برمی‌گردد
+            conn.execute("SAVEPOINT group_mark")
+            self._pending += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+
+            if (durable or self._pending >= self.group_commit_size
+                    or time.monotonic() - self._pending_since >= self.group_commit_interval):
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    @contextmanager
+    def bulk_transaction(self):
+        """اجرای یک عملیات نوشتن حجیم (مثلاً وارد کردن فایل) در یک تراکنش جداگانه
+
+        برخلاف transaction() هیچ SAVEPOINTی باز نمی‌شود: SQLite صفحات تغییرکرده داخل
+        هر savepoint تو در تو را در یک زیرژورنال (با temp_store=MEMORY در حافظه) نگه
+        می‌دارد که برای صدها هزار سطر درج را ده‌ها برابر کند می‌کند. واحدهای کاری در
+        انتظار پیش از شروع ثبت می‌شوند و در صورت خطا کل عملیات برگردانده می‌شود.
+
+        Yields:
+            sqlite3.Connection: اتصال نویسنده
+        """
+        with self.write_lock:
+            if self._depth > 0:
+                # داخل یک واحد کاری دیگر؛ به صورت بخشی از همان واحد اجرا می‌شود
+                with self.transaction() as conn:
+                    yield conn
+                return
+
+            conn = self.writer
+            self.flush()
+            conn.execute("BEGIN IMMEDIATE")
+            # تا پایان عملیات، ثبت گروهی زمان‌دار تراکنش را نیمه‌کاره COMMIT نمی‌کند
+            self._depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._depth -= 1
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            self._depth -= 1
+            if conn.in_transaction:
+                conn.commit()
+
+    def flush(self):
+        """ثبت فوری همه واحدهای کاری در انتظار"""
+        with self.write_lock:
+            if self._depth > 0:
+                return
+            if self._writer is not None and self._writer.in_transaction:
+                self._writer.commit()
+            else:
+                self._reset_pending()
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(self.group_commit_interval, self._timed_flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _timed_flush(self):
+        with self.write_lock:
+            self._flush_timer = None
+            if not self._pending:
+                return
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error in group commit: {e}")
+
+    def _reset_pending(self):
+        self._pending = 0
+        self._pending_since = None
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def checkpoint(self, mode='PASSIVE'):
+        """انتقال صفحات فایل WAL به فایل اصلی پایگاه داده"""
+        if self._writer is None or self._is_memory_db():
+            return
+        with self.write_lock:
+            self._writer.execute(f"PRAGMA wal_checkpoint({mode})")
+
+    def close(self):
+        """بستن همه اتصال‌ها"""
+        self._closed = True
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self.write_lock:
+            if self._writer is not None:
+                try:
+                    self._depth = 0
+                    self.flush()
+                except sqlite3.Error as e:
+                    print(f"Error committing pending changes: {e}")
+                try:
+                    self._writer.execute("PRAGMA optimize")
+                except sqlite3.Error:
+                    pass
+                self._writer.close()
+                self._writer = None
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_name=DEFAULT_DB_NAME):
+    """دریافت مدیر اتصال مشترک برای یک فایل پایگاه داده
+
+    Args:
+        db_name (str): مسیر فایل پایگاه داده
+
+    Returns:
+        ConnectionManager: نمونه مشترک برای این مسیر
+    """
+    key = db_name if db_name == ':memory:' else os.path.abspath(db_name)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None or manager._closed:
+            manager = ConnectionManager(db_name)
+            _managers[key] = manager
+        return manager
+
+
+@atexit.register
+def close_all_connections():
+    """بستن همه مدیرهای اتصال هنگام خروج از برنامه"""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        try:
+            manager.close()
+        except Exception as e:
+            print(f"Error closing database connections: {e}")
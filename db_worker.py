@@ -0,0 +1,175 @@
+"""
+ماژول اجرای پرس‌وجوهای پایگاه داده در پس‌زمینه
+کارها در نخ‌های جداگانه اجرا می‌شوند و نتیجه از طریق سیگنال‌های Qt به نخ رابط کاربری برمی‌گردد
+تا حلقه رویداد Qt هیچ‌گاه پشت SQLite متوقف نشود
+"""
+
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+# تعداد دستورات ماشین مجازی SQLite بین هر بار بررسی لغو کار
+PROGRESS_HANDLER_STEPS = 1000
+
+
+class JobCancelled(Exception):
+    """کار توسط کار جدیدتر یا به درخواست کاربر لغو شده است"""
+
+
+class _JobSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+
+
+class DatabaseJob(QRunnable):
+    """یک کار پایگاه داده که در مجموعه نخ‌های کارگر اجرا می‌شود
+
+    تابع کار با دو آرگومان (اتصال، کار) صدا زده می‌شود. توابع طولانی می‌توانند
+    با job.check_cancelled() و job.report_progress() لغو را بررسی و پیشرفت را گزارش کنند.
+    """
+
+    def __init__(self, manager, fn, write=False, atomic=True):
+        super().__init__()
+        self.setAutoDelete(True)
+        self.manager = manager
+        self.fn = fn
+        self.write = write
+        self.atomic = atomic
+        # شیء سیگنال‌ها در نخ رابط کاربری ساخته می‌شود تا سیگنال‌ها در همان نخ تحویل شوند
+        self.signals = _JobSignals()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """لغو کار؛ پرس‌وجوی در حال اجرا با interrupt متوقف می‌شود"""
+        self._cancelled.set()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, done, total):
+        if not self._cancelled.is_set():
+            self.signals.progress.emit(done, total)
+
+    def _progress_handler(self):
+        # مقدار غیرصفر باعث توقف دستور جاری با خطای interrupted می‌شود
+        return 1 if self._cancelled.is_set() else 0
+
+    def _run_read(self):
+        with self.manager.reader() as conn:
+            conn.set_progress_handler(self._progress_handler, PROGRESS_HANDLER_STEPS)
+            try:
+                return self.fn(conn, self)
+            finally:
+                conn.set_progress_handler(None, 0)
+
+    def _run_write(self):
+        if not self.atomic:
+            # تابع کار خودش تراکنش‌ها را باز و ثبت می‌کند (مثلاً با job.manager.bulk_transaction())
+            return self.fn(self.manager.writer, self)
+        with self.manager.transaction() as conn:
+            result = self.fn(conn, self)
+            self.check_cancelled()
+            return result
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            result = self._run_write() if self.write else self._run_read()
+        except JobCancelled:
+            return
+        except Exception as e:
+            # خطای interrupted ناشی از لغو کار گزارش نمی‌شود
+            if not self.cancelled:
+                self.signals.failed.emit(str(e))
+            return
+
+        if not self.cancelled:
+            self.signals.finished.emit(result)
+
+
+class DatabaseWorker(QObject):
+    """زمان‌بند کارهای پایگاه داده
+
+    کارهای خواندنی در چند نخ (به تعداد اتصال‌های خواندنی مدیر اتصال) و کارهای
+    نوشتنی در یک نخ اجرا می‌شوند. کارهایی که با یک کانال (channel) ثبت شوند،
+    کار قبلی همان کانال را لغو می‌کنند؛ مثلاً با هر تغییر فیلتر فقط نتیجه آخرین
+    پرس‌وجو به جدول می‌رسد.
+    """
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+
+        self.read_pool = QThreadPool(self)
+        self.read_pool.setMaxThreadCount(max(1, manager.read_pool_size))
+
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+
+        self._channels = {}
+
+    def submit(self, fn, on_result=None, on_error=None, on_progress=None, channel=None, write=False,
+               atomic=True):
+        """ثبت یک کار جدید
+
+        Args:
+            fn (callable): تابعی با امضای fn(conn, job) که در نخ کارگر اجرا می‌شود
+            on_result (callable): دریافت نتیجه در نخ رابط کاربری
+            on_error (callable): دریافت پیام خطا در نخ رابط کاربری
+            on_progress (callable): دریافت (انجام‌شده، کل) در نخ رابط کاربری
+            channel (str): نام کانال؛ کار قبلی همین کانال لغو می‌شود
+            write (bool): اجرای کار روی اتصال نویسنده در یک واحد کاری
+            atomic (bool): برای کارهای نوشتنی؛ با False کار در یک واحد کاری پیچیده
+                نمی‌شود و خودش تغییرات را مرحله به مرحله ثبت می‌کند
+
+        Returns:
+            DatabaseJob: کار ثبت‌شده (برای لغو دستی)
+        """
+        job = DatabaseJob(self.manager, fn, write, atomic)
+
+        # نتیجه کارهای لغوشده حتی اگر پیش از لغو ارسال شده باشد نادیده گرفته می‌شود
+        if on_result is not None:
+            job.signals.finished.connect(lambda result: None if job.cancelled else on_result(result))
+        if on_error is not None:
+            job.signals.failed.connect(lambda message: None if job.cancelled else on_error(message))
+        if on_progress is not None:
+            job.signals.progress.connect(on_progress)
+
+        if channel is not None:
+            previous = self._channels.get(channel)
+            if previous is not None:
+                previous.cancel()
+            self._channels[channel] = job
+            job.signals.finished.connect(lambda _: self._forget(channel, job))
+            job.signals.failed.connect(lambda _: self._forget(channel, job))
+
+        (self.write_pool if write else self.read_pool).start(job)
+        return job
+
+    def _forget(self, channel, job):
+        if self._channels.get(channel) is job:
+            del self._channels[channel]
+
+    def cancel(self, channel):
+        """لغو کار جاری یک کانال"""
+        job = self._channels.pop(channel, None)
+        if job is not None:
+            job.cancel()
+
+    def shutdown(self, timeout_ms=5000):
+        """لغو همه کارهای کانال‌دار و انتظار برای پایان کارهای در حال اجرا"""
+        for job in list(self._channels.values()):
+            job.cancel()
+        self._channels.clear()
+        self.read_pool.clear()
+        self.read_pool.waitForDone(timeout_ms)
+        # کارهای نوشتنی لغو نمی‌شوند تا تغییرات کاربر از دست نرود
+        self.write_pool.waitForDone(timeout_ms)
@@ -0,0 +1,200 @@
+"""
+ماژول بارگذاری غیرهمزمان تصاویر محصولات
+تصاویر (از حافظه نهان تصاویر کوچک‌شده) در نخ‌های یک QThreadPool به QImage رمزگشایی می‌شوند
+و در نخ رابط کاربری به QPixmap تبدیل و در QPixmapCache نگه داشته می‌شوند؛ پنجره‌ها بلافاصله
+با متن جایگزین باز می‌شوند و تصاویر به تدریج جایگزین آن می‌شوند
+"""
+
+from PyQt5 import QtGui
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, Qt, pyqtSignal
+
+from thumbnail_cache import get_thumbnail
+
+
+# بودجه پیش‌فرض حافظه QPixmapCache (کیلوبایت)
+DEFAULT_CACHE_LIMIT_KB = 64 * 1024
+
+# متن‌های جایگزین تا رسیدن تصویر یا در صورت خطا
+LOADING_TEXT = "در حال بارگذاری..."
+MISSING_TEXT = "بدون تصویر"
+INVALID_TEXT = "تصویر نامعتبر"
+
+
+def _cache_key(image_path, size):
+    return f"product_image:{size}:{image_path}"
+
+
+class _ImageSignals(QObject):
+    finished = pyqtSignal(str, int, object)
+    failed = pyqtSignal(str, int, str)
+
+
+class _ImageJob(QRunnable):
+    """رمزگشایی یک تصویر در نخ کارگر (QImage برخلاف QPixmap در هر نخی قابل استفاده است)"""
+
+    def __init__(self, image_path, size):
+        super().__init__()
+        self.setAutoDelete(True)
+        self.image_path = image_path
+        self.size = size
+        # شیء سیگنال‌ها در نخ رابط کاربری ساخته می‌شود تا سیگنال‌ها در همان نخ تحویل شوند
+        self.signals = _ImageSignals()
+
+    def run(self):
+        try:
+            path = get_thumbnail(self.image_path, self.size)
+            if path is None:
+                self.signals.failed.emit(self.image_path, self.size, MISSING_TEXT)
+                return
+            image = QtGui.QImage(path)
+            if image.isNull():
+                self.signals.failed.emit(self.image_path, self.size, INVALID_TEXT)
+                return
+            if image.width() > self.size or image.height() > self.size:
+                image = image.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            self.signals.finished.emit(self.image_path, self.size, image)
+        except Exception as e:
+            print(f"Error loading image {self.image_path}: {e}")
+            self.signals.failed.emit(self.image_path, self.size, INVALID_TEXT)
+
+
+class ImageLoader(QObject):
+    """بارگذاری تصاویر در پس‌زمینه با حافظه نهان LRU مشترک (QPixmapCache)
+
+    load() اگر تصویر در حافظه نهان باشد callback را بلافاصله صدا می‌زند، وگرنه کار
+    رمزگشایی را ثبت می‌کند؛ درخواست‌های همزمان برای یک تصویر فقط یک بار اجرا می‌شوند.
+    """
+
+    # پس از آماده شدن هر تصویر (مسیر، اندازه)؛ نماها می‌توانند فقط بخش قابل مشاهده را دوباره رسم کنند
+    image_ready = pyqtSignal(str, int)
+
+    def __init__(self, parent=None, cache_limit_kb=DEFAULT_CACHE_LIMIT_KB, max_threads=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if max_threads is None:
+            # یک نخ برای رابط کاربری آزاد می‌ماند
+            max_threads = max(1, min(4, QThread.idealThreadCount() - 1))
+        self.pool.setMaxThreadCount(max_threads)
+        self.set_cache_limit(cache_limit_kb)
+
+        # کلید -> فهرست callbackهای منتظر
+        self._pending = {}
+        # کلید -> پیام خطا برای تصاویری که وجود ندارند یا خوانده نمی‌شوند
+        self._failed = {}
+        # اندازه‌های درخواست‌شده (برای invalidate)
+        self._sizes = set()
+
+    def set_cache_limit(self, cache_limit_kb):
+        """تنظیم بودجه حافظه تصاویر نگه‌داشته‌شده (کیلوبایت)"""
+        QtGui.QPixmapCache.setCacheLimit(int(cache_limit_kb))
+
+    def cached(self, image_path, size):
+        """(QPixmap، پیام خطا) از حافظه نهان یا (None، None) اگر هنوز بارگذاری نشده باشد"""
+        key = _cache_key(image_path, size)
+        message = self._failed.get(key)
+        if message is not None:
+            return None, message
+        pixmap = QtGui.QPixmapCache.find(key)
+        if pixmap is not None and not pixmap.isNull():
+            return pixmap, None
+        return None, None
+
+    def load(self, image_path, size, callback=None):
+        """درخواست یک تصویر با بیشترین ضلع size
+
+        Args:
+            image_path (str): مسیر تصویر اصلی
+            size (int): بیشترین ضلع به پیکسل
+            callback (callable): دریافت (QPixmap یا None، پیام خطا یا None) در نخ رابط کاربری
+
+        Returns:
+            QPixmap: تصویر اگر از قبل در حافظه نهان باشد، وگرنه None
+        """
+        if not image_path:
+            if callback is not None:
+                self._deliver(callback, None, MISSING_TEXT)
+            return None
+
+        pixmap, message = self.cached(image_path, size)
+        if pixmap is not None or message is not None:
+            if callback is not None:
+                self._deliver(callback, pixmap, message)
+            return pixmap
+
+        key = _cache_key(image_path, size)
+        waiting = self._pending.get(key)
+        if waiting is not None:
+            if callback is not None:
+                waiting.append(callback)
+            return None
+
+        self._pending[key] = [callback] if callback is not None else []
+        self._sizes.add(size)
+        job = _ImageJob(image_path, size)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        self.pool.start(job)
+        return None
+
+    @staticmethod
+    def _deliver(callback, pixmap, message):
+        try:
+            callback(pixmap, message)
+        except RuntimeError:
+            # ویجت مقصد (مثلاً پنجره بسته‌شده) دیگر وجود ندارد
+            pass
+
+    def _on_finished(self, image_path, size, image):
+        key = _cache_key(image_path, size)
+        pixmap = QtGui.QPixmap.fromImage(image)
+        QtGui.QPixmapCache.insert(key, pixmap)
+        for callback in self._pending.pop(key, ()):
+            self._deliver(callback, pixmap, None)
+        self.image_ready.emit(image_path, size)
+
+    def _on_failed(self, image_path, size, message):
+        key = _cache_key(image_path, size)
+        self._failed[key] = message
+        for callback in self._pending.pop(key, ()):
+            self._deliver(callback, None, message)
+        self.image_ready.emit(image_path, size)
+
+    def invalidate(self, image_path=None):
+        """فراموش کردن تصاویر بارگذاری‌شده (مثلاً پس از جایگزینی فایل)"""
+        if image_path is None:
+            QtGui.QPixmapCache.clear()
+            self._failed.clear()
+            return
+        for size in self._sizes:
+            key = _cache_key(image_path, size)
+            QtGui.QPixmapCache.remove(key)
+            self._failed.pop(key, None)
+
+
+_loader = None
+
+
+def get_image_loader():
+    """بارگذار مشترک تصاویر برنامه (در اولین استفاده در نخ رابط کاربری ساخته می‌شود)"""
+    global _loader
+    if _loader is None:
+        _loader = ImageLoader()
+    return _loader
+
+
+def set_label_image(label, image_path, size, loader=None):
+    """نمایش متن جایگزین روی یک QLabel و قرار دادن تصویر پس از بارگذاری
+
+    Args:
+        label (QLabel): برچسب مقصد
+        image_path (str): مسیر تصویر اصلی
+        size (int): بیشترین ضلع تصویر نمایش‌داده‌شده
+    """
+    def show(pixmap, message):
+        if pixmap is not None:
+            label.setPixmap(pixmap)
+        else:
+            label.setText(message)
+
+    label.setText(LOADING_TEXT)
+    (loader or get_image_loader()).load(image_path, size, show)
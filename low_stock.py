@@ -0,0 +1,125 @@
+"""
+ماژول پیگیری محصولات با موجودی کم
+مجموعه محصولات با موجودی کمتر از حداقل به صورت تدریجی و از روی جدول product_changes
+به‌روز می‌شود؛ بارگذاری اولیه از شاخص جزئی idx_products_low_stock (مهاجرت 8) استفاده
+می‌کند، پس هیچ‌گاه کل جدول محصولات پیمایش نمی‌شود
+"""
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from repository import ProductRepository, product_changes_since
+
+
+# مکث (میلی‌ثانیه) برای ادغام درخواست‌های پشت‌سرهم به‌روزرسانی، مثلاً در عملیات گروهی
+REFRESH_DELAY_MS = 200
+
+# فاصله بررسی دوره‌ای تغییرات (مثلاً تغییرات نمونه‌های دیگر برنامه)
+POLL_INTERVAL_MS = 10000
+
+# اگر تعداد محصولات تغییر یافته بیشتر از این مقدار باشد، مجموعه از شاخص جزئی دوباره خوانده می‌شود
+FULL_RELOAD_THRESHOLD = 2000
+
+
+def is_low_stock(stock, min_stock):
+    """همان شرط stock < min_stock در SQLite (مقادیر خالی موجودی کم محسوب نمی‌شوند)"""
+    return stock is not None and min_stock is not None and stock < min_stock
+
+
+def _load_low_stock(conn):
+    rows = conn.execute(
+        "SELECT id, name, stock, min_stock FROM products WHERE stock < min_stock"
+    ).fetchall()
+    return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+
+class LowStockTracker(QObject):
+    """نگهداری مجموعه محصولات با موجودی کم و اعلام تغییرات آن
+
+    refresh() را پس از هر تغییر موجودی صدا بزنید؛ درخواست‌های پشت‌سرهم ادغام
+    می‌شوند و فقط یک پرس‌وجو در نخ کارگر اجرا می‌شود.
+    """
+
+    # (تعداد کل محصولات با موجودی کم، شناسه محصولاتی که تازه به این مجموعه وارد شده‌اند)
+    changed = pyqtSignal(int, list)
+
+    def __init__(self, worker, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self._items = {}
+        self._change_seq = None
+        self._loaded = False
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(REFRESH_DELAY_MS)
+        self._timer.timeout.connect(self._run_refresh)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL_MS)
+        self._poll_timer.timeout.connect(self.refresh)
+        self._poll_timer.start()
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self, product_id):
+        """(نام، موجودی، حداقل موجودی) یک محصول با موجودی کم یا None"""
+        return self._items.get(product_id)
+
+    def items(self):
+        """فهرست (شناسه، نام، موجودی، حداقل موجودی) به ترتیب بیشترین کمبود"""
+        items = [(product_id,) + values for product_id, values in self._items.items()]
+        items.sort(key=lambda item: item[3] - item[2], reverse=True)
+        return items
+
+    def refresh(self):
+        """درخواست به‌روزرسانی (با تأخیر کوتاه برای ادغام درخواست‌ها)"""
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _run_refresh(self):
+        since = self._change_seq
+
+        def job(conn, job):
+            seq, ids = product_changes_since(conn, since)
+            if ids is None or len(ids) > FULL_RELOAD_THRESHOLD:
+                return seq, None, _load_low_stock(conn)
+            if not ids:
+                return seq, ids, {}
+            products = ProductRepository(conn).get_many(ids)
+            return seq, ids, {
+                product.id: (product.name, product.stock, product.min_stock)
+                for product in products.values()
+            }
+
+        self.worker.submit(
+            job,
+            on_result=lambda result: self._apply(*result),
+            on_error=lambda message: print(f"Error refreshing low stock products: {message}"),
+            channel='low_stock'
+        )
+
+    def _apply(self, seq, ids, products):
+        previous = set(self._items)
+        if ids is None:
+            self._items = products
+        else:
+            for product_id in ids:
+                values = products.get(product_id)
+                if values is not None and is_low_stock(values[1], values[2]):
+                    self._items[product_id] = values
+                else:
+                    self._items.pop(product_id, None)
+
+        first_load = not self._loaded
+        self._loaded = True
+        self._change_seq = seq
+
+        # اگر هیچ محصولی تغییر نکرده باشد سیگنالی ارسال نمی‌شود
+        if first_load or ids is None or ids:
+            newly_low = [product_id for product_id in self._items if product_id not in previous]
+            self.changed.emit(len(self._items), [] if first_load else newly_low)
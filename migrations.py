@@ -0,0 +1,605 @@
+"""
+ماژول مهاجرت‌های نسخه‌دار طرح پایگاه داده
+نسخه طرح در PRAGMA user_version ذخیره می‌شود و هنگامی که طرح به‌روز باشد هیچ بررسی دیگری انجام نمی‌شود
+"""
+
+import sqlite3
+
+
+# تعریف کامل جداول؛ ستون‌هایی که در نسخه‌های قدیمی‌تر پایگاه داده وجود ندارند در مهاجرت اول اضافه می‌شوند
+BASE_TABLES = {
+    'products': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('name', 'TEXT'),
+        ('price', 'REAL'),
+        ('category', 'TEXT'),
+        ('image', 'TEXT'),
+        ('stock', 'INTEGER DEFAULT 0'),
+        ('min_stock', 'INTEGER DEFAULT 5'),
+        ('discount_price', 'REAL'),
+        ('barcode', 'TEXT'),
+        ('description', 'TEXT'),
+        ('created_at', 'TEXT'),
+        ('updated_at', 'TEXT'),
+    ],
+    'categories': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('name', 'TEXT'),
+        ('description', 'TEXT'),
+        ('parent_id', 'INTEGER'),
+        ('created_at', 'TEXT'),
+    ],
+    'users': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('username', 'TEXT UNIQUE'),
+        ('password', 'TEXT'),
+        ('full_name', 'TEXT'),
+        ('email', 'TEXT'),
+        ('role', "TEXT DEFAULT 'user'"),
+        ('is_active', 'INTEGER DEFAULT 1'),
+        ('last_login', 'TEXT'),
+        ('created_at', 'TEXT'),
+    ],
+    'user_activities': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('user_id', 'INTEGER REFERENCES users(id)'),
+        ('activity_type', 'TEXT'),
+        ('description', 'TEXT'),
+        ('timestamp', 'TEXT'),
+        ('ip_address', 'TEXT'),
+    ],
+    'product_images': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('product_id', 'INTEGER REFERENCES products(id)'),
+        ('image_path', 'TEXT'),
+        ('is_primary', 'INTEGER DEFAULT 0'),
+        ('sort_order', 'INTEGER DEFAULT 0'),
+        ('description', 'TEXT'),
+        ('created_at', 'TEXT'),
+    ],
+    # هر دو فرم مدیریت محصولات از این جدول استفاده می‌کنند و هر کدام ستون‌های خود را دارند
+    'inventory_history': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('product_id', 'INTEGER REFERENCES products(id)'),
+        ('change_amount', 'INTEGER'),
+        ('change_type', 'TEXT'),
+        ('change_date', 'TEXT'),
+        ('notes', 'TEXT'),
+        ('old_stock', 'INTEGER'),
+        ('new_stock', 'INTEGER'),
+        ('change_reason', 'TEXT'),
+        ('user_id', 'INTEGER'),
+        ('timestamp', 'TEXT'),
+    ],
+    'discounts': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('name', 'TEXT'),
+        ('discount_type', 'TEXT'),
+        ('discount_value', 'REAL'),
+        ('start_date', 'TEXT'),
+        ('end_date', 'TEXT'),
+        ('is_active', 'INTEGER DEFAULT 1'),
+        ('applies_to', 'TEXT'),
+        ('target_id', 'INTEGER'),
+        ('created_at', 'TEXT'),
+    ],
+    'product_discounts': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('product_id', 'INTEGER REFERENCES products(id)'),
+        ('discount_id', 'INTEGER REFERENCES discounts(id)'),
+    ],
+    'activities': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('activity_type', 'TEXT'),
+        ('description', 'TEXT'),
+        ('user_id', 'INTEGER'),
+        ('timestamp', 'TEXT'),
+        ('ip_address', 'TEXT'),
+    ],
+}
+
+
+def _migration_1_base_schema(cursor):
+    """ایجاد جداول پایه و افزودن ستون‌های جاافتاده در پایگاه‌های داده قدیمی"""
+    for table, columns in BASE_TABLES.items():
+        column_defs = ", ".join(f"{name} {definition}" for name, definition in columns)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_defs})")
+
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {col[1] for col in cursor.fetchall()}
+        for name, definition in columns:
+            if name not in existing:
+                # ALTER TABLE اجازه افزودن ستون UNIQUE یا PRIMARY KEY را نمی‌دهد
+                definition = definition.replace(' UNIQUE', '')
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def _migration_2_indexes(cursor):
+    """ایجاد شاخص‌های مورد نیاز پرس‌وجوهای پرتکرار"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_barcode ON products(barcode)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_history_product_date ON inventory_history(product_id, change_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_activities_timestamp ON user_activities(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_images_product_order ON product_images(product_id, sort_order)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_discounts_active_dates ON discounts(is_active, start_date, end_date)")
+
+
+def _migration_3_category_ids(cursor):
+    """ارجاع محصولات به دسته‌بندی با کلید خارجی عددی به جای نام
+
+    ستون متنی category برای سازگاری با کدهای موجود نگه داشته می‌شود، اما
+    category_id مرجع اصلی است و تریگرها دو ستون را هماهنگ نگه می‌دارند.
+    """
+    cursor.execute("ALTER TABLE products ADD COLUMN category_id INTEGER REFERENCES categories(id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_category_id ON products(category_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_categories_name ON categories(name)")
+
+    # دسته‌بندی‌هایی که فقط در جدول محصولات آمده‌اند به جدول دسته‌بندی‌ها اضافه می‌شوند
+    cursor.execute("""
+        INSERT INTO categories (name)
+        SELECT DISTINCT category FROM products
+        WHERE category IS NOT NULL AND category <> ''
+        AND category NOT IN (SELECT name FROM categories WHERE name IS NOT NULL)
+    """)
+    cursor.execute("""
+        UPDATE products
+        SET category_id = (SELECT MIN(id) FROM categories WHERE categories.name = products.category)
+        WHERE category IS NOT NULL AND category <> ''
+    """)
+
+    # کدهایی که هنوز فقط نام دسته‌بندی را می‌نویسند، شناسه را از طریق این تریگرها تنظیم می‌کنند
+    for event in ("AFTER INSERT ON products", "AFTER UPDATE OF category ON products"):
+        name = "trg_products_category_insert" if "INSERT" in event else "trg_products_category_update"
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} {event}
+            WHEN NEW.category IS NOT NULL AND NEW.category <> ''
+            AND NEW.category IS NOT (SELECT name FROM categories WHERE id = NEW.category_id)
+            BEGIN
+                INSERT INTO categories (name)
+                SELECT NEW.category
+                WHERE NOT EXISTS (SELECT 1 FROM categories WHERE name = NEW.category);
+                UPDATE products
+                SET category_id = (SELECT MIN(id) FROM categories WHERE name = NEW.category)
+                WHERE id = NEW.id;
+            END
+        """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_category_clear
+        AFTER UPDATE OF category ON products
+        WHEN (NEW.category IS NULL OR NEW.category = '') AND NEW.category_id IS NOT NULL
+        BEGIN
+            UPDATE products SET category_id = NULL WHERE id = NEW.id;
+        END
+    """)
+
+    # کدهای جدید فقط category_id را می‌نویسند؛ نام نمایشی از جدول دسته‌بندی‌ها خوانده می‌شود
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_category_id_update
+        AFTER UPDATE OF category_id ON products
+        WHEN NEW.category_id IS NOT OLD.category_id
+        BEGIN
+            UPDATE products
+            SET category = (SELECT name FROM categories WHERE id = NEW.category_id)
+            WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_categories_rename
+        AFTER UPDATE OF name ON categories
+        WHEN NEW.name IS NOT OLD.name
+        BEGIN
+            UPDATE products SET category = NEW.name WHERE category_id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_categories_delete
+        AFTER DELETE ON categories
+        BEGIN
+            UPDATE products SET category_id = NULL WHERE category_id = OLD.id;
+        END
+    """)
+
+
+# وضعیت موجودی به همان ترتیبی که در نمودار داشبورد استفاده می‌شود:
+# 0 بدون موجودی، 1 موجودی کم، 2 موجودی متوسط، 3 موجودی کافی
+def _stock_status(row):
+    return (f"CASE WHEN {row}.stock = 0 THEN 0 WHEN {row}.stock < {row}.min_stock THEN 1 "
+            f"WHEN {row}.stock < {row}.min_stock * 2 THEN 2 ELSE 3 END")
+
+
+def _summary_deltas(row, sign):
+    """عبارات تغییر ستون‌های جداول خلاصه برای سطر NEW یا OLD"""
+    deltas = {
+        'product_count': "1",
+        'stock_total': f"IFNULL({row}.stock, 0)",
+        'price_sum': f"IFNULL({row}.price, 0)",
+        'price_count': f"({row}.price IS NOT NULL)",
+        'low_stock_count': f"IFNULL({row}.stock < {row}.min_stock, 0)",
+        'discounted_count': f"({row}.discount_price IS NOT NULL)",
+    }
+    for status in range(4):
+        deltas[f'status_{status}_count'] = f"({_stock_status(row)} = {status})"
+    return {column: f"{sign}{expression}" for column, expression in deltas.items()}
+
+
+def _migration_4_summary_tables(cursor):
+    """جداول خلاصه آمار محصولات که با تریگر به‌روز نگه داشته می‌شوند
+
+    داشبورد و آمار به جای پیمایش کامل جدول محصولات، یک سطر از product_summary
+    و چند سطر از category_summary را می‌خوانند.
+    """
+    counters = ("product_count INTEGER NOT NULL DEFAULT 0, stock_total INTEGER NOT NULL DEFAULT 0, "
+                "price_sum REAL NOT NULL DEFAULT 0, price_count INTEGER NOT NULL DEFAULT 0, "
+                "low_stock_count INTEGER NOT NULL DEFAULT 0, discounted_count INTEGER NOT NULL DEFAULT 0, "
+                "status_0_count INTEGER NOT NULL DEFAULT 0, status_1_count INTEGER NOT NULL DEFAULT 0, "
+                "status_2_count INTEGER NOT NULL DEFAULT 0, status_3_count INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS product_summary (id INTEGER PRIMARY KEY CHECK (id = 1), {counters})")
+    # محصولات بدون دسته‌بندی با category_id = 0 شمرده می‌شوند
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS category_summary (category_id INTEGER PRIMARY KEY, {counters})")
+    # MIN/MAX قیمت با این شاخص بدون پیمایش جدول محاسبه می‌شود
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)")
+
+    # مقداردهی اولیه از داده‌های موجود
+    deltas = _summary_deltas("p", "")
+    columns = ", ".join(deltas)
+    sums = ", ".join(f"IFNULL(SUM({expression}), 0)" for expression in deltas.values())
+    cursor.execute("DELETE FROM product_summary")
+    cursor.execute(f"INSERT INTO product_summary (id, {columns}) SELECT 1, {sums} FROM products p")
+    cursor.execute("DELETE FROM category_summary")
+    cursor.execute(f"INSERT INTO category_summary (category_id, {columns}) "
+                   f"SELECT IFNULL(p.category_id, 0), {sums} FROM products p GROUP BY IFNULL(p.category_id, 0)")
+
+    def apply(row, sign):
+        deltas = _summary_deltas(row, sign)
+        summary_set = ", ".join(f"{column} = {column} + {expression}" for column, expression in deltas.items())
+        category_set = ", ".join(f"{column} = {column} + excluded.{column}" for column in deltas)
+        return f"""
+            UPDATE product_summary SET {summary_set} WHERE id = 1;
+            INSERT INTO category_summary (category_id, {', '.join(deltas)})
+            VALUES (IFNULL({row}.category_id, 0), {', '.join(deltas.values())})
+            ON CONFLICT(category_id) DO UPDATE SET {category_set};
+        """
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_summary_insert AFTER INSERT ON products
+        BEGIN {apply("NEW", "+")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_summary_delete AFTER DELETE ON products
+        BEGIN {apply("OLD", "-")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_summary_update
+        AFTER UPDATE OF price, stock, min_stock, discount_price, category_id ON products
+        BEGIN {apply("OLD", "-")} {apply("NEW", "+")} END
+    """)
+
+
+def _migration_5_search_index(cursor):
+    """شاخص جستجوی متن کامل FTS5 روی نام، توضیحات، دسته‌بندی و بارکد محصولات
+
+    جدول products_fts محتوای خود را از products می‌خواند (external content) و فقط
+    شاخص را نگه می‌دارد. اگر SQLite بدون FTS5 ساخته شده باشد، این مهاجرت بدون
+    ایجاد شاخص ثبت می‌شود و جستجو به LIKE برمی‌گردد.
+    """
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, description, category, barcode,
+                content='products', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Warning: full-text search is not available ({e})")
+        return
+
+    cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON products
+        BEGIN
+            INSERT INTO products_fts (rowid, name, description, category, barcode)
+            VALUES (NEW.id, NEW.name, NEW.description, NEW.category, NEW.barcode);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON products
+        BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category, barcode)
+            VALUES ('delete', OLD.id, OLD.name, OLD.description, OLD.category, OLD.barcode);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_update
+        AFTER UPDATE OF name, description, category, barcode ON products
+        BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category, barcode)
+            VALUES ('delete', OLD.id, OLD.name, OLD.description, OLD.category, OLD.barcode);
+            INSERT INTO products_fts (rowid, name, description, category, barcode)
+            VALUES (NEW.id, NEW.name, NEW.description, NEW.category, NEW.barcode);
+        END
+    """)
+
+
+def _migration_6_sort_indexes(cursor):
+    """شاخص‌های صفحه‌بندی کلیدی فهرست محصولات
+
+    عبارت هر شاخص با SORT_EXPRESSIONS در repository.py یکسان است تا هر صفحه با
+    یک جستجوی محدوده در شاخص خوانده شود؛ نسخه‌های دارای category_id برای فیلتر
+    دسته‌بندی هستند. شناسه سطر در همه شاخص‌ها به طور ضمنی وجود دارد.
+    """
+    sort_expressions = {
+        'name': "IFNULL(name, '')",
+        'price': "COALESCE(discount_price, price, 0)",
+        'stock': "IFNULL(stock, 0)",
+    }
+    for sort, expression in sort_expressions.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_products_sort_{sort} ON products({expression})")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_products_category_sort_{sort} ON products(category_id, {expression})"
+        )
+
+
+# تعداد تغییرات اخیری که در product_changes نگه داشته می‌شوند
+PRODUCT_CHANGES_RETAINED = 10000
+
+
+def _migration_7_product_changes(cursor):
+    """ثبت شناسه محصولات تغییر یافته برای به‌روزرسانی تدریجی حافظه نهان کاتالوگ
+
+    هر درج، ویرایش یا حذف محصول یک سطر با شماره ترتیبی افزایشی در product_changes
+    ثبت می‌کند. تغییرات قدیمی‌تر از PRODUCT_CHANGES_RETAINED هر 1000 سطر یک بار
+    حذف می‌شوند؛ خواننده‌ای که از این فاصله عقب‌تر باشد همه داده‌ها را دوباره می‌خواند.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS product_changes (
+            seq INTEGER PRIMARY KEY,
+            product_id INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_changes_insert AFTER INSERT ON products
+        BEGIN
+            INSERT INTO product_changes (product_id) VALUES (NEW.id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_changes_update AFTER UPDATE ON products
+        BEGIN
+            INSERT INTO product_changes (product_id) VALUES (OLD.id);
+            INSERT INTO product_changes (product_id) SELECT NEW.id WHERE NEW.id != OLD.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_changes_delete AFTER DELETE ON products
+        BEGIN
+            INSERT INTO product_changes (product_id) VALUES (OLD.id);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_product_changes_prune AFTER INSERT ON product_changes
+        WHEN NEW.seq % 1000 = 0
+        BEGIN
+            DELETE FROM product_changes WHERE seq <= NEW.seq - {PRODUCT_CHANGES_RETAINED};
+        END
+    """)
+
+
+def _migration_8_low_stock_index(cursor):
+    """شاخص جزئی محصولات با موجودی کم
+
+    فقط محصولاتی که stock < min_stock هستند در این شاخص قرار می‌گیرند، پس
+    خواندن فهرست موجودی کم به اندازه همین فهرست هزینه دارد و نه کل جدول.
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products(stock, min_stock) WHERE stock < min_stock"
+    )
+
+
+def _migration_9_import_jobs(cursor):
+    """جدول وضعیت وارد کردن فایل‌ها برای ادامه وارد کردن‌های نیمه‌کاره
+
+    هر نقطه بازیابی (checkpoint) شماره آخرین سطر ثبت‌شده فایل را در همان تراکنشی
+    ذخیره می‌کند که محصولات آن بخش را درج کرده است. فایل با مسیر، اندازه و زمان
+    تغییر شناخته می‌شود تا نسخه تغییرکرده یک فایل از ادامه قبلی استفاده نکند.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            file_size INTEGER,
+            file_mtime INTEGER,
+            last_row INTEGER DEFAULT 1,
+            total INTEGER DEFAULT 0,
+            imported INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'running',
+            started_at TEXT,
+            updated_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_import_jobs_file ON import_jobs(file_path, status)")
+
+
+# شاخص یکتای بارکد برای ادغام محصولات هنگام وارد کردن (INSERT ... ON CONFLICT)
+BARCODE_UNIQUE_INDEX_SQL = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_products_barcode_unique ON products(barcode) "
+    "WHERE barcode IS NOT NULL AND barcode <> ''"
+)
+
+
+def duplicate_barcodes(cursor, limit=5):
+    """نمونه‌ای از بارکدهایی که برای بیش از یک محصول ثبت شده‌اند"""
+    return [row[0] for row in cursor.execute(
+        "SELECT barcode FROM products WHERE barcode IS NOT NULL AND barcode <> '' "
+        "GROUP BY barcode HAVING COUNT(*) > 1 LIMIT ?",
+        (limit,)
+    ).fetchall()]
+
+
+def _migration_10_merge_import(cursor):
+    """شاخص یکتای جزئی روی بارکدهای غیرخالی و شمارنده‌های ادغام در import_jobs
+
+    اگر بارکد تکراری وجود داشته باشد شاخص ساخته نمی‌شود تا برنامه باز شود؛ حالت
+    ادغام وارد کردن پیش از اجرا دوباره تلاش می‌کند و بارکدهای تکراری را گزارش می‌دهد.
+    """
+    cursor.execute("ALTER TABLE import_jobs ADD COLUMN mode TEXT DEFAULT 'append'")
+    cursor.execute("ALTER TABLE import_jobs ADD COLUMN updated INTEGER DEFAULT 0")
+    cursor.execute("ALTER TABLE import_jobs ADD COLUMN unchanged INTEGER DEFAULT 0")
+    duplicates = duplicate_barcodes(cursor)
+    if duplicates:
+        print(f"Skipping unique barcode index, duplicate barcodes: {', '.join(duplicates)}")
+        return
+    cursor.execute(BARCODE_UNIQUE_INDEX_SQL)
+
+
+# نام نمایشی دسته‌بندی یک سطر products (OLD یا NEW در تریگرها)
+def _category_name(row):
+    return f"(SELECT name FROM categories WHERE id = {row}.category_id)"
+
+
+def _migration_11_category_names(cursor):
+    """خواندن نام دسته‌بندی محصولات از جدول categories به جای ستون متنی category
+
+    تغییر نام یک دسته‌بندی دیگر همه سطرهای محصولات آن را بازنویسی نمی‌کند (و در نتیجه
+    تریگرهای product_changes و جداول خلاصه و باطل شدن حافظه‌های نهان اجرا نمی‌شوند)؛ نام
+    نمایشی همه جا با اتصال روی category_id خوانده می‌شود. ستون category فقط نامی است که
+    هنگام تعیین دسته‌بندی نوشته شده و برای کدهای قدیمی‌تر که نام را می‌نویسند نگه داشته می‌شود.
+
+    شاخص جستجو محتوای خود را از نمای products_search (محصولات با نام فعلی دسته‌بندی)
+    می‌خواند؛ با تغییر نام یا حذف یک دسته‌بندی فقط ورودی‌های شاخص محصولات آن
+    دسته‌بندی دوباره ساخته می‌شوند.
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS trg_categories_rename")
+    if cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+    ).fetchone() is None:
+        # SQLite بدون FTS5 (مهاجرت 5)
+        return
+
+    for name in ("trg_products_fts_insert", "trg_products_fts_delete", "trg_products_fts_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("DROP TABLE products_fts")
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS products_search AS
+        SELECT p.id, p.name, p.description, c.name AS category, p.barcode
+        FROM products p LEFT JOIN categories c ON c.id = p.category_id
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            name, description, category, barcode,
+            content='products_search', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+    # مقادیر حذف‌شده از شاخص باید دقیقاً همان مقادیر درج‌شده باشند
+    delete = "INSERT INTO products_fts (products_fts, rowid, name, description, category, barcode)"
+    insert = "INSERT INTO products_fts (rowid, name, description, category, barcode)"
+    cursor.execute(f"""
+        CREATE TRIGGER trg_products_fts_insert AFTER INSERT ON products
+        BEGIN
+            {insert} VALUES (NEW.id, NEW.name, NEW.description, {_category_name("NEW")}, NEW.barcode);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_products_fts_delete AFTER DELETE ON products
+        BEGIN
+            {delete} VALUES ('delete', OLD.id, OLD.name, OLD.description, {_category_name("OLD")}, OLD.barcode);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_products_fts_update
+        AFTER UPDATE OF name, description, barcode, category_id ON products
+        BEGIN
+            {delete} VALUES ('delete', OLD.id, OLD.name, OLD.description, {_category_name("OLD")}, OLD.barcode);
+            {insert} VALUES (NEW.id, NEW.name, NEW.description, {_category_name("NEW")}, NEW.barcode);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_categories_rename_search
+        AFTER UPDATE OF name ON categories
+        WHEN NEW.name IS NOT OLD.name
+        BEGIN
+            {delete} SELECT 'delete', id, name, description, OLD.name, barcode FROM products WHERE category_id = NEW.id;
+            {insert} SELECT id, name, description, NEW.name, barcode FROM products WHERE category_id = NEW.id;
+        END
+    """)
+    # پیش از حذف، تا trg_categories_delete هنگام خالی کردن category_id نام قبلی را نیابد
+    cursor.execute(f"""
+        CREATE TRIGGER trg_categories_delete_search
+        BEFORE DELETE ON categories
+        BEGIN
+            {delete} SELECT 'delete', id, name, description, OLD.name, barcode FROM products WHERE category_id = OLD.id;
+            {insert} SELECT id, name, description, NULL, barcode FROM products WHERE category_id = OLD.id;
+        END
+    """)
+
+
+# فهرست مهاجرت‌ها به ترتیب نسخه: (نسخه، توضیح، تابع)
+MIGRATIONS = [
+    (1, "base schema", _migration_1_base_schema),
+    (2, "secondary indexes", _migration_2_indexes),
+    (3, "integer category keys", _migration_3_category_ids),
+    (4, "summary tables", _migration_4_summary_tables),
+    (5, "full-text search index", _migration_5_search_index),
+    (6, "keyset pagination indexes", _migration_6_sort_indexes),
+    (7, "product change log", _migration_7_product_changes),
+    (8, "low stock partial index", _migration_8_low_stock_index),
+    (9, "import checkpoints", _migration_9_import_jobs),
+    (10, "merge import", _migration_10_merge_import),
+    (11, "category names by join", _migration_11_category_names),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """دریافت نسخه فعلی طرح پایگاه داده"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn):
+    """اجرای مهاجرت‌های اعمال‌نشده روی پایگاه داده
+
+    هر مهاجرت در یک تراکنش جداگانه اجرا می‌شود و نسخه طرح در همان تراکنش
+    ثبت می‌گردد. اگر طرح به‌روز باشد تنها یک PRAGMA خوانده می‌شود.
+
+    Args:
+        conn (sqlite3.Connection): اتصال نویسنده
+
+    Returns:
+        int: نسخه طرح پس از اجرای مهاجرت‌ها
+    """
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    if conn.in_transaction:
+        conn.commit()
+
+    cursor = conn.cursor()
+    for target_version, description, migrate in MIGRATIONS:
+        # BEGIN IMMEDIATE مانع اجرای هم‌زمان مهاجرت توسط چند نمونه برنامه می‌شود
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            version = get_schema_version(conn)
+            if target_version <= version:
+                conn.rollback()
+                continue
+
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {target_version}")
+            conn.commit()
+            version = target_version
+            print(f"Applied database migration {target_version}: {description}")
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    cursor.close()
+    return version
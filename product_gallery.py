@@ -0,0 +1,183 @@
+"""
+ماژول نمایش گالری کارت‌های محصولات
+کارت‌ها به جای ویجت‌های جداگانه توسط یک delegate روی یک QListView در حالت آیکون کشیده
+می‌شوند؛ فقط کارت‌های قابل مشاهده رسم می‌شوند و برای هر محصول هیچ شیء Qt ساخته نمی‌شود
+"""
+
+from PyQt5 import QtGui
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QRect, QSize, Qt, pyqtSlot
+from PyQt5.QtWidgets import QAbstractItemView, QListView, QStyle, QStyledItemDelegate
+
+from image_loader import LOADING_TEXT, MISSING_TEXT, get_image_loader
+
+
+# ترتیب مقادیر هر محصول: (name, price, discount_price, category, image)
+NAME, PRICE, DISCOUNT_PRICE, CATEGORY, IMAGE = range(5)
+
+# نقش داده‌ای که تاپل کامل محصول را برمی‌گرداند
+PRODUCT_ROLE = Qt.UserRole + 1
+
+CARD_WIDTH = 220
+CARD_HEIGHT = 280
+CARD_SPACING = 15
+IMAGE_SIZE = 150
+
+
+class ProductGalleryModel(QAbstractListModel):
+    """مدل فهرست محصولات گالری (فقط تاپل‌های داده، بدون ویجت)"""
+
+    def __init__(self, products=(), parent=None):
+        super().__init__(parent)
+        self._products = list(products)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._products)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        product = self._products[index.row()]
+        if role == PRODUCT_ROLE:
+            return product
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return product[NAME] or "بدون نام"
+        return None
+
+    def set_products(self, products):
+        self.beginResetModel()
+        self._products = list(products)
+        self.endResetModel()
+
+
+class ProductCardDelegate(QStyledItemDelegate):
+    """رسم کارت محصول (نام، تصویر و قیمت) با همان ظاهر کارت‌های قبلی
+
+    تصاویر در پس‌زمینه بارگذاری می‌شوند؛ تا رسیدن هر تصویر متن جایگزین رسم می‌شود.
+    """
+
+    def __init__(self, parent=None, loader=None):
+        super().__init__(parent)
+        self.loader = loader if loader is not None else get_image_loader()
+
+    def sizeHint(self, option, index):
+        return QSize(CARD_WIDTH, CARD_HEIGHT)
+
+    def _pixmap(self, image_path):
+        """تصویر محصول از حافظه نهان یا (None، متن جایگزین)؛ تصاویر بارگذاری‌نشده درخواست می‌شوند"""
+        if not image_path:
+            return None, MISSING_TEXT
+        pixmap, message = self.loader.cached(image_path, IMAGE_SIZE)
+        if pixmap is None and message is None:
+            self.loader.load(image_path, IMAGE_SIZE)
+            return None, LOADING_TEXT
+        return pixmap, message
+
+    @staticmethod
+    def _font(base, pixel_size, bold=False, strike_out=False):
+        font = QtGui.QFont(base)
+        font.setPixelSize(pixel_size)
+        font.setBold(bold)
+        font.setStrikeOut(strike_out)
+        return font
+
+    def paint(self, painter, option, index):
+        product = index.data(PRODUCT_ROLE)
+        if product is None:
+            return
+        name = product[NAME] or "بدون نام"
+        price = product[PRICE] if product[PRICE] is not None else 0
+        discount_price = product[DISCOUNT_PRICE]
+
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+
+        # قاب کارت؛ در حالت اشاره یا انتخاب با رنگ آبی
+        highlighted = bool(option.state & (QStyle.State_MouseOver | QStyle.State_Selected))
+        rect = option.rect.adjusted(1, 1, -1, -1)
+        painter.setPen(QtGui.QColor("#0078d7" if highlighted else "#dddddd"))
+        painter.setBrush(QtGui.QColor("#f0f7ff" if highlighted else "white"))
+        painter.drawRoundedRect(rect, 8, 8)
+
+        content = rect.adjusted(10, 10, -10, -10)
+
+        # نام محصول (حداکثر دو خط)
+        name_rect = QRect(content.left(), content.top(), content.width(), 40)
+        painter.setFont(self._font(option.font, 14, bold=True))
+        painter.setPen(QtGui.QColor("#333333"))
+        painter.drawText(name_rect, Qt.AlignCenter | Qt.TextWordWrap, name)
+
+        # تصویر محصول
+        image_rect = QRect(content.center().x() - IMAGE_SIZE // 2, name_rect.bottom() + 5, IMAGE_SIZE, IMAGE_SIZE)
+        painter.setPen(QtGui.QColor("#eeeeee"))
+        painter.setBrush(QtGui.QColor("#f9f9f9"))
+        painter.drawRoundedRect(image_rect, 4, 4)
+        pixmap, message = self._pixmap(product[IMAGE])
+        if pixmap is not None:
+            x = image_rect.left() + (IMAGE_SIZE - pixmap.width()) // 2
+            y = image_rect.top() + (IMAGE_SIZE - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+        else:
+            painter.setFont(self._font(option.font, 12))
+            painter.setPen(QtGui.QColor("#999999"))
+            painter.drawText(image_rect, Qt.AlignCenter, message)
+
+        # قیمت محصول
+        top = image_rect.bottom() + 5
+        if discount_price is not None:
+            if price > 0:
+                # نشان درصد تخفیف
+                discount_percent = ((price - discount_price) / price) * 100
+                badge_font = self._font(option.font, 11, bold=True)
+                badge_text = f"{discount_percent:.0f}% تخفیف"
+                badge_width = QtGui.QFontMetrics(badge_font).horizontalAdvance(badge_text) + 12
+                badge_rect = QRect(content.center().x() - badge_width // 2, top, badge_width, 18)
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(QtGui.QColor("#e91e63"))
+                painter.drawRoundedRect(badge_rect, 4, 4)
+                painter.setFont(badge_font)
+                painter.setPen(QtGui.QColor("white"))
+                painter.drawText(badge_rect, Qt.AlignCenter, badge_text)
+                top = badge_rect.bottom() + 2
+
+            # قیمت اصلی با خط خورده و قیمت با تخفیف
+            painter.setFont(self._font(option.font, 12, strike_out=True))
+            painter.setPen(QtGui.QColor("#999999"))
+            painter.drawText(QRect(content.left(), top, content.width(), 16), Qt.AlignCenter, f"{price:,} تومان")
+            painter.setFont(self._font(option.font, 14, bold=True))
+            painter.setPen(QtGui.QColor("#e91e63"))
+            painter.drawText(QRect(content.left(), top + 16, content.width(), 20), Qt.AlignCenter,
+                             f"{discount_price:,} تومان")
+        else:
+            painter.setFont(self._font(option.font, 14, bold=True))
+            painter.setPen(QtGui.QColor("#333333"))
+            painter.drawText(QRect(content.left(), top, content.width(), 20), Qt.AlignCenter, f"{price:,} تومان")
+
+        painter.restore()
+
+
+class ProductGalleryView(QListView):
+    """نمای شبکه‌ای کارت‌های محصول با چیدمان خودکار بر اساس عرض پنجره"""
+
+    def __init__(self, parent=None, delegate=None):
+        super().__init__(parent)
+        self.setViewMode(QListView.IconMode)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        # اندازه یکسان کارت‌ها چیدمان را بدون پرسیدن sizeHint هر سطر محاسبه می‌کند
+        self.setUniformItemSizes(True)
+        self.setSpacing(CARD_SPACING // 2)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WA_Hover)
+        delegate = delegate if delegate is not None else ProductCardDelegate(self)
+        self.setItemDelegate(delegate)
+        self.setStyleSheet("QListView { background-color: white; border: none; }")
+
+        # با رسیدن هر تصویر فقط بخش قابل مشاهده دوباره رسم می‌شود
+        delegate.loader.image_ready.connect(self._on_image_ready)
+
+    @pyqtSlot(str, int)
+    def _on_image_ready(self, image_path, size):
+        self.viewport().update()
@@ -0,0 +1,1037 @@
+"""
+ماژول وارد کردن گروهی محصولات
+فایل ورودی به صورت جریانی و در بخش‌های ستونی چند هزار سطری خوانده می‌شود؛ هر بخش (در صورت
+نصب بودن NumPy و pandas) به صورت برداری اعتبارسنجی، دسته‌بندی‌های جدید با یک دستور
+مجموعه‌ای اضافه و محصولات با executemany درج می‌شوند. سطرهای ردشده با دلیل
+در یک فایل CSV کناری نوشته می‌شوند. گزارش پیشرفت بر اساس زمان محدود می‌شود. run_import_job
+فایل‌های بزرگ را در نقاط بازیابی (checkpoint) ثبت می‌کند تا وارد کردن لغوشده یا قطع‌شده از
+آخرین سطر ثبت‌شده ادامه یابد
+"""
+
+import bisect
+import csv
+import datetime
+import io
+import itertools
+import json
+import math
+import operator
+import os
+import time
+
+from migrations import BARCODE_UNIQUE_INDEX_SQL, duplicate_barcodes
+from repository import InventoryRepository
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = None
+    pd = None
+
+
+# ستون‌های لازم و اختیاری فایل ورودی
+REQUIRED_COLUMNS = ('name', 'price', 'category', 'stock', 'min_stock')
+OPTIONAL_COLUMNS = ('image', 'description', 'barcode')
+
+# تعداد سطرهای هر بخش
+DEFAULT_CHUNK_SIZE = 5000
+
+# حداقل فاصله (ثانیه) بین دو گزارش پیشرفت
+PROGRESS_INTERVAL = 0.2
+
+# حداکثر تعداد خطاهای سطری که با جزئیات نگه داشته می‌شوند
+MAX_ERRORS = 1000
+
+# حداکثر سطرها و زمان (ثانیه) هر نقطه بازیابی؛ قفل نوشتن فقط در طول ثبت یک نقطه
+# نگه داشته می‌شود و نقطه با رسیدن به هر کدام از دو حد (یا پایان بخش فایل) ثبت می‌شود
+CHECKPOINT_ROWS = 20000
+CHECKPOINT_SECONDS = 0.25
+
+# هر بخش فایل در تکه‌هایی با این تعداد سطر ثبت می‌شود تا حد زمانی نقطه بازیابی
+# (و لغو کار) بین تکه‌ها بررسی شود
+CHECKPOINT_SLICE_ROWS = 1000
+
+# گزارش پیشرفت کارهای پس‌زمینه در این مقیاس (سیگنال‌های Qt عدد 32 بیتی دارند)
+PROGRESS_SCALE = 1000
+
+# ستون‌های عددی به ترتیب بررسی (همان ترتیب پیام‌های product_values)
+NUMERIC_COLUMNS = ('price', 'stock', 'min_stock')
+
+# پسوند فایل سطرهای ردشده در کنار فایل ورودی
+REJECTED_SUFFIX = '_rejected.csv'
+
+# ستون کلید و ستون‌هایی که در حالت ادغام (در صورت وجود در فایل) به‌روز می‌شوند
+MERGE_KEY = 'barcode'
+MERGE_COLUMNS = ('name', 'price', 'category', 'image', 'stock', 'min_stock', 'description')
+
+# مقدار پیش‌فرض ستون min_stock در جدول products (برای خانه‌های خالی)
+DEFAULT_MIN_STOCK = 5
+
+# مقدار ستون‌های عددی خالی در lenient_product_values
+LENIENT_DEFAULTS = {'price': 0, 'stock': 0, 'min_stock': DEFAULT_MIN_STOCK}
+
+# پسوندهایی که openpyxl می‌تواند به صورت جریانی بخواند (xls قدیمی فقط از طریق pandas)
+STREAMING_EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xltx', '.xltm')
+
+_INSERT_PRODUCT = (
+    "INSERT INTO products (name, price, category, category_id, image, stock, min_stock, description, "
+    "barcode, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def missing_columns(columns, required=REQUIRED_COLUMNS):
+    """ستون‌های لازمی که در سرستون‌های فایل نیستند"""
+    columns = {str(column).strip() for column in columns}
+    return [column for column in required if column not in columns]
+
+
+def _is_empty(value):
+    # NaN (مثلاً از pandas) با خودش برابر نیست
+    return value is None or value != value or (isinstance(value, str) and not value.strip())
+
+
+def _text(value):
+    if _is_empty(value):
+        return ''
+    # pandas ستون عددی با خانه خالی را float می‌خواند (بارکد 123 به صورت 123.0)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _number(value, name):
+    if _is_empty(value):
+        raise ValueError(f"مقدار {name} خالی است")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = math.nan
+    # nan و inf از float() پذیرفته می‌شوند اما مقدار معتبری نیستند
+    if not math.isfinite(number):
+        raise ValueError(f"مقدار {name} نامعتبر است: {value}")
+    return number
+
+
+def product_values(row):
+    """تبدیل یک سطر فایل (دیکشنری نام ستون به مقدار) به مقادیر محصول
+
+    Returns:
+        tuple: (name, price, category, image, stock, min_stock, description, barcode)
+
+    Raises:
+        ValueError: اگر مقادیر سطر نامعتبر باشند
+    """
+    name = _text(row.get('name'))
+    price = _number(row.get('price'), 'price')
+    stock = int(_number(row.get('stock'), 'stock'))
+    min_stock = int(_number(row.get('min_stock'), 'min_stock'))
+    if not name:
+        raise ValueError("نام محصول خالی است")
+    if price < 0 or stock < 0 or min_stock < 0:
+        raise ValueError("قیمت و موجودی نمی‌توانند منفی باشند")
+    category = _text(row.get('category')) or None
+    return (name, price, category, _text(row.get('image')), stock, min_stock, _text(row.get('description')),
+            _text(row.get(MERGE_KEY)) or None)
+
+
+def lenient_product_values(row):
+    """مانند product_values اما price و stock خالی صفر و min_stock خالی DEFAULT_MIN_STOCK است
+
+    Raises:
+        ValueError: اگر مقدار عددی نامعتبر یا منفی باشد
+    """
+    def number(column, default):
+        value = row.get(column)
+        return default if _is_empty(value) else _number(value, column)
+
+    price = number('price', 0)
+    stock = int(number('stock', 0))
+    min_stock = int(number('min_stock', DEFAULT_MIN_STOCK))
+    name = _text(row.get('name'))
+    if not name:
+        raise ValueError("نام محصول خالی است")
+    if price < 0 or stock < 0 or min_stock < 0:
+        raise ValueError("قیمت و موجودی نمی‌توانند منفی باشند")
+    category = _text(row.get('category')) or None
+    return (name, price, category, _text(row.get('image')), stock, min_stock,
+            _text(row.get('description')), _text(row.get(MERGE_KEY)) or None)
+
+
+class ImportResult:
+    """نتیجه یک عملیات وارد کردن"""
+
+    __slots__ = ('total', 'imported', 'updated', 'unchanged', 'failed', 'errors', 'rejected', 'rejected_path')
+
+    def __init__(self, keep_rejected=False):
+        self.total = 0
+        # imported: محصولات جدید؛ updated و unchanged فقط در حالت ادغام
+        self.imported = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        # فهرست (شماره سطر در فایل، پیام خطا)
+        self.errors = []
+        # سطرهای ردشده‌ای که هنوز در فایل سطرهای ردشده نوشته نشده‌اند: (شماره سطر، پیام، مقادیر)
+        self.rejected = [] if keep_rejected else None
+        self.rejected_path = None
+
+    def add_error(self, row_number, message, row=None):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((row_number, message))
+        if self.rejected is not None:
+            self.rejected.append((row_number, message, row or {}))
+
+    def take_rejected(self):
+        """سطرهای ردشده جمع‌شده از آخرین فراخوانی (و خالی کردن فهرست)"""
+        rejected = self.rejected
+        if rejected is None:
+            return []
+        self.rejected = []
+        return rejected
+
+    def __repr__(self):
+        return (f"ImportResult(total={self.total!r}, imported={self.imported!r}, updated={self.updated!r}, "
+                f"unchanged={self.unchanged!r}, failed={self.failed!r})")
+
+
+class Chunk:
+    """بخشی از سطرهای فایل به صورت ستونی
+
+    منبع‌ها به جای یک دیکشنری برای هر سطر، برای هر ستون یک فهرست مقادیر می‌سازند تا
+    اعتبارسنجی برداری بدون بیرون کشیدن مقادیر از تک‌تک سطرها انجام شود. پیمایش بخش
+    (برای مسیرهای سطر به سطر) همان (شماره سطر، دیکشنری مقادیر) قبلی را می‌دهد.
+    """
+
+    __slots__ = ('row_numbers', 'columns')
+
+    def __init__(self, row_numbers, columns):
+        """
+        Args:
+            row_numbers (list): شماره سطرها در فایل به ترتیب صعودی
+            columns (dict): نام ستون به فهرست مقادیر (هم‌طول با row_numbers)
+        """
+        self.row_numbers = row_numbers
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.row_numbers)
+
+    def __iter__(self):
+        names = list(self.columns)
+        for row_number, values in zip(self.row_numbers, zip(*self.columns.values())):
+            yield row_number, dict(zip(names, values))
+
+    def column(self, name):
+        """مقادیر یک ستون؛ ستون ناموجود خالی (None) است"""
+        values = self.columns.get(name)
+        return values if values is not None else [None] * len(self.row_numbers)
+
+    def row(self, index):
+        """دیکشنری مقادیر یک سطر (برای گزارش سطرهای ردشده)"""
+        return {name: values[index] for name, values in self.columns.items()}
+
+    def slice(self, start, stop=None):
+        """سطرهای start تا stop (بدون stop) به صورت یک بخش جدا"""
+        if start == 0 and (stop is None or stop >= len(self.row_numbers)):
+            return self
+        return Chunk(self.row_numbers[start:stop],
+                     {name: values[start:stop] for name, values in self.columns.items()})
+
+    def after(self, row_number):
+        """سطرهای بعد از یک شماره سطر (برای ادامه وارد کردن)"""
+        return self.slice(bisect.bisect_right(self.row_numbers, row_number))
+
+
+def _text_column(values):
+    """متن هر خانه مانند _text؛ ستون‌های CSV (فقط رشته) با یک strip ساده"""
+    try:
+        return [value.strip() for value in values]
+    except AttributeError:
+        return [_text(value) for value in values]
+
+
+def _float_or_nan(text):
+    try:
+        return float(text) if text else np.nan
+    except ValueError:
+        return np.nan
+
+
+def _number_column(values):
+    """تبدیل یک ستون به float64 با همان قواعد float()
+
+    Returns:
+        tuple: (اعداد با NaN برای خانه‌های خالی و نامعتبر، ماسک خانه‌های خالی، ماسک خانه‌های نامعتبر)
+    """
+    try:
+        # مسیر سریع: همه خانه‌ها عدد یا متن عددی هستند (None و NaN به NaN تبدیل می‌شوند)
+        numbers = np.array(values, dtype=np.float64)
+        empty = np.isnan(numbers)
+        if empty.any():
+            # متن "nan" عدد معتبری نیست و خالی هم محسوب نمی‌شود
+            for index in np.flatnonzero(empty).tolist():
+                empty[index] = _is_empty(values[index])
+        invalid = ~empty & ~np.isfinite(numbers)
+    except (TypeError, ValueError):
+        # دست‌کم یک خانه خالی یا نامعتبر است؛ pandas بقیه خانه‌ها را تبدیل می‌کند و فقط
+        # خانه‌هایی که نمی‌شناسد (مثلاً ارقام فارسی که float() می‌پذیرد) جداگانه تبدیل می‌شوند
+        texts = _text_column(values)
+        numbers = pd.to_numeric(pd.Series(texts, dtype=object), errors='coerce').to_numpy(dtype=np.float64, copy=True)
+        empty = np.fromiter(map(operator.not_, texts), dtype=bool, count=len(texts))
+        for index in np.flatnonzero(np.isnan(numbers) & ~empty).tolist():
+            numbers[index] = _float_or_nan(texts[index])
+        invalid = ~empty & ~np.isfinite(numbers)
+    return numbers, empty, invalid
+
+
+def _python_numbers(numbers, integer=False):
+    """مقادیر یک ستون عددی به صورت اشیای پایتون (NaN به None)؛ sqlite3 انواع NumPy را نمی‌پذیرد"""
+    missing = np.isnan(numbers)
+    if integer:
+        numbers = np.trunc(np.where(missing, 0, numbers)).astype(np.int64)
+    if not missing.any():
+        return numbers.tolist()
+    values = numbers.astype(object)
+    values[missing] = None
+    return values.tolist()
+
+
+def validate_chunk(chunk, columns, required=(), defaults=None, key=None, keep='last'):
+    """اعتبارسنجی برداری یک بخش ستونی با NumPy و pandas
+
+    هر ستون عددی یک بار به آرایه float64 تبدیل می‌شود و خالی، نامعتبر و منفی بودن
+    مقادیر، خالی بودن نام و تکرار کلید با ماسک‌های برداری بررسی می‌شوند. برای هر سطر
+    ردشده اولین دلیل با همان پیام‌ها و ترتیب product_values برگردانده می‌شود.
+
+    Args:
+        chunk (Chunk): بخش ستونی
+        columns (iterable): ستون‌های خوانده‌شده؛ ستون‌های NUMERIC_COLUMNS عددی هستند
+        required (iterable): ستون‌هایی که نباید خالی باشند
+        defaults (dict): مقدار ستون‌های عددی خالی (مانند lenient_product_values)
+        key (str): ستونی که مقدار تکراری آن در بخش رد می‌شود
+        keep (str): 'first' یا 'last'؛ کدام سطر از مقادیر تکراری کلید می‌ماند
+
+    Returns:
+        tuple: (ماسک سطرهای معتبر، دیکشنری ستون به فهرست مقادیر سطرهای معتبر، فهرست
+            (شماره ردیف در بخش، دلیل رد))؛ خانه‌های خالی در ستون‌های عددی None و در
+            بقیه رشته خالی هستند
+    """
+    size = len(chunk)
+    defaults = defaults or {}
+    valid = np.ones(size, dtype=bool)
+    reasons = {}
+
+    def reject(mask, message):
+        # فقط اولین دلیل هر سطر نگه داشته می‌شود
+        mask = mask & valid
+        if mask.any():
+            for index in np.flatnonzero(mask).tolist():
+                reasons[index] = message(index) if callable(message) else message
+            valid[mask] = False
+
+    texts = {}
+    numbers = {}
+    for column in columns:
+        if column not in NUMERIC_COLUMNS:
+            texts[column] = _text_column(chunk.column(column))
+            continue
+        raw = chunk.column(column)
+        values, empty, invalid = _number_column(raw)
+        if column in defaults:
+            values[empty] = defaults[column]
+        elif column in required:
+            reject(empty, f"مقدار {column} خالی است")
+        if invalid.any():
+            reject(invalid, lambda index: f"مقدار {column} نامعتبر است: {raw[index]}")
+        numbers[column] = values
+
+    if 'name' in required:
+        reject(np.fromiter(map(operator.not_, texts['name']), dtype=bool, count=size), "نام محصول خالی است")
+    negative = np.zeros(size, dtype=bool)
+    for values in numbers.values():
+        negative |= values < 0
+    reject(negative, "قیمت و موجودی نمی‌توانند منفی باشند")
+
+    if key is not None:
+        keys = pd.Series(texts[key], dtype=object)
+        duplicate = (valid & (keys != '').to_numpy()) & keys.where(valid).duplicated(keep=keep).to_numpy()
+        if keep == 'first':
+            reject(duplicate, lambda index: f"{key} {texts[key][index]} قبلاً ثبت شده است")
+        else:
+            reject(duplicate, lambda index: f"{key} {texts[key][index]} در سطر بعدی فایل تکرار شده است")
+
+    selected = None if valid.all() else valid.tolist()
+    values = {}
+    for column in columns:
+        if column in numbers:
+            column_values = _python_numbers(numbers[column][valid], integer=column != 'price')
+        else:
+            column_values = texts[column]
+            if selected is not None:
+                column_values = list(itertools.compress(column_values, selected))
+        values[column] = column_values
+    return valid, values, sorted(reasons.items())
+
+
+def rejected_rows_path(file_path):
+    """مسیر فایل سطرهای ردشده در کنار فایل ورودی"""
+    return os.path.splitext(file_path)[0] + REJECTED_SUFFIX
+
+
+class RejectedRowsWriter:
+    """نوشتن سطرهای ردشده (شماره سطر، دلیل و مقادیر اصلی) در یک فایل CSV کناری
+
+    فایل در اولین سطر ردشده ساخته می‌شود؛ اگر هیچ سطری رد نشود فایلی ایجاد نمی‌شود.
+    در شروع دوباره (بدون append) گزارش قبلی همان فایل ورودی حذف می‌شود.
+    """
+
+    def __init__(self, path, columns, append=False):
+        self.path = path
+        self.columns = list(columns)
+        self.append = append
+        self.count = 0
+        self._file = None
+        self._writer = None
+        if not append and os.path.exists(path):
+            os.remove(path)
+
+    def write(self, rejected):
+        if not rejected:
+            return
+        if self._file is None:
+            exists = self.append and os.path.exists(self.path)
+            self._file = open(self.path, 'a' if exists else 'w', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file)
+            if not exists:
+                self._writer.writerow(['row', 'reason'] + self.columns)
+        self._writer.writerows(
+            [row_number, message] + [_text(row.get(column)) for column in self.columns]
+            for row_number, message, row in rejected
+        )
+        self._file.flush()
+        self.count += len(rejected)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _chunks(rows, columns, chunk_size, first_row=2):
+    """تبدیل سطرهای خام به بخش‌های ستونی (Chunk)؛ سطرهای خالی رد می‌شوند"""
+    row_numbers = []
+    chunk = []
+    for row_number, values in enumerate(rows, start=first_row):
+        # بیشتر سطرها خانه اول غیرخالی دارند و بدون بررسی بقیه خانه‌ها پذیرفته می‌شوند
+        if not values or (_is_empty(values[0]) and all(_is_empty(value) for value in values)):
+            continue
+        row_numbers.append(row_number)
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            yield _transposed(row_numbers, chunk, columns)
+            row_numbers = []
+            chunk = []
+    if chunk:
+        yield _transposed(row_numbers, chunk, columns)
+
+
+def _transposed(row_numbers, rows, columns):
+    # سطرهای کوتاه‌تر از سرستون‌ها با None تکمیل و خانه‌های اضافه کنار گذاشته می‌شوند
+    width = len(columns)
+    values_by_column = itertools.zip_longest(*(row[:width] for row in rows))
+    return Chunk(row_numbers, {name: list(values) for name, values in zip(columns, values_by_column)})
+
+
+class CsvSource:
+    """خواندن جریانی فایل CSV در بخش‌های ثابت
+
+    پیشرفت بر اساس موقعیت در فایل (بایت) محاسبه می‌شود، پس نیازی به شمردن سطرها
+    پیش از شروع نیست.
+    """
+
+    def __init__(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8-sig'):
+        self.chunk_size = chunk_size
+        self.total = os.path.getsize(file_path)
+        self._raw = open(file_path, 'rb')
+        self._text = io.TextIOWrapper(self._raw, encoding=encoding, newline='')
+        self._reader = csv.reader(self._text)
+        header = next(self._reader, [])
+        self.columns = [column.strip() for column in header]
+
+    def progress(self):
+        """(مقدار انجام‌شده، کل) برای نوار پیشرفت"""
+        return min(self._raw.tell(), self.total), self.total
+
+    def __iter__(self):
+        """بخش‌های ستونی (Chunk)"""
+        # سطر 1 سرستون‌ها است
+        return _chunks(self._reader, self.columns, self.chunk_size)
+
+    def close(self):
+        self._text.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ExcelSource:
+    """خواندن جریانی اولین کاربرگ یک فایل xlsx با openpyxl در حالت فقط‌خواندنی
+
+    سطرها مستقیماً از XML فایل خوانده می‌شوند و کل کاربرگ هیچ‌گاه در حافظه قرار
+    نمی‌گیرد؛ مصرف حافظه به اندازه فایل بستگی ندارد.
+    """
+
+    def __init__(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        if openpyxl is None:
+            raise ImportError("برای خواندن فایل Excel، کتابخانه openpyxl باید نصب شده باشد.")
+        self.chunk_size = chunk_size
+        self._workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        sheet = self._workbook.worksheets[0]
+        self._rows = sheet.iter_rows(values_only=True)
+        header = next(self._rows, ())
+        self.columns = [_text(column) for column in header]
+        # ابعاد ثبت‌شده در فایل؛ برخی برنامه‌ها آن را نمی‌نویسند و کل نامعلوم (0) می‌ماند
+        self.total = max((sheet.max_row or 1) - 1, 0)
+        self._done = 0
+
+    def progress(self):
+        return self._done, max(self.total, self._done) if self.total else 0
+
+    def _counted(self):
+        for values in self._rows:
+            self._done += 1
+            yield values
+
+    def __iter__(self):
+        return _chunks(self._counted(), self.columns, self.chunk_size)
+
+    def close(self):
+        self._workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DataFrameSource:
+    """بخش‌بندی یک DataFrame از قبل خوانده‌شده (مثلاً از pandas.read_excel)"""
+
+    def __init__(self, df, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.df = df
+        self.chunk_size = chunk_size
+        self.columns = [str(column).strip() for column in df.columns]
+        self.total = len(df)
+        self._done = 0
+
+    def progress(self):
+        return self._done, self.total
+
+    def __iter__(self):
+        for start in range(0, self.total, self.chunk_size):
+            part = self.df.iloc[start:start + self.chunk_size]
+            self._done = start + len(part)
+            # سطر 1 فایل سرستون‌ها است
+            yield Chunk(list(range(start + 2, start + 2 + len(part))),
+                        {name: part.iloc[:, i].tolist() for i, name in enumerate(self.columns)})
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def excel_source(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """منبع مناسب برای یک فایل Excel
+
+    فایل‌های xlsx به صورت جریانی خوانده می‌شوند؛ فایل‌های xls قدیمی (یا نبودن
+    openpyxl) به pandas.read_excel برمی‌گردند که کل فایل را یک‌جا می‌خواند.
+    """
+    if openpyxl is not None and file_path.lower().endswith(STREAMING_EXCEL_EXTENSIONS):
+        return ExcelSource(file_path, chunk_size)
+    if pd is None:
+        raise ImportError("برای خواندن این فایل Excel، کتابخانه pandas باید نصب شده باشد.")
+    return DataFrameSource(pd.read_excel(file_path), chunk_size)
+
+
+class ProductImporter:
+    """درج گروهی محصولات از یک منبع بخش‌بندی‌شده روی اتصال نویسنده
+
+    فراخواننده مسئول تراکنش است (معمولاً manager.bulk_transaction())؛ اگر
+    خطایی رخ دهد کل عملیات برگردانده می‌شود.
+    """
+
+    def __init__(self, conn, on_progress=None, progress_interval=PROGRESS_INTERVAL, values=product_values):
+        """
+        Args:
+            conn (sqlite3.Connection): اتصال نویسنده
+            on_progress (callable): دریافت (انجام‌شده، کل، نتیجه تا این لحظه)؛ کل
+                نامعلوم با 0 مشخص می‌شود
+            progress_interval (float): حداقل فاصله زمانی بین دو گزارش پیشرفت
+            values (callable): تبدیل یک سطر به مقادیر محصول (مانند product_values)
+        """
+        self.conn = conn
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.values = values
+        # نام دسته‌بندی -> شناسه، برای بخش‌های بعدی همین عملیات
+        self._categories = {}
+        self._last_report = None
+
+    def _category_ids(self, names):
+        """شناسه دسته‌بندی‌ها؛ دسته‌بندی‌های جدید با یک دستور INSERT ... SELECT اضافه می‌شوند"""
+        new_names = [name for name in names if name not in self._categories]
+        if new_names:
+            payload = json.dumps(new_names, ensure_ascii=False)
+            self.conn.execute(
+                "INSERT INTO categories (name) SELECT value FROM json_each(?) "
+                "WHERE value NOT IN (SELECT name FROM categories WHERE name IS NOT NULL)",
+                (payload,)
+            )
+            self._categories.update(self.conn.execute(
+                "SELECT name, MIN(id) FROM categories WHERE name IN (SELECT value FROM json_each(?)) GROUP BY name",
+                (payload,)
+            ).fetchall())
+        return self._categories
+
+    def _report(self, source, result, force=False):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if not force and self._last_report is not None and now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        done, total = source.progress()
+        self.on_progress(done, total, result)
+
+    def import_chunk(self, chunk, result):
+        """درج یک بخش از سطرها
+
+        Args:
+            chunk (Chunk): بخش ستونی سطرها
+            result (ImportResult): نتیجه‌ای که به‌روز می‌شود
+        """
+        result.total += len(chunk)
+        if np is not None and self.values in (product_values, lenient_product_values):
+            products = self._validated_products(chunk, result)
+        else:
+            products = []
+            for index, (row_number, row) in enumerate(chunk):
+                try:
+                    products.append((index, self.values(row)))
+                except (TypeError, ValueError) as e:
+                    result.add_error(row_number, str(e), row)
+
+        products = self._unique_barcodes(chunk, products, result)
+        if not products:
+            return
+        # category و category_id با هم نوشته می‌شوند تا تریگر همگام‌سازی دسته‌بندی کاری نداشته باشد
+        category_ids = self._category_ids({product[2] for _, product in products if product[2]})
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.conn.executemany(_INSERT_PRODUCT, [
+            (name, price, category, category_ids.get(category), image, stock, min_stock, description, barcode,
+             timestamp, timestamp)
+            for _, (name, price, category, image, stock, min_stock, description, barcode) in products
+        ])
+        result.imported += len(products)
+
+    def _validated_products(self, chunk, result):
+        """(ردیف در بخش، خروجی product_values) سطرهای معتبر با اعتبارسنجی برداری
+
+        بارکدهای تکراری داخل بخش هم اینجا رد می‌شوند (اولین سطر می‌ماند).
+        """
+        if self.values is lenient_product_values:
+            required, defaults = ('name',), LENIENT_DEFAULTS
+        else:
+            required, defaults = REQUIRED_COLUMNS, None
+        valid, values, rejected = validate_chunk(chunk, REQUIRED_COLUMNS + OPTIONAL_COLUMNS, required=required,
+                                                 defaults=defaults, key=MERGE_KEY, keep='first')
+        for index, message in rejected:
+            result.add_error(chunk.row_numbers[index], message, chunk.row(index))
+        categories = [category or None for category in values['category']]
+        barcodes = [barcode or None for barcode in values[MERGE_KEY]]
+        return list(zip(np.flatnonzero(valid).tolist(),
+                        zip(values['name'], values['price'], categories, values['image'], values['stock'],
+                            values['min_stock'], values['description'], barcodes)))
+
+    def _unique_barcodes(self, chunk, products, result):
+        """رد سطرهایی که بارکد آن‌ها در محصولات موجود یا سطرهای قبلی همین فایل ثبت شده است
+
+        بارکد تکراری ادغام بعدی بر اساس بارکد (و شاخص یکتای آن) را ناممکن می‌کند.
+
+        Args:
+            products (list): فهرست (ردیف در بخش، مقادیر محصول)
+        """
+        barcodes = [product[7] for _, product in products if product[7]]
+        if not barcodes:
+            return products
+        existing = {barcode for barcode, in self.conn.execute(
+            f"SELECT {MERGE_KEY} FROM products WHERE {MERGE_KEY} IN (SELECT value FROM json_each(?))",
+            (json.dumps(barcodes, ensure_ascii=False),)
+        )}
+        unique = []
+        for index, product in products:
+            barcode = product[7]
+            if barcode:
+                if barcode in existing:
+                    result.add_error(chunk.row_numbers[index], f"{MERGE_KEY} {barcode} قبلاً ثبت شده است",
+                                     chunk.row(index))
+                    continue
+                existing.add(barcode)
+            unique.append((index, product))
+        return unique
+
+    def run(self, source):
+        """وارد کردن همه بخش‌های یک منبع
+
+        Returns:
+            ImportResult: تعداد سطرهای خوانده‌شده، واردشده و ناموفق
+        """
+        result = ImportResult()
+        self._report(source, result, force=True)
+        for chunk in source:
+            self.import_chunk(chunk, result)
+            self._report(source, result)
+        self._report(source, result, force=True)
+        return result
+
+
+def ensure_merge_index(conn):
+    """اطمینان از وجود شاخص یکتای بارکد که ادغام به آن نیاز دارد
+
+    Raises:
+        ValueError: اگر بارکد تکراری مانع ساخت شاخص شود
+    """
+    duplicates = duplicate_barcodes(conn)
+    if duplicates:
+        raise ValueError(
+            "برای ادغام بر اساس بارکد، بارکد هر محصول باید یکتا باشد. بارکدهای تکراری: "
+            + ", ".join(duplicates)
+        )
+    conn.execute(BARCODE_UNIQUE_INDEX_SQL)
+
+
+class ProductMerger(ProductImporter):
+    """ادغام سطرهای فایل با محصولات موجود بر اساس بارکد
+
+    هر سطر با INSERT ... ON CONFLICT(barcode) DO UPDATE درج یا به‌روز می‌شود. فقط
+    ستون‌های موجود در فایل نوشته می‌شوند، خانه خالی مقدار فعلی را نگه می‌دارد و
+    سطرهایی که تغییری ندارند اصلاً به‌روز نمی‌شوند (پس تریگرها و تاریخچه تغییرات
+    برای آن‌ها اجرا نمی‌شوند). تغییر موجودی در همان بخش در inventory_history ثبت می‌شود.
+    """
+
+    def __init__(self, conn, columns, on_progress=None, progress_interval=PROGRESS_INTERVAL):
+        """
+        Args:
+            conn (sqlite3.Connection): اتصال نویسنده
+            columns (list): سرستون‌های فایل
+        """
+        super().__init__(conn, on_progress, progress_interval)
+        columns = {str(column).strip() for column in columns}
+        self.columns = [column for column in MERGE_COLUMNS if column in columns]
+        if MERGE_KEY not in columns or not self.columns:
+            raise ValueError(
+                f"برای ادغام، فایل باید ستون {MERGE_KEY} و دست‌کم یکی از ستون‌های "
+                f"{', '.join(MERGE_COLUMNS)} را داشته باشد."
+            )
+        self._sql = self._upsert_sql()
+
+    def _upsert_sql(self):
+        columns = [MERGE_KEY] + self.columns
+        if 'category' in self.columns:
+            columns.insert(columns.index('category') + 1, 'category_id')
+        placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+        updates = ", ".join(f"{column} = COALESCE(excluded.{column}, products.{column})"
+                            for column in columns[1:])
+        # دسته‌بندی با category_id مقایسه می‌شود؛ متن category پس از تغییر نام دسته‌بندی
+        # به‌روز نمی‌شود و مقایسه آن همه سطرها را تغییرکرده نشان می‌داد
+        compared = ['category_id' if column == 'category' else column for column in self.columns]
+        changed = " OR ".join(f"(excluded.{column} IS NOT NULL AND excluded.{column} IS NOT products.{column})"
+                              for column in compared)
+        return (
+            f"INSERT INTO products ({', '.join(columns)}, created_at, updated_at) VALUES ({placeholders}) "
+            f"ON CONFLICT({MERGE_KEY}) WHERE {MERGE_KEY} IS NOT NULL AND {MERGE_KEY} <> '' "
+            f"DO UPDATE SET {updates}, updated_at = excluded.updated_at WHERE {changed}"
+        )
+
+    def _row_values(self, row):
+        """(بارکد، دیکشنری مقادیر ستون‌های فایل)؛ خانه‌های خالی None هستند"""
+        values = {}
+        for column in self.columns:
+            value = row.get(column)
+            if _is_empty(value):
+                values[column] = None
+            elif column == 'price':
+                values[column] = _number(value, column)
+            elif column in ('stock', 'min_stock'):
+                values[column] = int(_number(value, column))
+            else:
+                values[column] = _text(value)
+        if any(values.get(column) is not None and values[column] < 0 for column in ('price', 'stock', 'min_stock')):
+            raise ValueError("قیمت و موجودی نمی‌توانند منفی باشند")
+        return _text(row.get(MERGE_KEY)) or None, values
+
+    def _parsed_rows(self, chunk, result):
+        """(ردیف در بخش، بارکد، مقادیر) سطرهای معتبر؛ سطرهای نامعتبر در result ثبت می‌شوند
+
+        با NumPy و pandas بخش به صورت برداری بررسی و از هر بارکد تکراری فقط آخرین سطر
+        نگه داشته می‌شود؛ در غیر این صورت سطر به سطر با _row_values.
+        """
+        if np is None:
+            parsed = []
+            for index, (row_number, row) in enumerate(chunk):
+                try:
+                    barcode, values = self._row_values(row)
+                except (TypeError, ValueError) as e:
+                    result.add_error(row_number, str(e), row)
+                    continue
+                parsed.append((index, barcode, values))
+            return parsed
+
+        valid, values, rejected = validate_chunk(chunk, [MERGE_KEY] + self.columns, key=MERGE_KEY)
+        for index, message in rejected:
+            result.add_error(chunk.row_numbers[index], message, chunk.row(index))
+        # خانه خالی در ادغام یعنی نگه داشتن مقدار فعلی
+        for column in [MERGE_KEY] + self.columns:
+            if column not in NUMERIC_COLUMNS:
+                values[column] = [value or None for value in values[column]]
+        rows = zip(*(values[column] for column in self.columns))
+        return [(index, barcode, dict(zip(self.columns, row)))
+                for index, barcode, row in zip(np.flatnonzero(valid).tolist(), values[MERGE_KEY], rows)]
+
+    @staticmethod
+    def _new_product(values):
+        """مقادیر یک محصول جدید با پیش‌فرض‌های جدول؛ ValueError اگر نام یا قیمت نداشته باشد"""
+        if not values.get('name') or values.get('price') is None:
+            raise ValueError("محصول جدید باید نام و قیمت داشته باشد")
+        values = dict(values)
+        defaults = (('stock', 0), ('min_stock', DEFAULT_MIN_STOCK), ('image', ''), ('description', ''))
+        for column, default in defaults:
+            if column in values and values[column] is None:
+                values[column] = default
+        return values
+
+    def import_chunk(self, chunk, result):
+        """ادغام یک بخش از سطرها
+
+        Args:
+            chunk (Chunk): بخش ستونی سطرها
+            result (ImportResult): نتیجه‌ای که به‌روز می‌شود
+        """
+        # آخرین سطر هر بارکد در بخش استفاده می‌شود
+        keyed = {}
+        unkeyed = []
+        result.total += len(chunk)
+        for index, barcode, values in self._parsed_rows(chunk, result):
+            if barcode is None:
+                unkeyed.append((index, barcode, values))
+                continue
+            previous = keyed.get(barcode)
+            if previous is not None:
+                result.add_error(chunk.row_numbers[previous[0]],
+                                 f"{MERGE_KEY} {barcode} در سطر بعدی فایل تکرار شده است", chunk.row(previous[0]))
+            keyed[barcode] = (index, barcode, values)
+
+        existing = {}
+        if keyed:
+            existing = {barcode: (product_id, stock) for barcode, product_id, stock in self.conn.execute(
+                f"SELECT {MERGE_KEY}, id, stock FROM products WHERE {MERGE_KEY} IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(keyed), ensure_ascii=False),)
+            )}
+
+        rows = []
+        inserted = 0
+        for index, barcode, values in list(keyed.values()) + unkeyed:
+            if barcode not in existing:
+                try:
+                    values = self._new_product(values)
+                except ValueError as e:
+                    result.add_error(chunk.row_numbers[index], str(e), chunk.row(index))
+                    continue
+                inserted += 1
+            rows.append((barcode, values))
+        if not rows:
+            return
+
+        category_ids = {}
+        if 'category' in self.columns:
+            category_ids = self._category_ids({values['category'] for _, values in rows if values['category']})
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        params = []
+        for barcode, values in rows:
+            record = [barcode]
+            for column in self.columns:
+                record.append(values[column])
+                if column == 'category':
+                    record.append(category_ids.get(values[column]))
+            record += (timestamp, timestamp)
+            params.append(record)
+        changed = self.conn.executemany(self._sql, params).rowcount
+
+        matched = len(rows) - inserted
+        result.imported += inserted
+        result.updated += changed - inserted
+        result.unchanged += matched - (changed - inserted)
+
+        # تغییرات موجودی محصولات موجود در همان تراکنش
+        if 'stock' in self.columns:
+            history = []
+            for barcode, values in rows:
+                if barcode not in existing or values['stock'] is None:
+                    continue
+                product_id, old_stock = existing[barcode]
+                old_stock = old_stock or 0
+                if values['stock'] != old_stock:
+                    change_amount = values['stock'] - old_stock
+                    history.append((product_id, abs(change_amount), "increase" if change_amount > 0 else "decrease",
+                                    f"Stock updated from {old_stock} to {values['stock']} (import)"))
+            InventoryRepository(self.conn).add_many(history)
+
+
+def file_identity(file_path):
+    """(مسیر کامل، اندازه، زمان تغییر) برای تشخیص همان نسخه فایل"""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+def unfinished_import(conn, file_path, merge=False):
+    """آخرین وارد کردن نیمه‌کاره همین فایل (بدون تغییر از آن زمان) در همان حالت
+
+    Returns:
+        tuple: (id، آخرین سطر ثبت‌شده، total، imported، failed، updated، unchanged) یا None
+    """
+    return conn.execute(
+        "SELECT id, last_row, total, imported, failed, updated, unchanged FROM import_jobs "
+        "WHERE file_path = ? AND file_size = ? AND file_mtime = ? AND mode = ? AND status = 'running' "
+        "ORDER BY id DESC LIMIT 1",
+        file_identity(file_path) + ('merge' if merge else 'append',)
+    ).fetchone()
+
+
+def run_import_job(manager, source, file_path, job=None, values=product_values, resume=None,
+                   checkpoint_rows=CHECKPOINT_ROWS, merge=False, rejected_path=None,
+                   checkpoint_seconds=CHECKPOINT_SECONDS):
+    """وارد کردن یک منبع با ثبت مرحله‌ای در نقاط بازیابی
+
+    هر نقطه بازیابی (حداکثر checkpoint_rows سطر یا checkpoint_seconds ثانیه) با یک
+    COMMIT ثبت و شماره آخرین سطر در import_jobs ذخیره می‌شود. فایل بیرون از قفل نوشتن
+    خوانده می‌شود تا خواندن‌ها و نوشتن‌های رابط کاربری بین نقاط بازیابی انجام شوند.
+    با لغو کار (یا بسته شدن برنامه) فقط بخش ثبت‌نشده برگردانده می‌شود و وارد کردن
+    بعدی همان فایل با resume از سطر بعدی ادامه می‌یابد.
+
+    Args:
+        manager (ConnectionManager): مدیر اتصال
+        source: CsvSource، ExcelSource یا DataFrameSource
+        file_path (str): مسیر فایل منبع
+        job (DatabaseJob): کار پس‌زمینه برای بررسی لغو و گزارش پیشرفت
+        values (callable): تبدیل یک سطر به مقادیر محصول
+        resume (tuple): نتیجه unfinished_import برای ادامه، یا None برای شروع دوباره
+        merge (bool): ادغام با محصولات موجود بر اساس بارکد به جای افزودن همه سطرها
+        rejected_path (str): مسیر فایل CSV سطرهای ردشده؛ سطرهای هر نقطه بازیابی پس
+            از ثبت آن نوشته می‌شوند تا ادامه وارد کردن سطر تکراری ننویسد
+        checkpoint_seconds (float): حداکثر زمان نگه داشتن قفل نوشتن در هر نقطه بازیابی
+
+    Returns:
+        ImportResult: نتیجه کل (همراه با سطرهای ثبت‌شده در اجراهای قبلی)
+    """
+    def on_progress(done, total, _):
+        if job is not None:
+            if total:
+                job.report_progress(int(done * PROGRESS_SCALE / total), PROGRESS_SCALE)
+            else:
+                job.report_progress(0, 0)
+
+    # ستون‌های فایل پیش از ثبت وارد کردن در import_jobs بررسی می‌شوند
+    if merge:
+        importer = ProductMerger(None, source.columns, on_progress=on_progress)
+    else:
+        importer = ProductImporter(None, on_progress=on_progress, values=values)
+
+    result = ImportResult(keep_rejected=rejected_path is not None)
+    rejected_rows = None
+    if rejected_path is not None:
+        rejected_rows = RejectedRowsWriter(rejected_path, source.columns, append=resume is not None)
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with manager.bulk_transaction() as conn:
+        if merge:
+            ensure_merge_index(conn)
+        if resume is not None:
+            (import_id, last_row, result.total, result.imported, result.failed,
+             result.updated, result.unchanged) = resume
+        else:
+            import_id = conn.execute(
+                "INSERT INTO import_jobs (file_path, file_size, file_mtime, mode, started_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                file_identity(file_path) + ('merge' if merge else 'append', timestamp, timestamp)
+            ).lastrowid
+            last_row = 1
+
+    importer._report(source, result, force=True)
+    try:
+        _run_checkpoints(manager, importer, source, result, import_id, last_row, job, checkpoint_rows,
+                         checkpoint_seconds, rejected_rows)
+    finally:
+        if rejected_rows is not None:
+            rejected_rows.close()
+            if rejected_rows.count or (resume is not None and os.path.exists(rejected_path)):
+                result.rejected_path = rejected_path
+    importer._report(source, result, force=True)
+    return result
+
+
+def _run_checkpoints(manager, importer, source, result, import_id, last_row, job, checkpoint_rows,
+                     checkpoint_seconds, rejected_rows):
+    # هر بخش فایل بیرون از قفل نوشتن خوانده و سپس در یک یا چند نقطه بازیابی ثبت می‌شود
+    for chunk in source:
+        # سطرهایی که در اجرای قبلی ثبت شده‌اند فقط خوانده و رد می‌شوند
+        chunk = chunk.after(last_row)
+        start = 0
+        while start < len(chunk):
+            if job is not None:
+                job.check_cancelled()
+            with manager.bulk_transaction() as conn:
+                importer.conn = conn
+                deadline = time.monotonic() + checkpoint_seconds
+                rows = 0
+                while start < len(chunk) and rows < checkpoint_rows and time.monotonic() < deadline:
+                    if job is not None:
+                        job.check_cancelled()
+                    part = chunk.slice(start, start + min(CHECKPOINT_SLICE_ROWS, checkpoint_rows - rows))
+                    importer.import_chunk(part, result)
+                    start += len(part)
+                    rows += len(part)
+                last_row = chunk.row_numbers[start - 1]
+                _save_checkpoint(conn, import_id, last_row, result, 'running')
+            # سطرهای ردشده فقط پس از ثبت نقطه بازیابی نوشته می‌شوند
+            if rejected_rows is not None:
+                rejected_rows.write(result.take_rejected())
+            # فرصت برای نخ‌های منتظر قفل نوشتن (مثلاً رابط کاربری) پیش از نقطه بازیابی بعدی
+            time.sleep(0)
+        importer._report(source, result)
+
+    with manager.bulk_transaction() as conn:
+        _save_checkpoint(conn, import_id, last_row, result, 'done')
+
+
+def _save_checkpoint(conn, import_id, last_row, result, status):
+    conn.execute(
+        "UPDATE import_jobs SET last_row = ?, total = ?, imported = ?, failed = ?, updated = ?, "
+        "unchanged = ?, status = ?, updated_at = ? WHERE id = ?",
+        (last_row, result.total, result.imported, result.failed, result.updated, result.unchanged,
+         status, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), import_id)
+    )
@@ -1,6 +1,5 @@
 from PyQt5 import QtWidgets, QtGui, QtCore
-from PyQt5.QtWidgets import QMainWindow, QApplication, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QWidget, QFileDialog, QTableWidget, QTableWidgetItem, QDialog, QGridLayout, QComboBox, QFormLayout, QGroupBox, QScrollArea, QMenuBar, QAction, QDialogButtonBox, QMessageBox, QTabWidget, QCheckBox, QProgressBar, QRadioButton
-import pandas as pd
+from PyQt5.QtWidgets import QMainWindow, QApplication, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QWidget, QFileDialog, QTableWidget, QTableWidgetItem, QDialog, QGridLayout, QComboBox, QFormLayout, QGroupBox, QMenuBar, QAction, QDialogButtonBox, QMessageBox, QTabWidget, QCheckBox, QProgressBar, QRadioButton
 import csv
 import xlsxwriter
 import sqlite3
@@ -29,6 +28,22 @@ import json
 # برای کنترل دسترسی
 from access_control import AccessControl
 
+# اتصال مشترک به پایگاه داده
+from db_connection import get_connection_manager
+from migrations import run_migrations
+from repository import (ProductRepository, InventoryRepository, ProductFilter, PRODUCTS_FROM, page_query,
+                        search_page_query, page_key)
+from db_worker import DatabaseWorker
+from query_profiler import get_profiler
+from product_table_model import ProductTableModel, ProductTableView
+from product_gallery import ProductCardDelegate, ProductGalleryModel, ProductGalleryView
+from thumbnail_cache import thumbnail_size
+from image_loader import LOADING_TEXT, get_image_loader
+from catalog_cache import get_catalog
+from low_stock import LowStockTracker
+from product_import import (CsvSource, excel_source, missing_columns, rejected_rows_path, run_import_job,
+                            unfinished_import)
+
 # کلاس نمودار برای استفاده در داشبورد
 class MplCanvas(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
@@ -38,6 +53,17 @@ class MplCanvas(FigureCanvas):
         self.fig.tight_layout()
 
 class ProductManager(QMainWindow):
+    # ستون‌های جدول اصلی به ترتیب مورد انتظار ProductTableModel
+    PRODUCT_TABLE_COLUMNS = "p.id, p.name, p.price, p.discount_price, c.name, p.stock, p.min_stock"
+    # همان ستون‌ها از حافظه نهان کاتالوگ
+    PRODUCT_CATALOG_COLUMNS = ('id', 'name', 'price', 'discount_price', 'category', 'stock', 'min_stock')
+
+    # نگاشت گزینه‌های مرتب‌سازی به کلیدهای SORT_EXPRESSIONS در repository.py
+    PRODUCT_SORT_FIELDS = {'نام': 'name', 'قیمت': 'price', 'موجودی': 'stock'}
+
+    # مکث تایپ (میلی‌ثانیه) پیش از اجرای جستجوی خودکار
+    SEARCH_DEBOUNCE_MS = 250
+
     def __init__(self, auth_manager=None):
         super().__init__()
 
@@ -69,9 +95,22 @@ class ProductManager(QMainWindow):
             # بارگذاری تنظیمات از فایل
             self.load_settings()
 
-            # ابتدا اتصال به پایگاه داده را برقرار می‌کنیم
-            self.conn = sqlite3.connect('products.db')
+            # ابتدا اتصال به پایگاه داده را برقرار می‌کنیم (اتصال نویسنده مشترک)
+            self.db = get_connection_manager('products.db')
+            self.conn = self.db.writer
             self.cursor = self.conn.cursor()
+            self.products_repo = ProductRepository(self.conn)
+            self.inventory_repo = InventoryRepository(self.conn)
+
+            # اجرای پرس‌وجوهای سنگین در پس‌زمینه تا رابط کاربری قفل نشود
+            self.db_worker = DatabaseWorker(self.db, self)
+            # کار وارد کردن فایل در حال اجرا (فقط یکی در هر زمان)
+            self.import_job = None
+
+            # مجموعه محصولات با موجودی کم که با هر تغییر موجودی به صورت تدریجی به‌روز می‌شود
+            self.low_stock_tracker = LowStockTracker(self.db_worker, self)
+            self.low_stock_tracker.changed.connect(self._on_low_stock_changed)
+            self.low_stock_panel = None
 
             # ابتدا جداول پایگاه داده را ایجاد می‌کنیم
             self.initDB_tables()
@@ -274,102 +313,9 @@ class ProductManager(QMainWindow):
     def initDB_tables(self):
         """ایجاد جداول مورد نیاز در پایگاه داده"""
         try:
-            # جدول محصولات
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS products
-                                (id INTEGER PRIMARY KEY,
-                                name TEXT,
-                                price REAL,
-                                category TEXT,
-                                image TEXT,
-                                stock INTEGER DEFAULT 0,
-                                min_stock INTEGER DEFAULT 5,
-                                discount_price REAL,
-                                barcode TEXT,
-                                description TEXT,
-                                created_at TEXT,
-                                updated_at TEXT)''')
-            self.conn.commit()
-
-            # جدول دسته‌بندی‌ها
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS categories
-                                (id INTEGER PRIMARY KEY,
-                                name TEXT,
-                                description TEXT,
-                                parent_id INTEGER,
-                                created_at TEXT)''')
-            self.conn.commit()
-
-            # جدول تصاویر محصولات
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS product_images
-                                (id INTEGER PRIMARY KEY,
-                                product_id INTEGER,
-                                image_path TEXT,
-                                is_primary INTEGER DEFAULT 0,
-                                created_at TEXT,
-                                FOREIGN KEY (product_id) REFERENCES products(id))''')
-            self.conn.commit()
-
-            # جدول تاریخچه موجودی
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS inventory_history
-                                (id INTEGER PRIMARY KEY,
-                                product_id INTEGER,
-                                old_stock INTEGER,
-                                new_stock INTEGER,
-                                change_reason TEXT,
-                                user_id INTEGER,
-                                timestamp TEXT,
-                                FOREIGN KEY (product_id) REFERENCES products(id))''')
-            self.conn.commit()
-
-            # جدول تخفیف‌ها
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS discounts
-                                (id INTEGER PRIMARY KEY,
-                                name TEXT,
-                                discount_type TEXT,
-                                discount_value REAL,
-                                start_date TEXT,
-                                end_date TEXT,
-                                is_active INTEGER DEFAULT 1,
-                                created_at TEXT)''')
-            self.conn.commit()
-
-            # جدول ارتباط تخفیف‌ها با محصولات
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS product_discounts
-                                (id INTEGER PRIMARY KEY,
-                                product_id INTEGER,
-                                discount_id INTEGER,
-                                FOREIGN KEY (product_id) REFERENCES products(id),
-                                FOREIGN KEY (discount_id) REFERENCES discounts(id))''')
-            self.conn.commit()
-
-            # جدول فعالیت‌های سیستم
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS activities
-                                (id INTEGER PRIMARY KEY,
-                                activity_type TEXT,
-                                description TEXT,
-                                user_id INTEGER,
-                                timestamp TEXT,
-                                ip_address TEXT)''')
-            self.conn.commit()
-
-            # بررسی وجود جدول activities
-            try:
-                self.cursor.execute("SELECT COUNT(*) FROM activities")
-                self.cursor.fetchone()
-                print("Activities table exists and is accessible")
-            except sqlite3.OperationalError:
-                print("Recreating activities table due to access error")
-                self.cursor.execute("DROP TABLE IF EXISTS activities")
-                self.cursor.execute('''CREATE TABLE IF NOT EXISTS activities
-                                    (id INTEGER PRIMARY KEY,
-                                    activity_type TEXT,
-                                    description TEXT,
-                                    user_id INTEGER,
-                                    timestamp TEXT,
-                                    ip_address TEXT)''')
-                self.conn.commit()
-
-            print("Database tables created successfully")
+            # مهاجرت‌ها فقط زمانی اجرا می‌شوند که نسخه طرح پایگاه داده قدیمی باشد
+            version = run_migrations(self.conn)
+            print(f"Database schema is at version {version}")
         except Exception as e:
             print(f"Error creating database tables: {e}")
 
@@ -381,11 +327,12 @@ class ProductManager(QMainWindow):
 
             # بررسی وجود جدول activities
             try:
-                self.cursor.execute(
-                    "INSERT INTO activities (activity_type, description, user_id, timestamp, ip_address) VALUES (?, ?, ?, ?, ?)",
-                    (activity_type, description, user_id, timestamp, "127.0.0.1")
-                )
-                self.conn.commit()
+                # ثبت فعالیت همراه تغییرات دیگر به صورت گروهی انجام می‌شود
+                with self.db.transaction():
+                    self.cursor.execute(
+                        "INSERT INTO activities (activity_type, description, user_id, timestamp, ip_address) VALUES (?, ?, ?, ?, ?)",
+                        (activity_type, description, user_id, timestamp, "127.0.0.1")
+                    )
             except sqlite3.OperationalError as e:
                 if "no such table" in str(e):
                     # ایجاد مجدد جدول در صورت عدم وجود
@@ -882,7 +829,8 @@ class ProductManager(QMainWindow):
 
             # جستجو در پایگاه داده
             self.cursor.execute(
-                "SELECT id, name, price, discount_price, category, stock FROM products WHERE name LIKE ? OR category LIKE ?",
+                f"SELECT p.id, p.name, p.price, p.discount_price, c.name, p.stock FROM {PRODUCTS_FROM} "
+                "WHERE p.name LIKE ? OR c.name LIKE ?",
                 (f"%{search_text}%", f"%{search_text}%")
             )
             products = self.cursor.fetchall()
@@ -906,10 +854,12 @@ class ProductManager(QMainWindow):
 
             # اعمال فیلتر دسته‌بندی
             if category_filter == "همه":
-                self.cursor.execute(f"SELECT id, name, price, discount_price, category, stock FROM products ORDER BY {sort_field}")
+                self.cursor.execute(f"SELECT p.id, p.name, p.price, p.discount_price, c.name, p.stock "
+                                    f"FROM {PRODUCTS_FROM} ORDER BY p.{sort_field}")
             else:
                 self.cursor.execute(
-                    f"SELECT id, name, price, discount_price, category, stock FROM products WHERE category = ? ORDER BY {sort_field}",
+                    f"SELECT p.id, p.name, p.price, p.discount_price, c.name, p.stock "
+                    f"FROM {PRODUCTS_FROM} WHERE c.name = ? ORDER BY p.{sort_field}",
                     (category_filter,)
                 )
 
@@ -948,12 +898,12 @@ class ProductManager(QMainWindow):
             # دریافت شناسه محصول انتخاب شده
             product_id = int(self.products_table.item(row, 0).text())
 
-            # دریافت اطلاعات محصول از پایگاه داده
-            self.cursor.execute(
-                "SELECT name, price, category, image, stock, min_stock FROM products WHERE id = ?",
-                (product_id,)
-            )
-            product = self.cursor.fetchone()
+            # دریافت اطلاعات محصول از پایگاه داده (با اتصال خواننده، بدون انتظار برای قفل نوشتن)
+            with self.db.reader() as conn:
+                product = conn.execute(
+                    f"SELECT p.name, p.price, c.name, p.image, p.stock, p.min_stock FROM {PRODUCTS_FROM} WHERE p.id = ?",
+                    (product_id,)
+                ).fetchone()
 
             if product:
                 # نمایش اطلاعات در فرم
@@ -1048,120 +998,8 @@ class ProductManager(QMainWindow):
             if not file_path:
                 return
 
-            # ایجاد دیالوگ پیشرفت
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("وارد کردن محصولات")
-            progress_dialog.setFixedSize(400, 150)
-
-            layout = QVBoxLayout()
-
-            info_label = QLabel("در حال وارد کردن محصولات از فایل Excel...")
-            layout.addWidget(info_label)
-
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, 100)
-            layout.addWidget(progress_bar)
-
-            status_label = QLabel("آماده‌سازی...")
-            layout.addWidget(status_label)
-
-            progress_dialog.setLayout(layout)
-            progress_dialog.show()
-            QApplication.processEvents()
-
-            # خواندن فایل Excel
-            df = pd.read_excel(file_path)
-
-            # بررسی ستون‌های مورد نیاز
-            required_columns = ['name', 'price', 'category', 'stock', 'min_stock']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-
-            if missing_columns:
-                QMessageBox.warning(
-                    self,
-                    "خطا در ساختار فایل",
-                    f"ستون‌های زیر در فایل یافت نشد: {', '.join(missing_columns)}\n"
-                    "فایل باید شامل ستون‌های name, price, category, stock, min_stock باشد."
-                )
-                progress_dialog.close()
-                return
-
-            # تعداد کل رکوردها
-            total_records = len(df)
-            successful_imports = 0
-            failed_imports = 0
-
-            # شروع تراکنش
-            self.conn.execute("BEGIN TRANSACTION")
-
-            try:
-                # پردازش هر سطر
-                for i, row in enumerate(df.itertuples()):
-                    try:
-                        # به‌روزرسانی نوار پیشرفت
-                        progress = int((i / total_records) * 100)
-                        progress_bar.setValue(progress)
-                        status_label.setText(f"در حال پردازش رکورد {i+1} از {total_records}...")
-                        QApplication.processEvents()
-
-                        # استخراج داده‌ها
-                        name = getattr(row, 'name', '')
-                        price = float(getattr(row, 'price', 0))
-                        category = getattr(row, 'category', '')
-                        stock = int(getattr(row, 'stock', 0))
-                        min_stock = int(getattr(row, 'min_stock', 5))
-                        image = getattr(row, 'image', '') if hasattr(row, 'image') else ''
-                        description = getattr(row, 'description', '') if hasattr(row, 'description') else ''
-
-                        # بررسی اعتبار داده‌ها
-                        if not name or price < 0 or stock < 0 or min_stock < 0:
-                            failed_imports += 1
-                            continue
-
-                        # افزودن دسته‌بندی اگر وجود نداشت
-                        if category:
-                            self.cursor.execute("SELECT id FROM categories WHERE name = ?", (category,))
-                            if not self.cursor.fetchone():
-                                self.cursor.execute("INSERT INTO categories (name) VALUES (?)", (category,))
-
-                        # افزودن محصول
-                        self.cursor.execute(
-                            "INSERT INTO products (name, price, category, image, stock, min_stock, description) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (name, price, category, image, stock, min_stock, description)
-                        )
-
-                        successful_imports += 1
-
-                    except Exception as e:
-                        print(f"Error importing row {i}: {e}")
-                        failed_imports += 1
-
-                # پایان تراکنش
-                self.conn.commit()
-
-                # به‌روزرسانی لیست محصولات
-                self.load_products()
-
-                # نمایش نتیجه
-                QMessageBox.information(
-                    self,
-                    "وارد کردن محصولات",
-                    f"عملیات وارد کردن محصولات با موفقیت انجام شد.\n"
-                    f"تعداد کل رکوردها: {total_records}\n"
-                    f"وارد شده با موفقیت: {successful_imports}\n"
-                    f"ناموفق: {failed_imports}"
-                )
-
-                # ثبت فعالیت
-                self.log_activity("import", f"وارد کردن {successful_imports} محصول از فایل Excel")
-
-            except Exception as e:
-                # برگرداندن تراکنش در صورت خطا
-                self.conn.rollback()
-                QMessageBox.critical(self, "خطا", f"خطا در وارد کردن محصولات: {str(e)}")
-
-            finally:
-                progress_dialog.close()
+            # فایل xlsx به صورت جریانی و بخش به بخش خوانده می‌شود
+            self.start_product_import(file_path, "Excel", excel_source)
 
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در وارد کردن محصولات: {str(e)}")
@@ -1177,123 +1015,167 @@ class ProductManager(QMainWindow):
             if not file_path:
                 return
 
-            # ایجاد دیالوگ پیشرفت
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("وارد کردن محصولات")
-            progress_dialog.setFixedSize(400, 150)
-
-            layout = QVBoxLayout()
+            # فایل به صورت جریانی و بخش به بخش خوانده می‌شود
+            self.start_product_import(file_path, "CSV", CsvSource)
 
-            info_label = QLabel("در حال وارد کردن محصولات از فایل CSV...")
-            layout.addWidget(info_label)
+        except Exception as e:
+            QMessageBox.critical(self, "خطا", f"خطا در وارد کردن محصولات: {str(e)}")
 
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, 100)
-            layout.addWidget(progress_bar)
+    def start_product_import(self, file_path, file_type, open_source):
+        """وارد کردن محصولات یک فایل در پس‌زمینه با امکان لغو و ادامه
+
+        فایل در نخ نوشتن کارگر پایگاه داده خوانده و هر CHECKPOINT_ROWS سطر ثبت
+        می‌شود؛ پنجره اصلی در این مدت قابل استفاده می‌ماند. اگر وارد کردن قبلی همین
+        فایل نیمه‌کاره مانده باشد، کاربر می‌تواند از آخرین سطر ثبت‌شده ادامه دهد.
+        در حالت ادغام، محصولات بر اساس بارکد درج یا (فقط در صورت تغییر) به‌روز می‌شوند.
+
+        Args:
+            file_path (str): مسیر فایل
+            file_type (str): نوع فایل برای پیام‌ها (CSV یا Excel)
+            open_source (callable): ساخت منبع بخش‌بندی‌شده از مسیر فایل
+        """
+        if self.import_job is not None:
+            QMessageBox.warning(self, "وارد کردن محصولات", "یک عملیات وارد کردن در حال اجرا است.")
+            return
+
+        # افزودن همه سطرها یا ادغام با محصولات موجود بر اساس بارکد
+        mode_box = QMessageBox(self)
+        mode_box.setWindowTitle("وارد کردن محصولات")
+        mode_box.setText("محصولات فایل چگونه وارد شوند؟")
+        mode_box.setInformativeText(
+            "در حالت ادغام، محصولاتی که بارکد آن‌ها از قبل وجود دارد فقط در صورت تغییر به‌روز "
+            "و بقیه اضافه می‌شوند. فایل باید ستون barcode داشته باشد و خانه‌های خالی "
+            "مقدار فعلی را تغییر نمی‌دهند."
+        )
+        append_button = mode_box.addButton("افزودن همه", QMessageBox.AcceptRole)
+        merge_button = mode_box.addButton("ادغام بر اساس بارکد", QMessageBox.AcceptRole)
+        mode_box.addButton("انصراف", QMessageBox.RejectRole)
+        mode_box.exec_()
+        if mode_box.clickedButton() not in (append_button, merge_button):
+            return
+        merge = mode_box.clickedButton() is merge_button
+
+        with self.db.reader() as conn:
+            resume = unfinished_import(conn, file_path, merge)
+        if resume is not None:
+            answer = QMessageBox.question(
+                self,
+                "ادامه وارد کردن",
+                f"وارد کردن قبلی این فایل تا سطر {resume[1]} ({resume[3]} محصول) ثبت شده است.\n"
+                "آیا از همان نقطه ادامه داده شود؟\n"
+                "(با انتخاب «خیر» وارد کردن از ابتدای فایل شروع می‌شود)",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel
+            )
+            if answer == QMessageBox.Cancel:
+                return
+            if answer == QMessageBox.No:
+                resume = None
 
-            status_label = QLabel("آماده‌سازی...")
-            layout.addWidget(status_label)
+        # ایجاد دیالوگ پیشرفت
+        progress_dialog = QDialog(self)
+        progress_dialog.setWindowTitle("وارد کردن محصولات")
+        progress_dialog.setFixedSize(400, 170)
 
-            progress_dialog.setLayout(layout)
-            progress_dialog.show()
-            QApplication.processEvents()
+        layout = QVBoxLayout()
 
-            # خواندن فایل CSV
-            df = pd.read_csv(file_path)
+        info_label = QLabel(f"در حال وارد کردن محصولات از فایل {file_type}...")
+        layout.addWidget(info_label)
 
-            # بررسی ستون‌های مورد نیاز
-            required_columns = ['name', 'price', 'category', 'stock', 'min_stock']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, 0)
+        layout.addWidget(progress_bar)
 
-            if missing_columns:
-                QMessageBox.warning(
-                    self,
-                    "خطا در ساختار فایل",
-                    f"ستون‌های زیر در فایل یافت نشد: {', '.join(missing_columns)}\n"
-                    "فایل باید شامل ستون‌های name, price, category, stock, min_stock باشد."
-                )
-                progress_dialog.close()
-                return
+        status_label = QLabel("آماده‌سازی...")
+        layout.addWidget(status_label)
 
-            # تعداد کل رکوردها
-            total_records = len(df)
-            successful_imports = 0
-            failed_imports = 0
+        cancel_button = QPushButton("لغو")
+        layout.addWidget(cancel_button)
 
-            # شروع تراکنش
-            self.conn.execute("BEGIN TRANSACTION")
+        progress_dialog.setLayout(layout)
 
-            try:
-                # پردازش هر سطر
-                for i, row in enumerate(df.itertuples()):
-                    try:
-                        # به‌روزرسانی نوار پیشرفت
-                        progress = int((i / total_records) * 100)
-                        progress_bar.setValue(progress)
-                        status_label.setText(f"در حال پردازش رکورد {i+1} از {total_records}...")
-                        QApplication.processEvents()
-
-                        # استخراج داده‌ها
-                        name = getattr(row, 'name', '')
-                        price = float(getattr(row, 'price', 0))
-                        category = getattr(row, 'category', '')
-                        stock = int(getattr(row, 'stock', 0))
-                        min_stock = int(getattr(row, 'min_stock', 5))
-                        image = getattr(row, 'image', '') if hasattr(row, 'image') else ''
-                        description = getattr(row, 'description', '') if hasattr(row, 'description') else ''
-
-                        # بررسی اعتبار داده‌ها
-                        if not name or price < 0 or stock < 0 or min_stock < 0:
-                            failed_imports += 1
-                            continue
-
-                        # افزودن دسته‌بندی اگر وجود نداشت
-                        if category:
-                            self.cursor.execute("SELECT id FROM categories WHERE name = ?", (category,))
-                            if not self.cursor.fetchone():
-                                self.cursor.execute("INSERT INTO categories (name) VALUES (?)", (category,))
-
-                        # افزودن محصول
-                        self.cursor.execute(
-                            "INSERT INTO products (name, price, category, image, stock, min_stock, description) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (name, price, category, image, stock, min_stock, description)
-                        )
-
-                        successful_imports += 1
+        def work(conn, job):
+            with open_source(file_path) as source:
+                # بررسی ستون‌های مورد نیاز (ستون‌های حالت ادغام در ProductMerger بررسی می‌شوند)
+                missing = [] if merge else missing_columns(source.columns)
+                if missing:
+                    raise ValueError(
+                        f"ستون‌های زیر در فایل یافت نشد: {', '.join(missing)}\n"
+                        "فایل باید شامل ستون‌های name, price, category, stock, min_stock باشد."
+                    )
+                return run_import_job(job.manager, source, file_path, job, resume=resume, merge=merge,
+                                      rejected_path=rejected_rows_path(file_path))
+
+        def on_progress(done, total):
+            # سیگنال‌های پیشرفت در ProductImporter بر اساس زمان محدود شده‌اند
+            if total:
+                progress_bar.setRange(0, total)
+                progress_bar.setValue(done)
+                status_label.setText(f"{done * 100 // total}٪ از فایل پردازش شد...")
+
+        def finish():
+            self.import_job = None
+            progress_dialog.close()
 
-                    except Exception as e:
-                        print(f"Error importing row {i}: {e}")
-                        failed_imports += 1
+        def on_result(result):
+            finish()
+            for row_number, message in result.errors[:20]:
+                print(f"Error importing row {row_number}: {message}")
 
-                # پایان تراکنش
-                self.conn.commit()
+            # به‌روزرسانی لیست محصولات
+            self.load_products()
 
-                # به‌روزرسانی لیست محصولات
-                self.load_products()
+            # نمایش نتیجه
+            summary = f"تعداد کل رکوردها: {result.total}\n"
+            if merge:
+                summary += (f"محصولات جدید: {result.imported}\n"
+                            f"به‌روز شده: {result.updated}\n"
+                            f"بدون تغییر: {result.unchanged}\n")
+            else:
+                summary += f"وارد شده با موفقیت: {result.imported}\n"
+            summary += f"ناموفق: {result.failed}"
+            if result.rejected_path:
+                summary += f"\nسطرهای ردشده و دلیل آن‌ها در این فایل ذخیره شد:\n{result.rejected_path}"
+            QMessageBox.information(
+                self,
+                "وارد کردن محصولات",
+                f"عملیات وارد کردن محصولات با موفقیت انجام شد.\n"
+                f"{summary}"
+            )
 
-                # نمایش نتیجه
-                QMessageBox.information(
-                    self,
-                    "وارد کردن محصولات",
-                    f"عملیات وارد کردن محصولات با موفقیت انجام شد.\n"
-                    f"تعداد کل رکوردها: {total_records}\n"
-                    f"وارد شده با موفقیت: {successful_imports}\n"
-                    f"ناموفق: {failed_imports}"
-                )
+            # ثبت فعالیت
+            if merge:
+                self.log_activity("import", f"ادغام فایل {file_type}: {result.imported} محصول جدید، "
+                                            f"{result.updated} به‌روز شده، {result.unchanged} بدون تغییر")
+            else:
+                self.log_activity("import", f"وارد کردن {result.imported} محصول از فایل {file_type}")
 
-                # ثبت فعالیت
-                self.log_activity("import", f"وارد کردن {successful_imports} محصول از فایل CSV")
+        def on_error(message):
+            finish()
+            self.load_products()
+            QMessageBox.critical(self, "خطا", f"خطا در وارد کردن محصولات: {message}")
 
-            except Exception as e:
-                # برگرداندن تراکنش در صورت خطا
-                self.conn.rollback()
-                QMessageBox.critical(self, "خطا", f"خطا در وارد کردن محصولات: {str(e)}")
+        def cancel():
+            # بستن دیالوگ پس از پایان کار هم rejected را می‌فرستد
+            if self.import_job is None:
+                return
+            # بخش ثبت‌نشده برگردانده می‌شود؛ نقاط بازیابی قبلی برای ادامه باقی می‌مانند
+            self.db_worker.cancel('import')
+            finish()
+            self.load_products()
+            QMessageBox.information(
+                self,
+                "وارد کردن محصولات",
+                "وارد کردن لغو شد. با وارد کردن دوباره همین فایل می‌توانید از آخرین نقطه ثبت‌شده ادامه دهید."
+            )
 
-            finally:
-                progress_dialog.close()
+        cancel_button.clicked.connect(cancel)
+        progress_dialog.rejected.connect(cancel)
 
-        except Exception as e:
-            QMessageBox.critical(self, "خطا", f"خطا در وارد کردن محصولات: {str(e)}")
+        self.import_job = self.db_worker.submit(
+            work, on_result=on_result, on_error=on_error, on_progress=on_progress,
+            channel='import', write=True, atomic=False
+        )
+        progress_dialog.show()
 
     def export_products_to_excel(self):
         """صادر کردن محصولات به فایل Excel"""
@@ -1331,66 +1213,81 @@ class ProductManager(QMainWindow):
             progress_dialog.show()
             QApplication.processEvents()
 
-            # دریافت همه محصولات
-            self.cursor.execute("""
-                SELECT id, name, price, discount_price, category, stock, min_stock, image, description
-                FROM products
-                ORDER BY name
-            """)
+            def write_workbook(conn, job):
+                # دریافت همه محصولات (در نخ کارگر) به ترتیب شاخص مرتب‌سازی نام
+                products = conn.execute(*ProductFilter(sort='name').query(
+                    conn, "p.id, p.name, p.price, p.discount_price, c.name, p.stock, p.min_stock, "
+                          "p.image, p.description"
+                )).fetchall()
+                total_products = len(products)
+
+                # ایجاد فایل Excel
+                workbook = xlsxwriter.Workbook(file_path)
+                worksheet = workbook.add_worksheet('Products')
+
+                # تعریف فرمت‌ها
+                header_format = workbook.add_format({
+                    'bold': True,
+                    'bg_color': '#0078D7',
+                    'color': 'white',
+                    'border': 1
+                })
+
+                cell_format = workbook.add_format({
+                    'border': 1
+                })
 
-            products = self.cursor.fetchall()
-            total_products = len(products)
+                # نوشتن سرستون‌ها
+                headers = ['شناسه', 'نام محصول', 'قیمت', 'قیمت با تخفیف', 'دسته‌بندی',
+                          'موجودی', 'حداقل موجودی', 'مسیر تصویر', 'توضیحات']
 
-            # ایجاد فایل Excel
-            workbook = xlsxwriter.Workbook(file_path)
-            worksheet = workbook.add_worksheet('Products')
+                for col, header in enumerate(headers):
+                    worksheet.write(0, col, header, header_format)
+                    worksheet.set_column(col, col, 15)  # تنظیم عرض ستون
 
-            # تعریف فرمت‌ها
-            header_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#0078D7',
-                'color': 'white',
-                'border': 1
-            })
+                # نوشتن داده‌ها؛ پیشرفت هر 500 سطر یک بار گزارش می‌شود
+                for row, product in enumerate(products):
+                    if row % 500 == 0:
+                        job.check_cancelled()
+                        job.report_progress(row, total_products)
 
-            cell_format = workbook.add_format({
-                'border': 1
-            })
+                    for col, value in enumerate(product):
+                        worksheet.write(row + 1, col, value if value is not None else '', cell_format)
 
-            # نوشتن سرستون‌ها
-            headers = ['شناسه', 'نام محصول', 'قیمت', 'قیمت با تخفیف', 'دسته‌بندی',
-                      'موجودی', 'حداقل موجودی', 'مسیر تصویر', 'توضیحات']
+                # بستن فایل Excel
+                workbook.close()
+                return total_products
 
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header, header_format)
-                worksheet.set_column(col, col, 15)  # تنظیم عرض ستون
+            def on_progress(done, total):
+                progress_bar.setValue(int(done / total * 100) if total else 0)
+                status_label.setText(f"در حال صادر کردن محصول {done+1} از {total}...")
 
-            # نوشتن داده‌ها
-            for row, product in enumerate(products):
-                # به‌روزرسانی نوار پیشرفت
-                progress = int(((row + 1) / total_products) * 100)
-                progress_bar.setValue(progress)
-                status_label.setText(f"در حال صادر کردن محصول {row+1} از {total_products}...")
-                QApplication.processEvents()
-
-                for col, value in enumerate(product):
-                    worksheet.write(row + 1, col, value if value is not None else '', cell_format)
+            def on_finished(total_products):
+                progress_dialog.close()
 
-            # بستن فایل Excel
-            workbook.close()
+                # نمایش پیام موفقیت
+                QMessageBox.information(
+                    self,
+                    "صادر کردن محصولات",
+                    f"تعداد {total_products} محصول با موفقیت به فایل Excel صادر شد."
+                )
 
-            progress_dialog.close()
+                # ثبت فعالیت
+                self.log_activity("export", f"صادر کردن {total_products} محصول به فایل Excel")
 
-            # نمایش پیام موفقیت
-            QMessageBox.information(
-                self,
-                "صادر کردن محصولات",
-                f"تعداد {total_products} محصول با موفقیت به فایل Excel صادر شد."
+            def on_error(message):
+                progress_dialog.close()
+                QMessageBox.critical(self, "خطا", f"خطا در صادر کردن محصولات: {message}")
+
+            # خواندن و نوشتن فایل در پس‌زمینه انجام می‌شود و پنجره پاسخگو می‌ماند
+            self.db_worker.submit(
+                write_workbook,
+                on_result=on_finished,
+                on_error=on_error,
+                on_progress=on_progress,
+                channel='export_excel'
             )
 
-            # ثبت فعالیت
-            self.log_activity("export", f"صادر کردن {total_products} محصول به فایل Excel")
-
         except Exception as e:
             QMessageBox.critical(self, "خطا", f"خطا در صادر کردن محصولات: {str(e)}")
 
@@ -1430,12 +1327,11 @@ class ProductManager(QMainWindow):
             progress_dialog.show()
             QApplication.processEvents()
 
-            # دریافت همه محصولات
-            self.cursor.execute("""
-                SELECT id, name, price, discount_price, category, stock, min_stock, image, description
-                FROM products
-                ORDER BY name
-            """)
+            # دریافت همه محصولات به ترتیب شاخص مرتب‌سازی نام
+            self.cursor.execute(*ProductFilter(sort='name').query(
+                self.conn, "p.id, p.name, p.price, p.discount_price, c.name, p.stock, p.min_stock, "
+                           "p.image, p.description"
+            ))
 
             products = self.cursor.fetchall()
             total_products = len(products)
@@ -1512,12 +1408,10 @@ class ProductManager(QMainWindow):
             progress_dialog.show()
             QApplication.processEvents()
 
-            # دریافت همه محصولات
-            self.cursor.execute("""
-                SELECT id, name, price, discount_price, category, stock, min_stock
-                FROM products
-                ORDER BY name
-            """)
+            # دریافت همه محصولات به ترتیب شاخص مرتب‌سازی نام
+            self.cursor.execute(*ProductFilter(sort='name').query(
+                self.conn, "p.id, p.name, p.price, p.discount_price, c.name, p.stock, p.min_stock"
+            ))
 
             products = self.cursor.fetchall()
             total_products = len(products)
@@ -1714,6 +1608,10 @@ class ProductManager(QMainWindow):
         about_action.triggered.connect(self.show_about)
         settings_menu.addAction(about_action)
 
+        query_profiler_action = QAction('پروفایل پرس‌وجوها (توسعه‌دهنده)', self)
+        query_profiler_action.triggered.connect(self.show_query_profiler)
+        settings_menu.addAction(query_profiler_action)
+
         # منوی مدیریت محصولات
         product_manager_menu = menu_bar.addMenu('مدیریت محصولات')
 
@@ -1762,6 +1660,15 @@ class ProductManager(QMainWindow):
         self.search_button = QPushButton('جستجو')
         self.search_button.clicked.connect(self.search_products)
 
+        # جستجو هنگام تایپ: هر کلید زمان‌سنج را از نو شروع می‌کند و فقط پس از مکث تایپ
+        # پرس‌وجو اجرا می‌شود؛ Enter جستجو را بلافاصله اجرا می‌کند
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search_products)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_input.returnPressed.connect(self.search_products)
+
         self.filter_label = QLabel('فیلتر بر اساس دسته‌بندی:')
         self.filter_input = QComboBox()
         self.filter_input.addItems(['همه'])
@@ -1775,9 +1682,11 @@ class ProductManager(QMainWindow):
         self.show_button = QPushButton('نمایش همه محصولات')
         self.show_button.clicked.connect(self.show_products)
 
-        self.products_table = QTableWidget()
-        self.products_table.setColumnCount(6)
-        self.products_table.setHorizontalHeaderLabels(['شناسه', 'نام', 'قیمت', 'قیمت با تخفیف', 'دسته‌بندی', 'موجودی'])
+        # جدول محصولات مبتنی بر مدل؛ سطرها هنگام پیمایش صفحه به صفحه خوانده می‌شوند
+        self.products_model = ProductTableModel(self.db_worker, self, channel='products')
+        self.products_model.page_loaded.connect(self._on_products_page_loaded)
+        self.products_model.load_failed.connect(self._on_load_products_error)
+        self.products_table = ProductTableView(self.products_model)
         self.products_table.cellClicked.connect(self.load_product)
 
         # ایجاد گروه برای اطلاعات اصلی محصول
@@ -1903,12 +1812,12 @@ class ProductManager(QMainWindow):
         self.products_table.horizontalHeader().setStretchLastSection(True)
         self.products_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.products_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 border: 1px solid #cccccc;
                 border-radius: 6px;
                 padding: 5px;
             }
-            QTableWidget::item:alternate {
+            QTableView::item:alternate {
                 background-color: #f9f9f9;
             }
         """)
@@ -1978,6 +1887,15 @@ class ProductManager(QMainWindow):
         # حالا که همه کنترل‌ها ایجاد شده‌اند، دسته‌بندی‌ها را بارگذاری می‌کنیم
         self.load_categories()
 
+        # نشان موجودی کم در نوار وضعیت؛ با کلیک، فهرست محصولات (بدون مسدود کردن برنامه) باز می‌شود
+        self.low_stock_badge = QPushButton()
+        self.low_stock_badge.setFlat(True)
+        self.low_stock_badge.setStyleSheet("color: white; background-color: #e74c3c; border-radius: 8px; padding: 2px 8px;")
+        self.low_stock_badge.setToolTip("محصولات با موجودی کمتر از حداقل")
+        self.low_stock_badge.clicked.connect(self.show_low_stock_alert)
+        self.low_stock_badge.hide()
+        self.statusBar().addPermanentWidget(self.low_stock_badge)
+
         # و سپس محصولات را بارگذاری می‌کنیم
         self.load_products()
 
@@ -1999,6 +1917,7 @@ class ProductManager(QMainWindow):
             name = self.name_input.text().strip()
             price_text = self.price_input.text().strip()
             category = self.category_input.currentText()
+            category_id = self.category_input.currentData()
             image = self.image_path.text().strip()
             stock_text = self.stock_input.text().strip()
             min_stock_text = self.min_stock_input.text().strip()
@@ -2055,17 +1974,17 @@ class ProductManager(QMainWindow):
                     self.image_path.setFocus()
                     return
 
-            # Insert the product
-            self.cursor.execute(
-                "INSERT INTO products (name, price, category, image, stock, min_stock) VALUES (?, ?, ?, ?, ?, ?)",
-                (name, price, category, image, stock, min_stock)
-            )
-            product_id = self.cursor.lastrowid
-            self.conn.commit()
+            # ذخیره محصول و تاریخچه موجودی اولیه در یک واحد کاری
+            with self.db.transaction():
+                self.cursor.execute(
+                    "INSERT INTO products (name, price, category, category_id, image, stock, min_stock) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (name, price, category, category_id, image, stock, min_stock)
+                )
+                product_id = self.cursor.lastrowid
 
-            # اگر موجودی اولیه بیشتر از صفر باشد، یک رکورد در تاریخچه موجودی ثبت می‌کنیم
-            if stock > 0:
-                self.add_inventory_history(product_id, stock, "initial", "Initial stock")
+                # اگر موجودی اولیه بیشتر از صفر باشد، یک رکورد در تاریخچه موجودی ثبت می‌کنیم
+                if stock > 0:
+                    self.add_inventory_history(product_id, stock, "initial", "Initial stock")
 
             # Clear inputs after successful addition
             self.name_input.clear()
@@ -2074,8 +1993,8 @@ class ProductManager(QMainWindow):
             self.min_stock_input.setText("5")  # مقدار پیش‌فرض
             self.image_path.clear()
 
-            # Reload products to show the new one
-            self.load_products()
+            # نمایش محصول جدید بدون بارگذاری دوباره کل جدول
+            self.refresh_product_rows()
 
             QMessageBox.information(self, "Success", f"Product '{name}' added successfully")
 
@@ -2083,22 +2002,16 @@ class ProductManager(QMainWindow):
             error_msg = f"Error adding product: {e}"
             print(error_msg)
             QMessageBox.critical(self, "Add Error", error_msg)
-            # Rollback in case of error
-            self.conn.rollback()
 
     def add_inventory_history(self, product_id, change_amount, change_type, notes=""):
         """ثبت تغییرات موجودی در تاریخچه"""
         try:
-            current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.cursor.execute(
-                "INSERT INTO inventory_history (product_id, change_amount, change_type, change_date, notes) VALUES (?, ?, ?, ?, ?)",
-                (product_id, change_amount, change_type, current_date, notes)
-            )
-            self.conn.commit()
+            # اگر داخل واحد کاری دیگری صدا زده شود، همراه همان واحد ثبت می‌شود
+            with self.db.transaction():
+                self.inventory_repo.add(product_id, change_amount, change_type, notes)
             print(f"Inventory history added for product {product_id}: {change_amount} ({change_type})")
         except Exception as e:
             print(f"Error adding inventory history: {e}")
-            self.conn.rollback()
 
     def update_product(self):
         try:
@@ -2113,6 +2026,7 @@ class ProductManager(QMainWindow):
             name = self.name_input.text().strip()
             price_text = self.price_input.text().strip()
             category = self.category_input.currentText()
+            category_id = self.category_input.currentData()
             image = self.image_path.text().strip()
             stock_text = self.stock_input.text().strip()
             min_stock_text = self.min_stock_input.text().strip()
@@ -2169,59 +2083,60 @@ class ProductManager(QMainWindow):
                     self.image_path.setFocus()
                     return
 
-            # دریافت موجودی قبلی برای ثبت تغییرات
-            self.cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
-            old_stock = self.cursor.fetchone()[0] or 0
+            # به‌روزرسانی محصول و ثبت تاریخچه موجودی در یک واحد کاری
+            with self.db.transaction():
+                # دریافت موجودی قبلی برای ثبت تغییرات
+                self.cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+                old_stock = self.cursor.fetchone()[0] or 0
 
-            # دریافت قیمت تخفیف‌دار فعلی (اگر وجود داشته باشد)
-            self.cursor.execute("SELECT discount_price FROM products WHERE id = ?", (product_id,))
-            current_discount_price = self.cursor.fetchone()[0]
+                # دریافت قیمت تخفیف‌دار فعلی (اگر وجود داشته باشد)
+                self.cursor.execute("SELECT discount_price FROM products WHERE id = ?", (product_id,))
+                current_discount_price = self.cursor.fetchone()[0]
 
-            # اگر قیمت تخفیف‌دار وجود داشته باشد و قیمت اصلی تغییر کرده باشد، قیمت تخفیف‌دار را به‌روزرسانی می‌کنیم
-            if current_discount_price is not None:
-                # دریافت قیمت اصلی قبلی
-                self.cursor.execute("SELECT price FROM products WHERE id = ?", (product_id,))
-                old_price = self.cursor.fetchone()[0] or 0
+                # اگر قیمت تخفیف‌دار وجود داشته باشد و قیمت اصلی تغییر کرده باشد، قیمت تخفیف‌دار را به‌روزرسانی می‌کنیم
+                if current_discount_price is not None:
+                    # دریافت قیمت اصلی قبلی
+                    self.cursor.execute("SELECT price FROM products WHERE id = ?", (product_id,))
+                    old_price = self.cursor.fetchone()[0] or 0
 
-                if price != old_price:
-                    # محاسبه درصد تخفیف فعلی
-                    discount_percent = ((old_price - current_discount_price) / old_price) * 100 if old_price > 0 else 0
+                    if price != old_price:
+                        # محاسبه درصد تخفیف فعلی
+                        discount_percent = ((old_price - current_discount_price) / old_price) * 100 if old_price > 0 else 0
 
-                    # محاسبه قیمت تخفیف‌دار جدید با همان درصد تخفیف
-                    new_discount_price = price * (1 - discount_percent / 100)
+                        # محاسبه قیمت تخفیف‌دار جدید با همان درصد تخفیف
+                        new_discount_price = price * (1 - discount_percent / 100)
 
-                    # Update the product with new discount price
-                    self.cursor.execute(
-                        "UPDATE products SET name = ?, price = ?, category = ?, image = ?, stock = ?, min_stock = ?, discount_price = ? WHERE id = ?",
-                        (name, price, category, image, stock, min_stock, new_discount_price, product_id)
-                    )
+                        # Update the product with new discount price
+                        self.cursor.execute(
+                            "UPDATE products SET name = ?, price = ?, category = ?, category_id = ?, image = ?, stock = ?, min_stock = ?, discount_price = ? WHERE id = ?",
+                            (name, price, category, category_id, image, stock, min_stock, new_discount_price, product_id)
+                        )
+                    else:
+                        # Update the product preserving current discount price
+                        self.cursor.execute(
+                            "UPDATE products SET name = ?, price = ?, category = ?, category_id = ?, image = ?, stock = ?, min_stock = ? WHERE id = ?",
+                            (name, price, category, category_id, image, stock, min_stock, product_id)
+                        )
                 else:
-                    # Update the product preserving current discount price
+                    # Update the product without discount price
                     self.cursor.execute(
-                        "UPDATE products SET name = ?, price = ?, category = ?, image = ?, stock = ?, min_stock = ? WHERE id = ?",
-                        (name, price, category, image, stock, min_stock, product_id)
+                        "UPDATE products SET name = ?, price = ?, category = ?, category_id = ?, image = ?, stock = ?, min_stock = ? WHERE id = ?",
+                        (name, price, category, category_id, image, stock, min_stock, product_id)
                     )
-            else:
-                # Update the product without discount price
-                self.cursor.execute(
-                    "UPDATE products SET name = ?, price = ?, category = ?, image = ?, stock = ?, min_stock = ? WHERE id = ?",
-                    (name, price, category, image, stock, min_stock, product_id)
-                )
-            self.conn.commit()
 
-            # ثبت تغییرات موجودی در تاریخچه اگر تغییر کرده باشد
-            if stock != old_stock:
-                change_amount = stock - old_stock
-                change_type = "increase" if change_amount > 0 else "decrease"
-                self.add_inventory_history(
-                    product_id,
-                    abs(change_amount),
-                    change_type,
-                    f"Stock updated from {old_stock} to {stock}"
-                )
+                # ثبت تغییرات موجودی در تاریخچه اگر تغییر کرده باشد
+                if stock != old_stock:
+                    change_amount = stock - old_stock
+                    change_type = "increase" if change_amount > 0 else "decrease"
+                    self.add_inventory_history(
+                        product_id,
+                        abs(change_amount),
+                        change_type,
+                        f"Stock updated from {old_stock} to {stock}"
+                    )
 
-            # Reload products to show the updated one
-            self.load_products()
+            # به‌روزرسانی فقط سطر محصول ویرایش‌شده
+            self.refresh_product_rows()
 
             QMessageBox.information(self, "Success", f"Product '{name}' updated successfully")
 
@@ -2229,8 +2144,6 @@ class ProductManager(QMainWindow):
             error_msg = f"Error updating product: {e}"
             print(error_msg)
             QMessageBox.critical(self, "Update Error", error_msg)
-            # Rollback in case of error
-            self.conn.rollback()
 
     def delete_product(self):
         try:
@@ -2250,9 +2163,10 @@ class ProductManager(QMainWindow):
             )
 
             if response == QMessageBox.Yes:
-                self.cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-                self.conn.commit()
-                self.load_products()
+                # حذف بلافاصله ثبت می‌شود و منتظر واحدهای کاری دیگر نمی‌ماند
+                with self.db.transaction(durable=True):
+                    self.cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
+                self.refresh_product_rows()
 
                 # Clear the input fields
                 self.name_input.clear()
@@ -2265,14 +2179,24 @@ class ProductManager(QMainWindow):
             error_msg = f"Error deleting product: {e}"
             print(error_msg)
             QMessageBox.critical(self, "Delete Error", error_msg)
-            # Rollback in case of error
-            self.conn.rollback()
 
     def load_product(self, row, column):
         try:
             product_id = self.products_table.item(row, 0).text()
-            self.cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-            product = self.cursor.fetchone()
+            # خواندن با اتصال خواننده تا وارد کردن فایل در پس‌زمینه پنجره را متوقف نکند
+            with self.db.reader() as conn:
+                product = conn.execute(
+                    f"SELECT p.id, p.name, p.price, c.name, p.image, p.stock, p.min_stock, p.discount_price "
+                    f"FROM {PRODUCTS_FROM} WHERE p.id = ?",
+                    (product_id,)
+                ).fetchone()
+                history = conn.execute("""
+                    SELECT change_amount, change_type, change_date, notes
+                    FROM inventory_history
+                    WHERE product_id = ?
+                    ORDER BY change_date DESC
+                    LIMIT 5
+                """, (product_id,)).fetchall()
 
             if not product:
                 print(f"No product found with ID {product_id}")
@@ -2313,15 +2237,6 @@ class ProductManager(QMainWindow):
                 self.min_stock_input.setText(str(product[6]) if product[6] is not None else "5")
 
             # نمایش تاریخچه موجودی در کنسول
-            self.cursor.execute("""
-                SELECT change_amount, change_type, change_date, notes
-                FROM inventory_history
-                WHERE product_id = ?
-                ORDER BY change_date DESC
-                LIMIT 5
-            """, (product_id,))
-            history = self.cursor.fetchall()
-
             if history:
                 print(f"\nRecent inventory history for {product[1]}:")
                 for record in history:
@@ -2337,154 +2252,174 @@ class ProductManager(QMainWindow):
         try:
             # بررسی وجود فیلترها و مرتب‌سازی
             if hasattr(self, 'filter_input') and hasattr(self, 'sort_input'):
-                filter_category = self.filter_input.currentText()
-                sort_field = self.sort_input.currentText().lower()
+                filter_category_id = self.filter_input.currentData()
+                sort_field = self.PRODUCT_SORT_FIELDS.get(self.sort_input.currentText(), 'name')
             else:
                 # مقادیر پیش‌فرض اگر هنوز کنترل‌ها ایجاد نشده‌اند
-                filter_category = 'All'
+                filter_category_id = None
                 sort_field = 'name'
 
-            # ساخت کوئری با پارامترهای امن
-            query = "SELECT id, name, price, discount_price, category, stock, min_stock FROM products"
-            params = []
-
-            if filter_category != 'All':
-                query += " WHERE category = ?"
-                params.append(filter_category)
-
-            # استفاده از پارامترهای امن برای مرتب‌سازی
-            if sort_field == 'price':
-                query += " ORDER BY COALESCE(discount_price, price)"  # اگر قیمت تخفیف‌دار وجود داشت، بر اساس آن مرتب می‌کنیم
-            elif sort_field == 'stock':
-                query += " ORDER BY stock"
+            catalog = get_catalog(self.db, refresh=False)
+            if catalog.loaded:
+                # تغییر مرتب‌سازی یا فیلتر روی داده‌های موجود در حافظه انجام می‌شود؛
+                # هر صفحه فقط تغییرات ثبت‌شده از آخرین همگام‌سازی را از پایگاه داده می‌خواند
+                def fetch_page(conn, last_row, limit):
+                    catalog.refresh(conn)
+                    after = page_key(last_row) if last_row is not None else None
+                    return catalog.page(self.PRODUCT_CATALOG_COLUMNS, sort_field, filter_category_id,
+                                        after, limit)
+
+                def fetch_rows(conn, ids):
+                    catalog.refresh(conn)
+                    return catalog.page(self.PRODUCT_CATALOG_COLUMNS, sort_field, filter_category_id,
+                                        ids=ids)
             else:
-                query += " ORDER BY name"  # پیش‌فرض مرتب‌سازی بر اساس نام
-
-            # اجرای کوئری
-            self.cursor.execute(query, params)
-            products = self.cursor.fetchall()
+                def fetch_page(conn, last_row, limit):
+                    # هر صفحه از آخرین کلید مرتب‌سازی دیده‌شده ادامه می‌یابد (بدون OFFSET)
+                    after = page_key(last_row) if last_row is not None else None
+                    return conn.execute(*page_query(
+                        self.PRODUCT_TABLE_COLUMNS, sort_field, filter_category_id, after, limit
+                    )).fetchall()
+
+                def fetch_rows(conn, ids):
+                    # سطرهای محصولات تغییر یافته با همان فیلتر و کلید مرتب‌سازی
+                    return conn.execute(*page_query(
+                        self.PRODUCT_TABLE_COLUMNS, sort_field, filter_category_id, limit=len(ids), ids=ids
+                    )).fetchall()
+
+                # صفحه اول از پایگاه داده نمایش داده می‌شود و کاتالوگ در پس‌زمینه بارگذاری
+                # می‌شود تا تغییرات بعدی مرتب‌سازی و فیلتر بدون پرس‌وجو انجام شوند
+                self.db_worker.submit(
+                    lambda conn, job: catalog.refresh(conn),
+                    on_error=lambda message: print(f"Error loading product catalog: {message}"),
+                    channel='catalog'
+                )
 
-            # نمایش محصولات در جدول
-            if hasattr(self, 'products_table'):
-                self.products_table.setRowCount(len(products))
-                for i, product in enumerate(products):
-                    # ستون‌های اصلی
-                    self.products_table.setItem(i, 0, QTableWidgetItem(str(product[0])))
-                    self.products_table.setItem(i, 1, QTableWidgetItem(product[1] if product[1] else ""))
-
-                    # قیمت اصلی
-                    price_item = QTableWidgetItem(str(product[2]) if product[2] is not None else "")
-                    self.products_table.setItem(i, 2, price_item)
-
-                    # قیمت با تخفیف
-                    if product[3] is not None:
-                        discount_price_item = QTableWidgetItem(str(product[3]))
-                        discount_price_item.setForeground(QtGui.QBrush(QtGui.QColor(0, 128, 0)))  # رنگ سبز
-                        discount_price_item.setBackground(QtGui.QColor(240, 255, 240))  # پس‌زمینه سبز بسیار کمرنگ
-                        self.products_table.setItem(i, 3, discount_price_item)
-
-                        # قیمت اصلی را با خط خورده نمایش می‌دهیم
-                        font = price_item.font()
-                        font.setStrikeOut(True)
-                        price_item.setFont(font)
-                        price_item.setForeground(QtGui.QBrush(QtGui.QColor(128, 128, 128)))  # رنگ خاکستری
-                    else:
-                        self.products_table.setItem(i, 3, QTableWidgetItem(""))
+            # مدل جدول صفحه‌ها را در نخ کارگر می‌خواند؛ با هر تغییر فیلتر کار قبلی لغو می‌شود
+            self._products_search_term = None
+            self._check_stock_on_load = True
+            if hasattr(self, 'products_model'):
+                self.products_model.set_source(fetch_page, fetch_rows)
+        except Exception as e:
+            self._on_load_products_error(str(e))
+
+    def _with_catalog(self, on_ready, on_error, channel):
+        """فراخوانی on_ready(catalog) پس از همگام‌سازی حافظه نهان کاتالوگ در نخ کارگر
+
+        همگام‌سازی (که بار اول کل جدول محصولات را می‌خواند) رابط کاربری را متوقف
+        نمی‌کند؛ پنجره‌هایی که کل کاتالوگ را لازم دارند پس از رسیدن نتیجه ساخته می‌شوند.
+        """
+        catalog = get_catalog(self.db, refresh=False)
+        self.db_worker.submit(
+            lambda conn, job: catalog.refresh(conn),
+            on_result=lambda changed: on_ready(catalog),
+            on_error=on_error,
+            channel=channel
+        )
+
+    def refresh_product_rows(self):
+        """نمایش تغییرات پس از ذخیره، ویرایش یا حذف محصولات
+
+        فقط سطرهای محصولات تغییر یافته در جدول درج، به‌روز یا حذف می‌شوند و
+        انتخاب و موقعیت پیمایش جدول حفظ می‌شود.
+        """
+        if hasattr(self, 'products_model'):
+            self.products_model.refresh_changed()
+        else:
+            self.load_products()
+        self.check_low_stock()
 
-                    # دسته‌بندی
-                    self.products_table.setItem(i, 4, QTableWidgetItem(product[4] if product[4] else ""))
+    def _on_load_products_error(self, message):
+        print(f"Error in load_products: {message}")
+        if hasattr(self, 'products_table'):
+            QMessageBox.warning(self, "Load Error", f"Error loading products: {message}")
 
-                    # ستون موجودی با رنگ‌بندی
-                    stock_item = QTableWidgetItem(str(product[5]) if product[5] is not None else "0")
+    def _on_products_page_loaded(self, loaded, first_page):
+        """پس از رسیدن هر صفحه از مدل جدول (در نخ رابط کاربری)"""
+        if not first_page:
+            return
 
-                    # اگر موجودی کمتر از حداقل موجودی باشد، با رنگ قرمز نمایش داده می‌شود
-                    if product[5] is not None and product[6] is not None and product[5] < product[6]:
-                        stock_item.setBackground(QtGui.QColor(255, 200, 200))  # رنگ قرمز کمرنگ
+        search_term = getattr(self, '_products_search_term', None)
+        if search_term is not None:
+            print(f"Search loaded {loaded} products matching '{search_term}'")
 
-                    self.products_table.setItem(i, 5, stock_item)
+            # پیام در نوار وضعیت نمایش داده می‌شود تا تایپ کاربر قطع نشود
+            if loaded == 0:
+                self.statusBar().showMessage(f"No products found matching '{search_term}'", 5000)
+            else:
+                self.statusBar().clearMessage()
+            return
 
-                # بررسی محصولات با موجودی کم و نمایش هشدار
-                self.check_low_stock()
+        print(f"Loaded {loaded} products in table")
 
-                print(f"Loaded {len(products)} products in table")
-        except Exception as e:
-            print(f"Error in load_products: {e}")
-            if hasattr(self, 'products_table'):
-                QMessageBox.warning(self, "Load Error", f"Error loading products: {str(e)}")
+        # بررسی محصولات با موجودی کم و نمایش هشدار
+        if getattr(self, '_check_stock_on_load', False):
+            self._check_stock_on_load = False
+            self.check_low_stock()
 
     def check_low_stock(self):
-        """بررسی محصولات با موجودی کم و نمایش هشدار"""
-        try:
-            self.cursor.execute("""
-                SELECT name, stock, min_stock
-                FROM products
-                WHERE stock < min_stock
-            """)
-            low_stock_products = self.cursor.fetchall()
-
-            if low_stock_products:
-                message = "The following products have low stock:\n\n"
-                for product in low_stock_products:
-                    message += f"• {product[0]}: {product[1]} (Min: {product[2]})\n"
+        """به‌روزرسانی مجموعه محصولات با موجودی کم
+
+        نتیجه در نشان نوار وضعیت و پنل موجودی کم نمایش داده می‌شود و برنامه
+        متوقف نمی‌شود؛ درخواست‌های پشت‌سرهم (مثلاً در عملیات گروهی) ادغام می‌شوند.
+        """
+        self.low_stock_tracker.refresh()
+
+    def _on_low_stock_changed(self, count, newly_low):
+        """به‌روزرسانی نشان و پنل موجودی کم پس از تغییر مجموعه"""
+        if hasattr(self, 'low_stock_badge'):
+            self.low_stock_badge.setText(f"⚠ {count}")
+            self.low_stock_badge.setVisible(count > 0)
+
+        if newly_low:
+            if len(newly_low) == 1:
+                name = (self.low_stock_tracker.get(newly_low[0]) or ("",))[0]
+                message = f"Low stock: {name}"
+            else:
+                message = f"{len(newly_low)} products dropped below their minimum stock"
+            self.statusBar().showMessage(message, 8000)
 
-                QMessageBox.warning(self, "Low Stock Warning", message)
-        except Exception as e:
-            print(f"Error checking low stock: {e}")
+        if self.low_stock_panel is not None and self.low_stock_panel.isVisible():
+            self._fill_low_stock_panel()
 
     def search_products(self):
         try:
+            # جستجوی دستی (دکمه یا Enter) جستجوی زمان‌بندی‌شده را بی‌اثر می‌کند
+            if hasattr(self, 'search_timer'):
+                self.search_timer.stop()
+
             search_term = self.search_input.text().strip()
+            current_term = getattr(self, '_products_search_term', None)
+
+            # در جستجوی خودکار، اگر متن عملاً تغییر نکرده باشد (مثلاً فاصله اضافه) پرس‌وجو تکرار نمی‌شود
+            if self.sender() is getattr(self, 'search_timer', None) and (search_term or None) == current_term:
+                return
+
             if not search_term:
                 # If search term is empty, just reload all products
                 self.load_products()
                 return
 
-            # Use parameterized query to prevent SQL injection
-            self.cursor.execute("SELECT id, name, price, discount_price, category, stock, min_stock FROM products WHERE name LIKE ?", ('%' + search_term + '%',))
-            products = self.cursor.fetchall()
-
-            self.products_table.setRowCount(len(products))
-            for i, product in enumerate(products):
-                # ستون‌های اصلی
-                self.products_table.setItem(i, 0, QTableWidgetItem(str(product[0])))
-                self.products_table.setItem(i, 1, QTableWidgetItem(product[1] if product[1] else ""))
-
-                # قیمت اصلی
-                price_item = QTableWidgetItem(str(product[2]) if product[2] is not None else "")
-                self.products_table.setItem(i, 2, price_item)
-
-                # قیمت با تخفیف
-                if product[3] is not None:
-                    discount_price_item = QTableWidgetItem(str(product[3]))
-                    discount_price_item.setForeground(QtGui.QBrush(QtGui.QColor(0, 128, 0)))  # رنگ سبز
-                    discount_price_item.setBackground(QtGui.QColor(240, 255, 240))  # پس‌زمینه سبز بسیار کمرنگ
-                    self.products_table.setItem(i, 3, discount_price_item)
-
-                    # قیمت اصلی را با خط خورده نمایش می‌دهیم
-                    font = price_item.font()
-                    font.setStrikeOut(True)
-                    price_item.setFont(font)
-                    price_item.setForeground(QtGui.QBrush(QtGui.QColor(128, 128, 128)))  # رنگ خاکستری
-                else:
-                    self.products_table.setItem(i, 3, QTableWidgetItem(""))
-
-                # دسته‌بندی
-                self.products_table.setItem(i, 4, QTableWidgetItem(product[4] if product[4] else ""))
-
-                # ستون موجودی با رنگ‌بندی
-                stock_item = QTableWidgetItem(str(product[5]) if product[5] is not None else "0")
-
-                # اگر موجودی کمتر از حداقل موجودی باشد، با رنگ قرمز نمایش داده می‌شود
-                if product[5] is not None and product[6] is not None and product[5] < product[6]:
-                    stock_item.setBackground(QtGui.QColor(255, 200, 200))  # رنگ قرمز کمرنگ
+            # جستجوی متن کامل با شاخص FTS5؛ نتایج به ترتیب میزان تطابق و صفحه به صفحه
+            if search_page_query(self.conn, search_term, self.PRODUCT_TABLE_COLUMNS) is None:
+                self.load_products()
+                return
 
-                self.products_table.setItem(i, 5, stock_item)
+            def fetch_page(conn, last_row, limit):
+                after = page_key(last_row) if last_row is not None else None
+                return conn.execute(*search_page_query(
+                    conn, search_term, self.PRODUCT_TABLE_COLUMNS, after, limit
+                )).fetchall()
 
-            print(f"Search found {len(products)} products matching '{search_term}'")
+            def fetch_rows(conn, ids):
+                return conn.execute(*search_page_query(
+                    conn, search_term, self.PRODUCT_TABLE_COLUMNS, limit=len(ids), ids=ids
+                )).fetchall()
 
-            # Show a message if no products were found
-            if len(products) == 0:
-                QMessageBox.information(self, "Search Results", f"No products found matching '{search_term}'")
+            # جستجو در همان کانال load_products اجرا می‌شود تا نتیجه قدیمی‌تر جایگزین نتیجه جدید نشود
+            self._products_search_term = search_term
+            self._check_stock_on_load = False
+            self.products_model.set_source(fetch_page, fetch_rows)
 
         except Exception as e:
             error_msg = f"Error in search_products: {e}"
@@ -2492,10 +2427,17 @@ class ProductManager(QMainWindow):
             QMessageBox.warning(self, "Search Error", error_msg)
 
     def show_products(self):
+        # دریافت همه محصولات با قیمت تخفیف‌دار از حافظه نهان کاتالوگ
+        def on_error(message):
+            print(f"Error in show_products: {message}")
+            QMessageBox.warning(self, "Display Error", f"Error displaying products: {message}")
+
+        self._with_catalog(self._show_products_dialog, on_error, 'show_products')
+
+    def _show_products_dialog(self, catalog):
+        """ساخت و نمایش پنجره محصولات از کاتالوگ همگام‌شده"""
         try:
-            # دریافت همه محصولات با قیمت تخفیف‌دار
-            self.cursor.execute("SELECT name, price, discount_price, category, image FROM products ORDER BY category")
-            products = self.cursor.fetchall()
+            products = catalog.rows(('name', 'price', 'discount_price', 'category', 'image'), catalog.argsort('category'))
 
             self.products_dialog = QDialog(self)
             self.products_dialog.setWindowTitle('نمایش محصولات')
@@ -2510,20 +2452,6 @@ class ProductManager(QMainWindow):
                 QLabel {
                     color: #333333;
                 }
-                QGroupBox {
-                    border: 1px solid #cccccc;
-                    border-radius: 6px;
-                    margin-top: 20px;
-                    font-weight: bold;
-                    background-color: white;
-                }
-                QGroupBox::title {
-                    subcontrol-origin: margin;
-                    subcontrol-position: top center;
-                    padding: 0 10px;
-                    color: #0078d7;
-                    font-size: 14px;
-                }
             """)
 
             # ایجاد تب‌ویجت برای نمایش دسته‌بندی‌ها
@@ -2558,61 +2486,32 @@ class ProductManager(QMainWindow):
                     categories[category] = []
                 categories[category].append(product)
 
+            # کارت‌ها توسط یک delegate مشترک و فقط برای بخش قابل مشاهده هر تب رسم می‌شوند
+            card_delegate = ProductCardDelegate(self.products_dialog)
+
+            def create_gallery(gallery_products):
+                view = ProductGalleryView(delegate=card_delegate)
+                view.setModel(ProductGalleryModel(gallery_products, view))
+                return view
+
             # ایجاد تب "همه محصولات"
-            all_products_tab = QWidget()
-            all_products_layout = QVBoxLayout()
-
-            # ایجاد فلوویجت برای نمایش کارت‌های محصول
-            all_products_flow = QWidget()
-            flow_layout = QGridLayout(all_products_flow)
-            flow_layout.setSpacing(15)
-
-            # تعداد ستون‌ها در هر ردیف
-            columns = 3
-
-            # ایجاد کارت برای هر محصول
-            for i, product in enumerate(products):
-                product_card = self.create_product_card(product)
-                row = i // columns
-                col = i % columns
-                flow_layout.addWidget(product_card, row, col)
-
-            # اضافه کردن اسکرول به فلوویجت
-            scroll_area = QScrollArea()
-            scroll_area.setWidgetResizable(True)
-            scroll_area.setWidget(all_products_flow)
-            all_products_layout.addWidget(scroll_area)
-            all_products_tab.setLayout(all_products_layout)
-
-            # اضافه کردن تب همه محصولات
-            tab_widget.addTab(all_products_tab, f"همه محصولات ({len(products)})")
-
-            # ایجاد تب برای هر دسته‌بندی
+            tab_widget.addTab(create_gallery(products), f"همه محصولات ({len(products)})")
+
+            # تب هر دسته‌بندی فقط هنگام اولین انتخاب پر می‌شود
+            pending_tabs = {}
             for category, category_products in categories.items():
-                category_tab = QWidget()
-                category_layout = QVBoxLayout()
-
-                # ایجاد فلوویجت برای نمایش کارت‌های محصول در این دسته‌بندی
-                category_flow = QWidget()
-                cat_flow_layout = QGridLayout(category_flow)
-                cat_flow_layout.setSpacing(15)
-
-                # ایجاد کارت برای هر محصول در این دسته‌بندی
-                for i, product in enumerate(category_products):
-                    product_card = self.create_product_card(product)
-                    row = i // columns
-                    col = i % columns
-                    cat_flow_layout.addWidget(product_card, row, col)
-
-                # اضافه کردن اسکرول به فلوویجت
-                cat_scroll_area = QScrollArea()
-                cat_scroll_area.setWidgetResizable(True)
-                cat_scroll_area.setWidget(category_flow)
-                category_layout.addWidget(cat_scroll_area)
-                category_tab.setLayout(category_layout)
-
-                # اضافه کردن تب دسته‌بندی
-                tab_widget.addTab(category_tab, f"{category} ({len(category_products)})")
+                index = tab_widget.addTab(QWidget(), f"{category} ({len(category_products)})")
+                pending_tabs[index] = category_products
+
+            def populate_tab(index):
+                category_products = pending_tabs.pop(index, None)
+                if category_products is None:
+                    return
+                category_layout = QVBoxLayout(tab_widget.widget(index))
+                category_layout.setContentsMargins(0, 0, 0, 0)
+                category_layout.addWidget(create_gallery(category_products))
+
+            tab_widget.currentChanged.connect(populate_tab)
 
             # اضافه کردن تب‌ویجت به دیالوگ
             dialog_layout = QVBoxLayout()
@@ -2626,132 +2525,9 @@ class ProductManager(QMainWindow):
             print(f"Error in show_products: {e}")
             QMessageBox.warning(self, "Display Error", f"Error displaying products: {str(e)}")
 
-    def create_product_card(self, product):
-        """ایجاد کارت محصول با طراحی جدید"""
-        # استخراج اطلاعات محصول
-        name = product[0] if product[0] else "بدون نام"
-        price = product[1] if product[1] is not None else 0
-        discount_price = product[2]
-        image_path = product[4]
-
-        # ایجاد کارت محصول
-        card = QGroupBox()
-        card.setFixedSize(220, 280)
-        card.setStyleSheet("""
-            QGroupBox {
-                border: 1px solid #dddddd;
-                border-radius: 8px;
-                background-color: white;
-            }
-            QGroupBox:hover {
-                border: 1px solid #0078d7;
-                background-color: #f0f7ff;
-            }
-        """)
-
-        # لایه عمودی برای چیدمان عناصر کارت
-        card_layout = QVBoxLayout()
-        card_layout.setAlignment(QtCore.Qt.AlignCenter)
-        card_layout.setSpacing(5)
-        card_layout.setContentsMargins(10, 10, 10, 10)
-
-        # نام محصول
-        name_label = QLabel(name)
-        name_label.setStyleSheet("""
-            font-size: 14px;
-            font-weight: bold;
-            color: #333333;
-        """)
-        name_label.setAlignment(QtCore.Qt.AlignCenter)
-        name_label.setWordWrap(True)
-
-        # تصویر محصول
-        image_label = QLabel()
-        image_label.setFixedSize(150, 150)
-        image_label.setAlignment(QtCore.Qt.AlignCenter)
-        image_label.setStyleSheet("""
-            border: 1px solid #eeeeee;
-            border-radius: 4px;
-            background-color: #f9f9f9;
-        """)
-
-        # بررسی وجود تصویر
-        if image_path and os.path.exists(image_path):
-            try:
-                pixmap = QtGui.QPixmap(image_path)
-                if not pixmap.isNull():
-                    image_label.setPixmap(pixmap.scaled(150, 150, QtCore.Qt.KeepAspectRatio))
-                else:
-                    image_label.setText("تصویر نامعتبر")
-            except Exception as e:
-                print(f"Error loading image for product {name}: {e}")
-                image_label.setText("خطای تصویر")
-        else:
-            image_label.setText("بدون تصویر")
-
-        # قیمت محصول
-        price_layout = QVBoxLayout()
-        price_layout.setAlignment(QtCore.Qt.AlignCenter)
-        price_layout.setSpacing(2)
-
-        if discount_price is not None:
-            # قیمت اصلی با خط خورده
-            original_price_label = QLabel(f"{price:,} تومان")
-            original_price_label.setStyleSheet("""
-                font-size: 12px;
-                color: #999999;
-                text-decoration: line-through;
-            """)
-            original_price_label.setAlignment(QtCore.Qt.AlignCenter)
-
-            # قیمت با تخفیف
-            discount_price_label = QLabel(f"{discount_price:,} تومان")
-            discount_price_label.setStyleSheet("""
-                font-size: 14px;
-                font-weight: bold;
-                color: #e91e63;
-            """)
-            discount_price_label.setAlignment(QtCore.Qt.AlignCenter)
-
-            # محاسبه درصد تخفیف
-            if price > 0:
-                discount_percent = ((price - discount_price) / price) * 100
-                discount_badge = QLabel(f"{discount_percent:.0f}% تخفیف")
-                discount_badge.setStyleSheet("""
-                    background-color: #e91e63;
-                    color: white;
-                    border-radius: 4px;
-                    padding: 2px 6px;
-                    font-size: 11px;
-                    font-weight: bold;
-                """)
-                discount_badge.setAlignment(QtCore.Qt.AlignCenter)
-                price_layout.addWidget(discount_badge)
-
-            price_layout.addWidget(original_price_label)
-            price_layout.addWidget(discount_price_label)
-        else:
-            # فقط قیمت اصلی
-            price_label = QLabel(f"{price:,} تومان")
-            price_label.setStyleSheet("""
-                font-size: 14px;
-                font-weight: bold;
-                color: #333333;
-            """)
-            price_label.setAlignment(QtCore.Qt.AlignCenter)
-            price_layout.addWidget(price_label)
-
-        # اضافه کردن عناصر به کارت
-        card_layout.addWidget(name_label)
-        card_layout.addWidget(image_label)
-        card_layout.addLayout(price_layout)
-
-        card.setLayout(card_layout)
-        return card
-
     def generate_report(self):
         try:
-            self.cursor.execute("SELECT name, price, category FROM products")
+            self.cursor.execute(f"SELECT p.name, p.price, c.name FROM {PRODUCTS_FROM}")
             products = self.cursor.fetchall()
 
             if not products:
@@ -2974,7 +2750,7 @@ class ProductManager(QMainWindow):
             category_name = self.categories_table.item(selected_row, 1).text()
 
             # التحقق من وجود منتجات في هذه الفئة
-            self.cursor.execute("SELECT COUNT(*) FROM products WHERE category = ?", (category_name,))
+            self.cursor.execute("SELECT COUNT(*) FROM products WHERE category_id = ?", (category_id,))
             product_count = self.cursor.fetchone()[0]
 
             if product_count > 0:
@@ -3007,16 +2783,17 @@ class ProductManager(QMainWindow):
 
     def load_categories(self):
         try:
-            # دریافت دسته‌بندی‌ها از پایگاه داده
-            self.cursor.execute("SELECT name FROM categories")
+            # دریافت دسته‌بندی‌ها از پایگاه داده؛ شناسه هر دسته‌بندی در داده آیتم ذخیره می‌شود
+            self.cursor.execute("SELECT id, name FROM categories ORDER BY name")
             categories = self.cursor.fetchall()
-            category_names = [cat[0] for cat in categories]
+            category_names = [cat[1] for cat in categories]
 
             # به‌روزرسانی کنترل‌ها اگر وجود داشته باشند
             if hasattr(self, 'category_input'):
                 current_text = self.category_input.currentText() if self.category_input.count() > 0 else ""
                 self.category_input.clear()
-                self.category_input.addItems(category_names)
+                for category_id, name in categories:
+                    self.category_input.addItem(name, category_id)
 
                 # Try to restore the previous selection if it still exists
                 if current_text and current_text in category_names:
@@ -3024,8 +2801,13 @@ class ProductManager(QMainWindow):
 
             if hasattr(self, 'filter_input'):
                 current_filter = self.filter_input.currentText() if self.filter_input.count() > 0 else "All"
+                # جلوگیری از اجرای load_products برای هر آیتم هنگام پر کردن فیلتر
+                self.filter_input.blockSignals(True)
                 self.filter_input.clear()
-                self.filter_input.addItems(['All'] + category_names)
+                self.filter_input.addItem('All', None)
+                for category_id, name in categories:
+                    self.filter_input.addItem(name, category_id)
+                self.filter_input.blockSignals(False)
 
                 # Try to restore the previous filter if it still exists
                 if current_filter in ['All'] + category_names:
@@ -4132,19 +3914,18 @@ class ProductManager(QMainWindow):
         }
 
         try:
-            # تعداد کل محصولات
-            self.cursor.execute("SELECT COUNT(*) FROM products")
-            stats['total_products'] = self.cursor.fetchone()[0]
+            # تعداد کل محصولات از جدول خلاصه
+            summary = self.products_repo.summary()
+            stats['total_products'] = summary.product_count
 
             # تعداد کل دسته‌بندی‌ها
             self.cursor.execute("SELECT COUNT(*) FROM categories")
             stats['total_categories'] = self.cursor.fetchone()[0]
 
-            # آمار قیمت‌ها
+            # آمار قیمت‌ها؛ میانگین از جدول خلاصه و کمینه/بیشینه از شاخص قیمت
             if stats['total_products'] > 0:
-                self.cursor.execute("SELECT AVG(price), MIN(price), MAX(price) FROM products")
-                avg, min_price, max_price = self.cursor.fetchone()
-                stats['avg_price'] = avg or 0
+                min_price, max_price = self.products_repo.price_range()
+                stats['avg_price'] = summary.avg_price
                 stats['min_price'] = min_price or 0
                 stats['max_price'] = max_price or 0
 
@@ -4180,14 +3961,8 @@ class ProductManager(QMainWindow):
     def plot_category_distribution(self, canvas):
         """رسم نمودار توزیع دسته‌بندی‌ها"""
         try:
-            self.cursor.execute("""
-                SELECT c.name, COUNT(p.id)
-                FROM categories c
-                LEFT JOIN products p ON c.name = p.category
-                GROUP BY c.name
-                ORDER BY COUNT(p.id) DESC
-            """)
-            result = self.cursor.fetchall()
+            result = [(row.name, row.product_count)
+                      for row in self.products_repo.category_summaries(include_empty=True)]
 
             if not result:
                 canvas.axes.text(0.5, 0.5, "No category data available",
@@ -4232,7 +4007,10 @@ class ProductManager(QMainWindow):
 
             product_id = self.products_table.item(selected_row, 0).text()
             product_name = self.products_table.item(selected_row, 1).text()
-            current_stock = self.products_table.item(selected_row, 5).text()  # تصحیح شماره ستون موجودی
+
+            # موجودی فعلی از حافظه نهان کاتالوگ (که صفحه‌های جدول در نخ کارگر همگام نگه می‌دارند)
+            product = get_catalog(self.db, refresh=False).get(product_id, ('stock',))
+            current_stock = str(product[0] or 0) if product else self.products_table.item(selected_row, 5).text()
 
             # ایجاد دیالوگ مدیریت موجودی
             stock_dialog = QDialog(self)
@@ -4481,7 +4259,7 @@ class ProductManager(QMainWindow):
                     self.conn.commit()
 
                     # به‌روزرسانی نمایش
-                    self.load_products()
+                    self.refresh_product_rows()
 
                     QMessageBox.information(self, "Success",
                                           f"Stock updated successfully. New stock: {new_stock}")
@@ -4574,76 +4352,85 @@ class ProductManager(QMainWindow):
             QMessageBox.critical(self, "Error", error_msg)
 
     def show_low_stock_alert(self):
-        """نمایش هشدار برای محصولات با موجودی کم"""
+        """نمایش پنل محصولات با موجودی کم (غیرمودال؛ با تغییر موجودی به‌روز می‌شود)"""
         try:
-            self.cursor.execute("""
-                SELECT id, name, stock, min_stock
-                FROM products
-                WHERE stock < min_stock
-                ORDER BY (min_stock - stock) DESC
-            """)
-            low_stock_products = self.cursor.fetchall()
-
-            if not low_stock_products:
-                QMessageBox.information(self, "Stock Status", "All products have sufficient stock levels.")
-                return
-
-            # ایجاد دیالوگ نمایش محصولات با موجودی کم
-            low_stock_dialog = QDialog(self)
-            low_stock_dialog.setWindowTitle('Low Stock Alert')
-            low_stock_dialog.setMinimumSize(500, 400)
-
-            layout = QVBoxLayout()
-
-            # برچسب هشدار
-            alert_label = QLabel(f"⚠️ {len(low_stock_products)} products have low stock!")
-            alert_label.setStyleSheet("font-weight: bold; color: red; font-size: 16px;")
-            layout.addWidget(alert_label)
-
-            # جدول محصولات با موجودی کم
-            low_stock_table = QTableWidget()
-            low_stock_table.setColumnCount(4)
-            low_stock_table.setHorizontalHeaderLabels(['ID', 'Name', 'Current Stock', 'Minimum Stock'])
-            low_stock_table.setRowCount(len(low_stock_products))
-
-            for i, product in enumerate(low_stock_products):
-                low_stock_table.setItem(i, 0, QTableWidgetItem(str(product[0])))
-                low_stock_table.setItem(i, 1, QTableWidgetItem(product[1]))
-
-                # نمایش موجودی فعلی با رنگ قرمز
-                stock_item = QTableWidgetItem(str(product[2]))
-                stock_item.setForeground(QtGui.QBrush(QtGui.QColor(255, 0, 0)))
-                low_stock_table.setItem(i, 2, stock_item)
-
-                low_stock_table.setItem(i, 3, QTableWidgetItem(str(product[3])))
-
-            # تنظیم عرض ستون‌ها
-            low_stock_table.horizontalHeader().setStretchLastSection(True)
-            low_stock_table.resizeColumnsToContents()
-
-            layout.addWidget(low_stock_table)
+            if self.low_stock_panel is None:
+                # ایجاد پنل نمایش محصولات با موجودی کم
+                panel = QDialog(self)
+                panel.setWindowTitle('Low Stock Alert')
+                panel.setMinimumSize(500, 400)
+                panel.setModal(False)
+
+                layout = QVBoxLayout()
+
+                # برچسب هشدار
+                panel.alert_label = QLabel()
+                panel.alert_label.setStyleSheet("font-weight: bold; color: red; font-size: 16px;")
+                layout.addWidget(panel.alert_label)
+
+                # جدول محصولات با موجودی کم
+                panel.table = QTableWidget()
+                panel.table.setColumnCount(4)
+                panel.table.setHorizontalHeaderLabels(['ID', 'Name', 'Current Stock', 'Minimum Stock'])
+                panel.table.setSelectionBehavior(QTableWidget.SelectRows)
+                panel.table.setEditTriggers(QTableWidget.NoEditTriggers)
+                panel.table.horizontalHeader().setStretchLastSection(True)
+                layout.addWidget(panel.table)
+
+                # دکمه‌های عملیات
+                button_layout = QHBoxLayout()
+
+                restock_button = QPushButton("Restock Selected")
+                restock_button.clicked.connect(lambda: self.restock_product(panel.table, panel))
+
+                close_button = QPushButton("Close")
+                close_button.clicked.connect(panel.accept)
+
+                button_layout.addWidget(restock_button)
+                button_layout.addWidget(close_button)
+
+                layout.addLayout(button_layout)
+                panel.setLayout(layout)
+                self.low_stock_panel = panel
+
+            self._fill_low_stock_panel()
+            self.low_stock_panel.show()
+            self.low_stock_panel.raise_()
+            self.low_stock_panel.activateWindow()
 
-            # دکمه‌های عملیات
-            button_layout = QHBoxLayout()
-
-            restock_button = QPushButton("Restock Selected")
-            restock_button.clicked.connect(lambda: self.restock_product(low_stock_table, low_stock_dialog))
+        except Exception as e:
+            error_msg = f"Error in show_low_stock_alert: {e}"
+            print(error_msg)
+            QMessageBox.critical(self, "Error", error_msg)
 
-            close_button = QPushButton("Close")
-            close_button.clicked.connect(low_stock_dialog.accept)
+    def _fill_low_stock_panel(self):
+        """نمایش محتوای فعلی مجموعه موجودی کم در پنل"""
+        panel = self.low_stock_panel
+        low_stock_products = self.low_stock_tracker.items()
 
-            button_layout.addWidget(restock_button)
-            button_layout.addWidget(close_button)
+        if not self.low_stock_tracker.loaded:
+            panel.alert_label.setText("Checking stock levels...")
+        elif low_stock_products:
+            panel.alert_label.setText(f"⚠️ {len(low_stock_products)} products have low stock!")
+        else:
+            panel.alert_label.setText("All products have sufficient stock levels.")
 
-            layout.addLayout(button_layout)
+        table = panel.table
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(low_stock_products))
+        red = QtGui.QBrush(QtGui.QColor(255, 0, 0))
+        for i, product in enumerate(low_stock_products):
+            table.setItem(i, 0, QTableWidgetItem(str(product[0])))
+            table.setItem(i, 1, QTableWidgetItem(product[1] or ""))
 
-            low_stock_dialog.setLayout(layout)
-            low_stock_dialog.exec_()
+            # نمایش موجودی فعلی با رنگ قرمز
+            stock_item = QTableWidgetItem(str(product[2]))
+            stock_item.setForeground(red)
+            table.setItem(i, 2, stock_item)
 
-        except Exception as e:
-            error_msg = f"Error in show_low_stock_alert: {e}"
-            print(error_msg)
-            QMessageBox.critical(self, "Error", error_msg)
+            table.setItem(i, 3, QTableWidgetItem(str(product[3])))
+        table.resizeColumnsToContents()
+        table.setUpdatesEnabled(True)
 
     def restock_product(self, table, parent_dialog):
         """افزایش موجودی محصول انتخاب شده"""
@@ -4669,20 +4456,24 @@ class ProductManager(QMainWindow):
             )
 
             if ok:
-                # به‌روزرسانی موجودی
-                new_stock = current_stock + amount
-                self.cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
-
-                # ثبت در تاریخچه
-                self.add_inventory_history(
-                    product_id, amount, "increase",
-                    f"Restocked from low stock alert ({current_stock} to {new_stock})"
-                )
+                with self.db.transaction():
+                    # به‌روزرسانی موجودی بر اساس مقدار فعلی پایگاه داده (نه متن جدول)
+                    result = self.products_repo.adjust_stock(product_id, amount)
+                    if result is not None:
+                        current_stock, new_stock = result
+
+                        # ثبت در تاریخچه در همان واحد کاری
+                        self.inventory_repo.add(
+                            product_id, amount, "increase",
+                            f"Restocked from low stock alert ({current_stock} to {new_stock})"
+                        )
 
-                self.conn.commit()
+                if result is None:
+                    QMessageBox.warning(self, "Error", f"Product {product_name} no longer exists")
+                    return
 
                 # به‌روزرسانی نمایش
-                self.load_products()
+                self.refresh_product_rows()
 
                 # بستن دیالوگ والد
                 parent_dialog.accept()
@@ -4696,7 +4487,6 @@ class ProductManager(QMainWindow):
             error_msg = f"Error in restock_product: {e}"
             print(error_msg)
             QMessageBox.critical(self, "Error", error_msg)
-            self.conn.rollback()
 
     def generate_barcode(self):
         """تولید بارکد برای محصول انتخاب شده"""
@@ -4747,10 +4537,12 @@ class ProductManager(QMainWindow):
         """نمایش بارکد تولید شده"""
         try:
             # دریافت اطلاعات محصول
-            self.cursor.execute("SELECT name, price FROM products WHERE id = ?", (product_id,))
-            product = self.cursor.fetchone()
-            product_name = product[0]
-            product_price = product[1]
+            product = self.products_repo.get(product_id)
+            if product is None:
+                QMessageBox.warning(self, "Error", f"Product {product_id} not found")
+                return
+            product_name = product.name
+            product_price = product.price
 
             # تولید فایل بارکد
             barcode_path = os.path.join('barcodes', f"barcode_{product_id}.png")
@@ -4866,13 +4658,13 @@ class ProductManager(QMainWindow):
                 if result:
                     product_id = result[0]
 
-                    # پیدا کردن محصول در جدول و انتخاب آن
-                    for row in range(self.products_table.rowCount()):
-                        if self.products_table.item(row, 0).text() == str(product_id):
-                            self.products_table.selectRow(row)
-                            self.load_product(row, 0)
-                            QMessageBox.information(self, "Barcode Found", f"Product found with barcode: {barcode_number}")
-                            return
+                    # پیدا کردن محصول در سطرهای بارگذاری‌شده جدول و انتخاب آن
+                    row = self.products_table.find_row(product_id)
+                    if row >= 0:
+                        self.products_table.selectRow(row)
+                        self.load_product(row, 0)
+                        QMessageBox.information(self, "Barcode Found", f"Product found with barcode: {barcode_number}")
+                        return
 
                 QMessageBox.warning(self, "Barcode Not Found", f"No product found with barcode: {barcode_number}")
 
@@ -4883,10 +4675,19 @@ class ProductManager(QMainWindow):
 
     def print_barcodes(self):
         """چاپ بارکد برای همه محصولات یا محصولات انتخاب شده"""
+        def on_error(message):
+            error_msg = f"Error in print_barcodes: {message}"
+            print(error_msg)
+            QMessageBox.critical(self, "Error", error_msg)
+
+        self._with_catalog(self._show_print_barcodes_dialog, on_error, 'print_barcodes')
+
+    def _show_print_barcodes_dialog(self, catalog):
+        """ساخت و نمایش پنجره چاپ بارکد از کاتالوگ همگام‌شده"""
         try:
-            # دریافت لیست محصولات دارای بارکد
-            self.cursor.execute("SELECT id, name, price, barcode FROM products WHERE barcode IS NOT NULL")
-            products_with_barcode = self.cursor.fetchall()
+            # دریافت لیست محصولات دارای بارکد از حافظه نهان کاتالوگ
+            has_barcode = np.flatnonzero([barcode is not None for barcode in catalog.column('barcode').tolist()])
+            products_with_barcode = catalog.rows(('id', 'name', 'price', 'barcode'), has_barcode)
 
             if not products_with_barcode:
                 QMessageBox.warning(self, "No Barcodes", "No products with barcodes found. Generate barcodes first.")
@@ -5224,7 +5025,7 @@ class ProductManager(QMainWindow):
 
             # به‌روزرسانی قیمت‌های تخفیف‌دار پس از بستن دیالوگ
             self.update_discounted_prices()
-            self.load_products()
+            self.refresh_product_rows()
 
         except Exception as e:
             error_msg = f"Error in manage_discounts: {e}"
@@ -5366,7 +5167,7 @@ class ProductManager(QMainWindow):
         """به‌روزرسانی قیمت‌های تخفیف‌دار برای همه محصولات"""
         try:
             # ابتدا همه قیمت‌های تخفیف‌دار را پاک می‌کنیم
-            self.cursor.execute("UPDATE products SET discount_price = NULL")
+            self.products_repo.clear_discount_prices()
 
             # تاریخ امروز
             today = datetime.datetime.now().strftime("%Y-%m-%d")
@@ -5387,14 +5188,10 @@ class ProductManager(QMainWindow):
 
                 if applies_to == "product":
                     # اعمال تخفیف به یک محصول خاص
-                    self.apply_discount_to_single_product(target_id, discount_type, discount_value)
+                    self.products_repo.apply_discount([target_id], discount_type, discount_value)
                 elif applies_to == "category":
-                    # اعمال تخفیف به همه محصولات یک دسته‌بندی
-                    self.cursor.execute("SELECT id FROM products WHERE category IN (SELECT name FROM categories WHERE id = ?)", (target_id,))
-                    products = self.cursor.fetchall()
-
-                    for product in products:
-                        self.apply_discount_to_single_product(product[0], discount_type, discount_value)
+                    # اعمال تخفیف به همه محصولات یک دسته‌بندی با یک دستور روی شاخص category_id
+                    self.products_repo.apply_category_discount(target_id, discount_type, discount_value)
 
             self.conn.commit()
             print("Discounted prices updated successfully")
@@ -5407,25 +5204,7 @@ class ProductManager(QMainWindow):
     def apply_discount_to_single_product(self, product_id, discount_type, discount_value):
         """اعمال تخفیف به یک محصول"""
         try:
-            # دریافت قیمت اصلی محصول
-            self.cursor.execute("SELECT price FROM products WHERE id = ?", (product_id,))
-            result = self.cursor.fetchone()
-
-            if not result:
-                return
-
-            original_price = result[0]
-
-            # محاسبه قیمت با تخفیف
-            if discount_type == "percentage":
-                discount_amount = original_price * (discount_value / 100)
-                discounted_price = original_price - discount_amount
-            else:  # fixed_amount
-                discounted_price = max(0, original_price - discount_value)
-
-            # به‌روزرسانی قیمت با تخفیف
-            self.cursor.execute("UPDATE products SET discount_price = ? WHERE id = ?", (discounted_price, product_id))
-
+            self.products_repo.apply_discount([product_id], discount_type, discount_value)
         except Exception as e:
             print(f"Error applying discount to product {product_id}: {e}")
 
@@ -5441,9 +5220,12 @@ class ProductManager(QMainWindow):
             product_id = self.products_table.item(selected_row, 0).text()
             product_name = self.products_table.item(selected_row, 1).text()
 
-            # دریافت قیمت اصلی محصول
-            self.cursor.execute("SELECT price FROM products WHERE id = ?", (product_id,))
-            original_price = self.cursor.fetchone()[0]
+            # دریافت قیمت اصلی محصول از حافظه نهان کاتالوگ (یا جدول، اگر هنوز در کاتالوگ نیست)
+            product = get_catalog(self.db, refresh=False).get(product_id, ('price',))
+            if product is not None:
+                original_price = product[0] or 0
+            else:
+                original_price = float(self.products_table.item(selected_row, 2).text() or 0)
 
             # ایجاد دیالوگ تخفیف
             discount_dialog = QDialog(self)
@@ -5566,7 +5348,7 @@ class ProductManager(QMainWindow):
                     self.update_discounted_prices()
 
                     # به‌روزرسانی نمایش محصولات
-                    self.load_products()
+                    self.refresh_product_rows()
 
                     QMessageBox.information(self, "Success", f"Discount applied to {product_name} successfully")
 
@@ -5695,7 +5477,7 @@ class ProductManager(QMainWindow):
                     self.update_discounted_prices()
 
                     # به‌روزرسانی نمایش محصولات
-                    self.load_products()
+                    self.refresh_product_rows()
 
                     QMessageBox.information(self, "Success", f"Discount applied to category '{category_name}' successfully")
 
@@ -5726,7 +5508,7 @@ class ProductManager(QMainWindow):
                 self.conn.commit()
 
                 # به‌روزرسانی نمایش محصولات
-                self.load_products()
+                self.refresh_product_rows()
 
                 QMessageBox.information(self, "Success", "All discounts have been cleared")
 
@@ -5738,6 +5520,16 @@ class ProductManager(QMainWindow):
 
     def show_dashboard(self):
         """نمایش داشبورد آماری"""
+        def on_error(message):
+            error_msg = f"Error in show_dashboard: {message}"
+            print(error_msg)
+            QMessageBox.critical(self, "Error", error_msg)
+
+        # داشبورد پس از همگام‌سازی کاتالوگ در نخ کارگر ساخته می‌شود
+        self._with_catalog(self._show_dashboard_dialog, on_error, 'dashboard')
+
+    def _show_dashboard_dialog(self, catalog):
+        """ساخت و نمایش داشبورد آماری از کاتالوگ همگام‌شده"""
         try:
             # ایجاد دیالوگ داشبورد
             dashboard = QDialog(self)
@@ -5754,25 +5546,15 @@ class ProductManager(QMainWindow):
             # آمار کلی در قالب کارت‌ها
             stats_layout = QHBoxLayout()
 
-            # تعداد کل محصولات
-            self.cursor.execute("SELECT COUNT(*) FROM products")
-            total_products = self.cursor.fetchone()[0]
-
-            # تعداد دسته‌بندی‌ها
-            self.cursor.execute("SELECT COUNT(DISTINCT category) FROM products")
-            total_categories = self.cursor.fetchone()[0]
-
-            # مجموع موجودی
-            self.cursor.execute("SELECT SUM(stock) FROM products")
-            total_stock = self.cursor.fetchone()[0] or 0
+            # آمار کلی از جداول خلاصه (که با تریگر به‌روز می‌مانند) خوانده می‌شود
+            summary = self.products_repo.summary()
+            category_summaries = self.products_repo.category_summaries()
 
-            # تعداد محصولات با موجودی کم
-            self.cursor.execute("SELECT COUNT(*) FROM products WHERE stock < min_stock")
-            low_stock_count = self.cursor.fetchone()[0]
-
-            # تعداد محصولات دارای تخفیف
-            self.cursor.execute("SELECT COUNT(*) FROM products WHERE discount_price IS NOT NULL")
-            discounted_count = self.cursor.fetchone()[0]
+            total_products = summary.product_count
+            total_categories = len(category_summaries)
+            total_stock = summary.stock_total
+            low_stock_count = summary.low_stock_count
+            discounted_count = summary.discounted_count
 
             # ایجاد کارت‌های آماری
             stats_cards = [
@@ -5807,9 +5589,9 @@ class ProductManager(QMainWindow):
             price_chart_group = QGroupBox("توزیع قیمت محصولات")
             price_chart_layout = QVBoxLayout()
 
-            # دریافت داده‌های قیمت
-            self.cursor.execute("SELECT price FROM products WHERE price > 0")
-            prices = [row[0] for row in self.cursor.fetchall()]
+            # دریافت داده‌های قیمت از حافظه نهان کاتالوگ
+            catalog_prices = catalog.column('price')
+            prices = catalog_prices[catalog_prices > 0].tolist()
 
             if prices:
                 # ایجاد نمودار
@@ -5846,20 +5628,9 @@ class ProductManager(QMainWindow):
             stock_chart_group = QGroupBox("وضعیت موجودی محصولات")
             stock_chart_layout = QVBoxLayout()
 
-            # دریافت داده‌های موجودی
-            self.cursor.execute("""
-                SELECT
-                    CASE
-                        WHEN stock = 0 THEN 'بدون موجودی'
-                        WHEN stock < min_stock THEN 'موجودی کم'
-                        WHEN stock < min_stock * 2 THEN 'موجودی متوسط'
-                        ELSE 'موجودی کافی'
-                    END as stock_status,
-                    COUNT(*) as count
-                FROM products
-                GROUP BY stock_status
-            """)
-            stock_data = self.cursor.fetchall()
+            # دریافت داده‌های موجودی (شمارنده‌های وضعیت در جدول خلاصه)
+            stock_labels = ['بدون موجودی', 'موجودی کم', 'موجودی متوسط', 'موجودی کافی']
+            stock_data = [(label, count) for label, count in zip(stock_labels, summary.stock_status_counts) if count]
 
             if stock_data:
                 # ایجاد نمودار
@@ -5906,14 +5677,7 @@ class ProductManager(QMainWindow):
             category_chart_layout = QVBoxLayout()
 
             # دریافت داده‌های دسته‌بندی
-            self.cursor.execute("""
-                SELECT category, COUNT(*) as count
-                FROM products
-                WHERE category IS NOT NULL AND category != ''
-                GROUP BY category
-                ORDER BY count DESC
-            """)
-            category_data = self.cursor.fetchall()
+            category_data = [(row.name, row.product_count) for row in category_summaries]
 
             if category_data:
                 # ایجاد نمودار
@@ -5959,19 +5723,12 @@ class ProductManager(QMainWindow):
                 category_table.setColumnCount(4)
                 category_table.setHorizontalHeaderLabels(['دسته‌بندی', 'تعداد محصولات', 'میانگین قیمت', 'مجموع موجودی'])
 
-                # دریافت آمار تفصیلی دسته‌بندی‌ها
-                self.cursor.execute("""
-                    SELECT
-                        category,
-                        COUNT(*) as product_count,
-                        AVG(price) as avg_price,
-                        SUM(stock) as total_stock
-                    FROM products
-                    WHERE category IS NOT NULL AND category != ''
-                    GROUP BY category
-                    ORDER BY product_count DESC
-                """)
-                detailed_category_data = self.cursor.fetchall()
+                # آمار تفصیلی دسته‌بندی‌ها از همان جدول خلاصه (میانگین قیمت = price_sum / price_count)
+                detailed_category_data = [
+                    (row.name, row.product_count, row.price_sum / row.price_count if row.price_count else None,
+                     row.stock_total)
+                    for row in category_summaries
+                ]
 
                 category_table.setRowCount(len(detailed_category_data))
                 for i, row in enumerate(detailed_category_data):
@@ -6047,17 +5804,20 @@ class ProductManager(QMainWindow):
                 # نمودار تأثیر تخفیف‌ها بر قیمت‌ها
                 discount_canvas = MplCanvas(width=8, height=4)
 
-                # دریافت داده‌های قیمت اصلی و قیمت با تخفیف
-                self.cursor.execute("""
-                    SELECT
-                        price,
-                        discount_price,
-                        (price - discount_price) / price * 100 as discount_percent
-                    FROM products
-                    WHERE discount_price IS NOT NULL AND price > 0
-                    ORDER BY discount_percent DESC
-                """)
-                discount_data = self.cursor.fetchall()
+                # دریافت داده‌های قیمت اصلی و قیمت با تخفیف از حافظه نهان کاتالوگ
+                original = catalog.column('price')
+                discounted = catalog.column('discount_price')
+                with np.errstate(invalid='ignore'):
+                    selected = np.flatnonzero(~np.isnan(discounted) & (original > 0))
+                percents = (original[selected] - discounted[selected]) / original[selected] * 100
+                order = np.argsort(-percents, kind='stable')
+                selected, percents = selected[order], percents[order]
+                discount_data = [
+                    (price, discount_price, percent)
+                    for (price, discount_price), percent in zip(
+                        catalog.rows(('price', 'discount_price'), selected), percents.tolist()
+                    )
+                ]
 
                 if discount_data:
                     # آماده‌سازی داده‌ها برای نمودار
@@ -6259,6 +6019,7 @@ class ProductManager(QMainWindow):
             images_table.setSelectionMode(QTableWidget.SingleSelection)
             images_table.horizontalHeader().setStretchLastSection(True)
             images_table.setEditTriggers(QTableWidget.NoEditTriggers)
+            images_table.setIconSize(QtCore.QSize(48, 48))
 
             main_layout.addWidget(images_table)
 
@@ -6318,8 +6079,12 @@ class ProductManager(QMainWindow):
                         # شناسه
                         images_table.setItem(i, 0, QTableWidgetItem(str(image[0])))
 
-                        # مسیر تصویر
+                        # مسیر تصویر؛ تصویر کوچک پس از بارگذاری در پس‌زمینه به عنوان آیکون اضافه می‌شود
                         images_table.setItem(i, 1, QTableWidgetItem(image[1]))
+                        get_image_loader().load(
+                            image[1], 64,
+                            lambda pixmap, message, row=i, path=image[1]: set_row_icon(row, path, pixmap)
+                        )
 
                         # توضیحات
                         images_table.setItem(i, 2, QTableWidgetItem(image[2] if image[2] else ""))
@@ -6340,14 +6105,33 @@ class ProductManager(QMainWindow):
                     print(f"Error loading product images: {e}")
                     QMessageBox.critical(images_dialog, "خطا", f"خطا در بارگذاری تصاویر: {str(e)}")
 
+            def set_row_icon(row, image_path, pixmap):
+                """قرار دادن تصویر کوچک در سطر جدول (اگر جدول در این فاصله دوباره پر نشده باشد)"""
+                item = images_table.item(row, 1)
+                if pixmap is not None and item is not None and item.text() == image_path:
+                    item.setIcon(QtGui.QIcon(pixmap))
+
             def show_preview(image_path):
                 """نمایش پیش‌نمایش تصویر انتخاب شده"""
                 try:
                     if os.path.exists(image_path):
-                        pixmap = QtGui.QPixmap(image_path)
-                        pixmap = pixmap.scaled(preview_label.width(), preview_label.height(),
-                                              QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
-                        preview_label.setPixmap(pixmap)
+                        # پیش‌نمایش از نسخه کوچک‌شده هم‌اندازه برچسب و در پس‌زمینه خوانده می‌شود
+                        size = thumbnail_size(max(preview_label.width(), preview_label.height()))
+                        preview_label.setProperty('image_path', image_path)
+                        preview_label.setText(LOADING_TEXT)
+
+                        def show(pixmap, message):
+                            # پیش‌نمایش درخواست‌های قبلی که دیرتر رسیده‌اند نادیده گرفته می‌شود
+                            if preview_label.property('image_path') != image_path:
+                                return
+                            if pixmap is None:
+                                preview_label.setText(message)
+                                return
+                            preview_label.setPixmap(pixmap.scaled(
+                                preview_label.width(), preview_label.height(),
+                                QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
+
+                        get_image_loader().load(image_path, size, show)
                     else:
                         preview_label.setText("تصویر یافت نشد")
                 except Exception as e:
@@ -6843,6 +6627,96 @@ class ProductManager(QMainWindow):
             print(f"Error in manage_product_images: {e}")
             QMessageBox.critical(self, "خطا", f"خطا در مدیریت تصاویر: {str(e)}")
 
+    def show_query_profiler(self):
+        """نمایش آمار زنده اجرای پرس‌وجوها برای یافتن دستورات کند"""
+        try:
+            profiler = get_profiler()
+
+            dialog = QDialog(self)
+            dialog.setWindowTitle('پروفایل پرس‌وجوها')
+            dialog.setMinimumSize(1000, 600)
+            layout = QVBoxLayout()
+
+            info_label = QLabel(
+                f"دستورات کندتر از {profiler.slow_threshold_ms} میلی‌ثانیه همراه با طرح اجرا در "
+                f"{profiler.log_path} ثبت می‌شوند. برای دیدن طرح اجرا نشانگر را روی متن دستور نگه دارید."
+            )
+            info_label.setWordWrap(True)
+            layout.addWidget(info_label)
+
+            headers = ['تعداد اجرا', 'مجموع (ms)', 'میانگین (ms)', 'بیشینه (ms)', 'کند', 'سطرها', 'محل فراخوانی', 'دستور']
+            stats_table = QTableWidget()
+            stats_table.setColumnCount(len(headers))
+            stats_table.setHorizontalHeaderLabels(headers)
+            stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+            stats_table.horizontalHeader().setStretchLastSection(True)
+            layout.addWidget(stats_table)
+
+            sort_combo = QComboBox()
+            sort_combo.addItem('مجموع زمان', 'total_ms')
+            sort_combo.addItem('بیشینه زمان', 'max_ms')
+            sort_combo.addItem('تعداد اجرا', 'calls')
+            sort_combo.addItem('تعداد سطرها', 'rows')
+
+            def refresh():
+                stats = profiler.summary(limit=100, key=sort_combo.currentData())
+                stats_table.setRowCount(len(stats))
+                for i, stat in enumerate(stats):
+                    values = [stat.calls, f"{stat.total_ms:.1f}", f"{stat.avg_ms:.2f}", f"{stat.max_ms:.1f}",
+                              stat.slow_calls, stat.rows, stat.call_site or '']
+                    for column, value in enumerate(values):
+                        stats_table.setItem(i, column, QTableWidgetItem(str(value)))
+                    sql_item = QTableWidgetItem(" ".join(stat.sql.split()))
+                    if stat.plan:
+                        sql_item.setToolTip(stat.plan)
+                    if stat.slow_calls:
+                        sql_item.setBackground(QtGui.QColor(255, 200, 200))
+                    stats_table.setItem(i, len(values), sql_item)
+
+            sort_combo.currentIndexChanged.connect(refresh)
+
+            button_layout = QHBoxLayout()
+            button_layout.addWidget(QLabel('مرتب‌سازی:'))
+            button_layout.addWidget(sort_combo)
+
+            enabled_check = QCheckBox('فعال')
+            enabled_check.setChecked(profiler.enabled)
+            enabled_check.toggled.connect(lambda checked: setattr(profiler, 'enabled', checked))
+            button_layout.addWidget(enabled_check)
+
+            reset_button = QPushButton('پاک کردن آمار')
+            reset_button.clicked.connect(lambda: (profiler.reset(), refresh()))
+            button_layout.addWidget(reset_button)
+
+            close_button = QPushButton('بستن')
+            close_button.clicked.connect(dialog.accept)
+            button_layout.addWidget(close_button)
+            layout.addLayout(button_layout)
+
+            dialog.setLayout(layout)
+
+            # به‌روزرسانی زنده آمار هر ثانیه
+            timer = QtCore.QTimer(dialog)
+            timer.timeout.connect(refresh)
+            timer.start(1000)
+
+            refresh()
+            dialog.exec_()
+
+        except Exception as e:
+            print(f"Error showing query profiler: {e}")
+            QMessageBox.critical(self, "خطا", f"خطا در نمایش پروفایل پرس‌وجوها: {str(e)}")
+
+    def closeEvent(self, event):
+        """رویداد بستن پنجره"""
+        try:
+            # لغو پرس‌وجوهای پس‌زمینه و ثبت تغییرات در انتظار
+            self.db_worker.shutdown()
+            self.db.flush()
+        except Exception as e:
+            print(f"Error closing database worker: {e}")
+        super().closeEvent(event)
+
 if __name__ == '__main__':
     try:
         app = QApplication(sys.argv)
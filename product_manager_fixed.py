@@ -5,6 +5,14 @@ import time
 import json
 import sqlite3
 
+from db_connection import get_connection_manager
+from db_worker import DatabaseWorker
+from migrations import run_migrations
+from repository import ProductRepository, ProductFilter, PRODUCTS_FROM, search_condition
+from image_loader import set_label_image
+from product_import import (MERGE_KEY, CsvSource, excel_source, lenient_product_values, missing_columns,
+                            rejected_rows_path, run_import_job, unfinished_import)
+
 # Try to import optional dependencies
 try:
     from PyQt5 import QtWidgets, QtGui, QtCore
@@ -133,9 +141,16 @@ class ProductManager(QMainWindow):
             # بارگذاری تنظیمات از فایل
             self.load_settings()
 
-            # ابتدا اتصال به پایگاه داده را برقرار می‌کنیم
-            self.conn = sqlite3.connect('products.db')
+            # ابتدا اتصال به پایگاه داده را برقرار می‌کنیم (اتصال نویسنده مشترک)
+            self.db = get_connection_manager('products.db')
+            self.conn = self.db.writer
             self.cursor = self.conn.cursor()
+            self.products_repo = ProductRepository(self.conn)
+
+            # اجرای پرس‌وجوهای سنگین گزارش‌ها در پس‌زمینه تا رابط کاربری قفل نشود
+            self.db_worker = DatabaseWorker(self.db, self)
+            # کار وارد کردن فایل در حال اجرا (فقط یکی در هر زمان)
+            self.import_job = None
 
             # ابتدا جداول پایگاه داده را ایجاد می‌کنیم
             self.initDB_tables()
@@ -338,102 +353,9 @@ class ProductManager(QMainWindow):
     def initDB_tables(self):
         """ایجاد جداول مورد نیاز در پایگاه داده"""
         try:
-            # جدول محصولات
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS products
-                                (id INTEGER PRIMARY KEY,
-                                name TEXT,
-                                price REAL,
-                                category TEXT,
-                                image TEXT,
-                                stock INTEGER DEFAULT 0,
-                                min_stock INTEGER DEFAULT 5,
-                                discount_price REAL,
-                                barcode TEXT,
-                                description TEXT,
-                                created_at TEXT,
-                                updated_at TEXT)''')
-            self.conn.commit()
-
-            # جدول دسته‌بندی‌ها
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS categories
-                                (id INTEGER PRIMARY KEY,
-                                name TEXT,
-                                description TEXT,
-                                parent_id INTEGER,
-                                created_at TEXT)''')
-            self.conn.commit()
-
-            # جدول تصاویر محصولات
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS product_images
-                                (id INTEGER PRIMARY KEY,
-                                product_id INTEGER,
-                                image_path TEXT,
-                                is_primary INTEGER DEFAULT 0,
-                                created_at TEXT,
-                                FOREIGN KEY (product_id) REFERENCES products(id))''')
-            self.conn.commit()
-
-            # جدول تاریخچه موجودی
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS inventory_history
-                                (id INTEGER PRIMARY KEY,
-                                product_id INTEGER,
-                                old_stock INTEGER,
-                                new_stock INTEGER,
-                                change_reason TEXT,
-                                user_id INTEGER,
-                                timestamp TEXT,
-                                FOREIGN KEY (product_id) REFERENCES products(id))''')
-            self.conn.commit()
-
-            # جدول تخفیف‌ها
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS discounts
-                                (id INTEGER PRIMARY KEY,
-                                name TEXT,
-                                discount_type TEXT,
-                                discount_value REAL,
-                                start_date TEXT,
-                                end_date TEXT,
-                                is_active INTEGER DEFAULT 1,
-                                created_at TEXT)''')
-            self.conn.commit()
-
-            # جدول ارتباط تخفیف‌ها با محصولات
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS product_discounts
-                                (id INTEGER PRIMARY KEY,
-                                product_id INTEGER,
-                                discount_id INTEGER,
-                                FOREIGN KEY (product_id) REFERENCES products(id),
-                                FOREIGN KEY (discount_id) REFERENCES discounts(id))''')
-            self.conn.commit()
-
-            # جدول فعالیت‌های سیستم
-            self.cursor.execute('''CREATE TABLE IF NOT EXISTS activities
-                                (id INTEGER PRIMARY KEY,
-                                activity_type TEXT,
-                                description TEXT,
-                                user_id INTEGER,
-                                timestamp TEXT,
-                                ip_address TEXT)''')
-            self.conn.commit()
-
-            # بررسی وجود جدول activities
-            try:
-                self.cursor.execute("SELECT COUNT(*) FROM activities")
-                self.cursor.fetchone()
-                print("Activities table exists and is accessible")
-            except sqlite3.OperationalError:
-                print("Recreating activities table due to access error")
-                self.cursor.execute("DROP TABLE IF EXISTS activities")
-                self.cursor.execute('''CREATE TABLE IF NOT EXISTS activities
-                                    (id INTEGER PRIMARY KEY,
-                                    activity_type TEXT,
-                                    description TEXT,
-                                    user_id INTEGER,
-                                    timestamp TEXT,
-                                    ip_address TEXT)''')
-                self.conn.commit()
-
-            print("Database tables created successfully")
+            # مهاجرت‌ها فقط زمانی اجرا می‌شوند که نسخه طرح پایگاه داده قدیمی باشد
+            version = run_migrations(self.conn)
+            print(f"Database schema is at version {version}")
         except Exception as e:
             print(f"Error creating database tables: {e}")
 
@@ -939,7 +861,9 @@ class ProductManager(QMainWindow):
             table.horizontalHeader().setStretchLastSection(True)
 
             # دریافت محصولات از پایگاه داده
-            self.cursor.execute("SELECT id, name, price, category, stock, barcode FROM products ORDER BY id DESC")
+            self.cursor.execute(
+                f"SELECT p.id, p.name, p.price, c.name, p.stock, p.barcode FROM {PRODUCTS_FROM} ORDER BY p.id DESC"
+            )
             products = self.cursor.fetchall()
 
             # تنظیم تعداد سطرهای جدول
@@ -990,10 +914,10 @@ class ProductManager(QMainWindow):
         """ویرایش محصول"""
         try:
             # دریافت اطلاعات محصول
-            self.cursor.execute("""
-                SELECT name, price, category, stock, min_stock, description, image, barcode
-                FROM products
-                WHERE id = ?
+            self.cursor.execute(f"""
+                SELECT p.name, p.price, c.name, p.stock, p.min_stock, p.description, p.image, p.barcode
+                FROM {PRODUCTS_FROM}
+                WHERE p.id = ?
             """, (product_id,))
 
             product = self.cursor.fetchone()
@@ -1190,9 +1114,9 @@ class ProductManager(QMainWindow):
         """مشاهده جزئیات محصول"""
         try:
             # دریافت اطلاعات محصول
-            self.cursor.execute("""
-                SELECT p.id, p.name, p.price, p.category, p.stock, p.description, p.barcode, p.image, p.created_at, p.updated_at
-                FROM products p
+            self.cursor.execute(f"""
+                SELECT p.id, p.name, p.price, c.name, p.stock, p.description, p.barcode, p.image, p.created_at, p.updated_at
+                FROM {PRODUCTS_FROM}
                 WHERE p.id = ?
             """, (product_id,))
 
@@ -1235,8 +1159,7 @@ class ProductManager(QMainWindow):
             # نمایش تصویر محصول
             if product[7] and os.path.exists(product[7]):
                 image_label = QLabel()
-                image_pixmap = QtGui.QPixmap(product[7])
-                image_label.setPixmap(image_pixmap.scaledToWidth(300))
+                set_label_image(image_label, product[7], 300)
                 form_layout.addRow("تصویر محصول:", image_label)
 
             # اضافه کردن فرم به طرح اصلی
@@ -1348,18 +1271,21 @@ class ProductManager(QMainWindow):
                     products_table.setRowCount(0)
 
                     # ساخت پرس‌وجو
-                    query = """
-                        SELECT id, name, category, stock, min_stock
-                        FROM products
+                    query = f"""
+                        SELECT p.id, p.name, c.name, p.stock, p.min_stock
+                        FROM {PRODUCTS_FROM}
                         WHERE 1=1
                     """
                     params = []
 
                     if search_text:
-                        query += " AND (name LIKE ? OR id = ?)"
-                        params.extend([f"%{search_text}%", search_text if search_text.isdigit() else -1])
+                        # جستجوی متنی از شاخص FTS و جستجوی شناسه از کلید اصلی استفاده می‌کند
+                        condition, condition_params = search_condition(self.conn, search_text, 'p')
+                        query += f" AND ({condition} OR p.id = ?)"
+                        params.extend(condition_params)
+                        params.append(int(search_text) if search_text.isdigit() else -1)
 
-                    query += " ORDER BY stock ASC"
+                    query += " ORDER BY p.stock ASC"
 
                     # اجرای پرس‌وجو
                     self.cursor.execute(query, params)
@@ -1594,10 +1520,10 @@ class ProductManager(QMainWindow):
             table.setEditTriggers(QTableWidget.NoEditTriggers)
 
             # دریافت محصولات از پایگاه داده
-            self.cursor.execute("""
-                SELECT id, name, category, stock
-                FROM products
-                ORDER BY name
+            self.cursor.execute(f"""
+                SELECT p.id, p.name, c.name, p.stock
+                FROM {PRODUCTS_FROM}
+                ORDER BY p.name
             """)
 
             products = self.cursor.fetchall()
@@ -1820,7 +1746,27 @@ class ProductManager(QMainWindow):
             QMessageBox.critical(self, "خطا", f"خطا در پردازش به‌روزرسانی گروهی: {str(e)}")
 
     def show_inventory_report(self):
-        """نمایش گزارش موجودی"""
+        """نمایش گزارش موجودی
+
+        داده‌ها در نخ کارگر خوانده می‌شوند و پنجره گزارش پس از رسیدن نتیجه ساخته می‌شود.
+        """
+        def on_error(message):
+            print(f"Error showing inventory report: {message}")
+            QMessageBox.critical(self, "خطا", f"خطا در نمایش گزارش موجودی: {message}")
+
+        try:
+            # دریافت اطلاعات موجودی از پایگاه داده (به ترتیب شاخص مرتب‌سازی موجودی)
+            self.db_worker.submit(
+                lambda conn, job: ProductFilter(sort='stock').fetch(conn, "p.name, c.name, p.stock, p.min_stock"),
+                on_result=self._show_inventory_report_dialog,
+                on_error=on_error,
+                channel='inventory_report'
+            )
+        except Exception as e:
+            on_error(str(e))
+
+    def _show_inventory_report_dialog(self, inventory_data):
+        """ساخت و نمایش پنجره گزارش موجودی از داده‌های خوانده‌شده"""
         try:
             # ایجاد پنجره گزارش
             dialog = QDialog(self)
@@ -1843,15 +1789,6 @@ class ProductManager(QMainWindow):
             table.setHorizontalHeaderLabels(["نام محصول", "دسته‌بندی", "موجودی فعلی", "حداقل موجودی", "وضعیت"])
             table.setEditTriggers(QTableWidget.NoEditTriggers)
 
-            # دریافت اطلاعات موجودی از پایگاه داده
-            self.cursor.execute("""
-                SELECT name, category, stock, min_stock
-                FROM products
-                ORDER BY stock ASC
-            """)
-
-            inventory_data = self.cursor.fetchall()
-
             # تنظیم تعداد سطرهای جدول
             table.setRowCount(len(inventory_data))
 
@@ -2059,10 +1996,6 @@ class ProductManager(QMainWindow):
     # توابع وارد کردن و صادر کردن
     def import_from_excel(self):
         """وارد کردن محصولات از فایل Excel"""
-        if pd is None:
-            QMessageBox.warning(self, "خطا", "برای استفاده از این قابلیت، کتابخانه pandas باید نصب شده باشد.")
-            return
-
         try:
             # انتخاب فایل
             file_path, _ = QFileDialog.getOpenFileName(self, "انتخاب فایل Excel", "", "Excel Files (*.xlsx *.xls)")
@@ -2070,120 +2003,8 @@ class ProductManager(QMainWindow):
             if not file_path:
                 return
 
-            # خواندن فایل Excel
-            df = pd.read_excel(file_path)
-
-            # بررسی ستون‌های مورد نیاز
-            required_columns = ["name", "price", "category", "stock", "description"]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-
-            if missing_columns:
-                QMessageBox.warning(self, "خطا", f"ستون‌های زیر در فایل وجود ندارند: {', '.join(missing_columns)}")
-                return
-
-            # نمایش پیش‌نمایش داده‌ها
-            preview_dialog = QDialog(self)
-            preview_dialog.setWindowTitle("پیش‌نمایش داده‌ها")
-            preview_dialog.setMinimumSize(800, 600)
-
-            preview_layout = QVBoxLayout(preview_dialog)
-
-            # ایجاد جدول پیش‌نمایش
-            preview_table = QTableWidget()
-            preview_table.setColumnCount(len(df.columns))
-            preview_table.setHorizontalHeaderLabels(df.columns)
-            preview_table.setRowCount(min(10, len(df)))  # نمایش حداکثر 10 سطر
-
-            # پر کردن جدول پیش‌نمایش
-            for row in range(min(10, len(df))):
-                for col, column_name in enumerate(df.columns):
-                    value = str(df.iloc[row, col])
-                    preview_table.setItem(row, col, QTableWidgetItem(value))
-
-            preview_layout.addWidget(QLabel(f"نمایش {min(10, len(df))} سطر از {len(df)} سطر"))
-            preview_layout.addWidget(preview_table)
-
-            # اضافه کردن چک‌باکس برای حذف داده‌های قبلی
-            clear_existing = QCheckBox("حذف تمام محصولات موجود قبل از وارد کردن")
-            preview_layout.addWidget(clear_existing)
-
-            # دکمه‌های تایید و لغو
-            buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-            buttons.accepted.connect(preview_dialog.accept)
-            buttons.rejected.connect(preview_dialog.reject)
-            preview_layout.addWidget(buttons)
-
-            # نمایش پیش‌نمایش
-            if preview_dialog.exec_() != QDialog.Accepted:
-                return
-
-            # حذف داده‌های قبلی در صورت انتخاب
-            if clear_existing.isChecked():
-                confirm = QMessageBox.question(self, "تایید حذف",
-                                             "آیا از حذف تمام محصولات موجود اطمینان دارید؟",
-                                             QMessageBox.Yes | QMessageBox.No)
-
-                if confirm == QMessageBox.Yes:
-                    self.cursor.execute("DELETE FROM products")
-                    self.conn.commit()
-
-            # نمایش پیشرفت
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("در حال وارد کردن داده‌ها")
-            progress_dialog.setMinimumWidth(400)
-
-            progress_layout = QVBoxLayout(progress_dialog)
-            progress_label = QLabel("در حال وارد کردن داده‌ها...")
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, len(df))
-
-            progress_layout.addWidget(progress_label)
-            progress_layout.addWidget(progress_bar)
-
-            progress_dialog.show()
-
-            # وارد کردن داده‌ها
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            success_count = 0
-            error_count = 0
-
-            for index, row in df.iterrows():
-                try:
-                    # استخراج داده‌ها
-                    name = str(row["name"])
-                    price = float(row["price"]) if not pd.isna(row["price"]) else 0
-                    category = str(row["category"]) if not pd.isna(row["category"]) else ""
-                    stock = int(row["stock"]) if not pd.isna(row["stock"]) else 0
-                    description = str(row["description"]) if not pd.isna(row["description"]) else ""
-
-                    # ثبت محصول در پایگاه داده
-                    self.cursor.execute(
-                        "INSERT INTO products (name, price, category, stock, description, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (name, price, category, stock, description, timestamp, timestamp)
-                    )
-
-                    success_count += 1
-                except Exception as e:
-                    print(f"Error importing row {index}: {e}")
-                    error_count += 1
-
-                # به‌روزرسانی نوار پیشرفت
-                progress_bar.setValue(index + 1)
-                QtWidgets.QApplication.processEvents()
-
-            # ذخیره تغییرات
-            self.conn.commit()
-
-            # بستن پنجره پیشرفت
-            progress_dialog.close()
-
-            # ثبت فعالیت
-            self.log_activity("import", f"وارد کردن {success_count} محصول از فایل Excel")
-
-            # نمایش نتیجه
-            QMessageBox.information(self, "نتیجه وارد کردن",
-                                   f"تعداد {success_count} محصول با موفقیت وارد شد.\n"
-                                   f"تعداد {error_count} خطا رخ داد.")
+            # فایل xlsx به صورت جریانی و بخش به بخش خوانده می‌شود
+            self.start_product_import(file_path, "Excel", excel_source)
         except Exception as e:
             print(f"Error importing from Excel: {e}")
             QMessageBox.critical(self, "خطا", f"خطا در وارد کردن از Excel: {str(e)}")
@@ -2197,144 +2018,201 @@ class ProductManager(QMainWindow):
             if not file_path:
                 return
 
-            # خواندن فایل CSV
-            products = []
-            headers = []
-
-            with open(file_path, 'r', encoding='utf-8') as csvfile:
-                csv_reader = csv.reader(csvfile)
-                headers = next(csv_reader)  # خواندن سطر هدر
-
-                # بررسی ستون‌های مورد نیاز
-                required_columns = ["name", "price", "category", "stock", "description"]
-                header_lower = [h.lower() for h in headers]
-
-                missing_columns = []
-                for col in required_columns:
-                    if col not in header_lower:
-                        missing_columns.append(col)
-
-                if missing_columns:
-                    QMessageBox.warning(self, "خطا", f"ستون‌های زیر در فایل وجود ندارند: {', '.join(missing_columns)}")
-                    return
-
-                # نگاشت شاخص ستون‌ها
-                col_indices = {}
-                for i, header in enumerate(header_lower):
-                    col_indices[header] = i
-
-                # خواندن داده‌ها
-                for row in csv_reader:
-                    if len(row) >= len(headers):
-                        product = {
-                            "name": row[col_indices["name"]],
-                            "price": float(row[col_indices["price"]]) if row[col_indices["price"]] else 0,
-                            "category": row[col_indices["category"]],
-                            "stock": int(row[col_indices["stock"]]) if row[col_indices["stock"]] else 0,
-                            "description": row[col_indices["description"]]
-                        }
-                        products.append(product)
-
-            # نمایش پیش‌نمایش داده‌ها
-            preview_dialog = QDialog(self)
-            preview_dialog.setWindowTitle("پیش‌نمایش داده‌ها")
-            preview_dialog.setMinimumSize(800, 600)
-
-            preview_layout = QVBoxLayout(preview_dialog)
-
-            # ایجاد جدول پیش‌نمایش
-            preview_table = QTableWidget()
-            preview_table.setColumnCount(len(required_columns))
-            preview_table.setHorizontalHeaderLabels(required_columns)
-            preview_table.setRowCount(min(10, len(products)))  # نمایش حداکثر 10 سطر
-
-            # پر کردن جدول پیش‌نمایش
-            for row in range(min(10, len(products))):
-                product = products[row]
-                for col, column_name in enumerate(required_columns):
-                    value = str(product[column_name])
-                    preview_table.setItem(row, col, QTableWidgetItem(value))
-
-            preview_layout.addWidget(QLabel(f"نمایش {min(10, len(products))} سطر از {len(products)} سطر"))
-            preview_layout.addWidget(preview_table)
-
-            # اضافه کردن چک‌باکس برای حذف داده‌های قبلی
-            clear_existing = QCheckBox("حذف تمام محصولات موجود قبل از وارد کردن")
-            preview_layout.addWidget(clear_existing)
-
-            # دکمه‌های تایید و لغو
-            buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-            buttons.accepted.connect(preview_dialog.accept)
-            buttons.rejected.connect(preview_dialog.reject)
-            preview_layout.addWidget(buttons)
-
-            # نمایش پیش‌نمایش
-            if preview_dialog.exec_() != QDialog.Accepted:
-                return
-
-            # حذف داده‌های قبلی در صورت انتخاب
-            if clear_existing.isChecked():
-                confirm = QMessageBox.question(self, "تایید حذف",
-                                             "آیا از حذف تمام محصولات موجود اطمینان دارید؟",
-                                             QMessageBox.Yes | QMessageBox.No)
+            # فایل به صورت جریانی و بخش به بخش خوانده می‌شود
+            self.start_product_import(file_path, "CSV", CsvSource)
+        except Exception as e:
+            print(f"Error importing from CSV: {e}")
+            QMessageBox.critical(self, "خطا", f"خطا در وارد کردن از CSV: {str(e)}")
 
-                if confirm == QMessageBox.Yes:
-                    self.cursor.execute("DELETE FROM products")
-                    self.conn.commit()
+    def start_product_import(self, file_path, file_type, open_source):
+        """پیش‌نمایش و وارد کردن محصولات یک فایل در پس‌زمینه با امکان لغو و ادامه
 
-            # نمایش پیشرفت
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle("در حال وارد کردن داده‌ها")
-            progress_dialog.setMinimumWidth(400)
+        پس از تایید پیش‌نمایش، فایل در نخ نوشتن کارگر پایگاه داده با run_import_job
+        (همانند product_manager.py) وارد و در نقاط بازیابی ثبت می‌شود؛ پنجره در این مدت
+        قابل استفاده می‌ماند و وارد کردن نیمه‌کاره همین فایل را می‌توان ادامه داد.
 
-            progress_layout = QVBoxLayout(progress_dialog)
-            progress_label = QLabel("در حال وارد کردن داده‌ها...")
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, len(products))
-
-            progress_layout.addWidget(progress_label)
-            progress_layout.addWidget(progress_bar)
+        Args:
+            file_path (str): مسیر فایل
+            file_type (str): نوع فایل برای پیام‌ها (CSV یا Excel)
+            open_source (callable): ساخت منبع بخش‌بندی‌شده از مسیر فایل
+        """
+        if self.import_job is not None:
+            QMessageBox.warning(self, "وارد کردن محصولات", "یک عملیات وارد کردن در حال اجرا است.")
+            return
 
-            progress_dialog.show()
+        # فقط ده سطر اول برای پیش‌نمایش خوانده می‌شود
+        with open_source(file_path, chunk_size=10) as source:
+            columns = source.columns
+            # پیشرفت CsvSource بر حسب بایت است و تعداد سطرها از پیش معلوم نیست
+            total_rows = 0 if isinstance(source, CsvSource) else source.progress()[1]
+            preview_rows = next(iter(source), [])
 
-            # وارد کردن داده‌ها
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            success_count = 0
-            error_count = 0
+        # بررسی ستون‌های مورد نیاز؛ فایل دارای ستون barcode می‌تواند فقط بخشی از ستون‌ها را
+        # داشته باشد و با محصولات موجود ادغام شود
+        can_merge = MERGE_KEY in columns
+        missing_columns_list = missing_columns(columns, ["name", "price", "category", "stock", "description"])
 
-            for i, product in enumerate(products):
-                try:
-                    # ثبت محصول در پایگاه داده
-                    self.cursor.execute(
-                        "INSERT INTO products (name, price, category, stock, description, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (product["name"], product["price"], product["category"], product["stock"], product["description"], timestamp, timestamp)
-                    )
-
-                    success_count += 1
-                except Exception as e:
-                    print(f"Error importing product {i}: {e}")
-                    error_count += 1
+        if missing_columns_list and not can_merge:
+            QMessageBox.warning(self, "خطا", f"ستون‌های زیر در فایل وجود ندارند: {', '.join(missing_columns_list)}")
+            return
 
-                # به‌روزرسانی نوار پیشرفت
-                progress_bar.setValue(i + 1)
-                QtWidgets.QApplication.processEvents()
+        # نمایش پیش‌نمایش داده‌ها
+        preview_dialog = QDialog(self)
+        preview_dialog.setWindowTitle("پیش‌نمایش داده‌ها")
+        preview_dialog.setMinimumSize(800, 600)
+
+        preview_layout = QVBoxLayout(preview_dialog)
+
+        # ایجاد جدول پیش‌نمایش
+        preview_table = QTableWidget()
+        preview_table.setColumnCount(len(columns))
+        preview_table.setHorizontalHeaderLabels(columns)
+        preview_table.setRowCount(len(preview_rows))  # نمایش حداکثر 10 سطر
+
+        # پر کردن جدول پیش‌نمایش
+        for row, (_, values) in enumerate(preview_rows):
+            for col, column_name in enumerate(columns):
+                value = values.get(column_name)
+                preview_table.setItem(row, col, QTableWidgetItem("" if value is None else str(value)))
+
+        total_text = str(total_rows) if total_rows else "نامعلوم"
+        preview_layout.addWidget(QLabel(f"نمایش {len(preview_rows)} سطر از {total_text} سطر"))
+        preview_layout.addWidget(preview_table)
+
+        # اضافه کردن چک‌باکس برای حذف داده‌های قبلی
+        clear_existing = QCheckBox("حذف تمام محصولات موجود قبل از وارد کردن")
+        preview_layout.addWidget(clear_existing)
+
+        # ادغام: محصولات با بارکد موجود فقط در صورت تغییر به‌روز می‌شوند
+        merge_existing = QCheckBox("ادغام با محصولات موجود بر اساس بارکد (به‌روزرسانی تغییرات)")
+        merge_existing.toggled.connect(lambda checked: clear_existing.setEnabled(not checked))
+        merge_existing.setEnabled(can_merge)
+        merge_existing.setChecked(can_merge)
+        preview_layout.addWidget(merge_existing)
+
+        # دکمه‌های تایید و لغو
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(preview_dialog.accept)
+        buttons.rejected.connect(preview_dialog.reject)
+        preview_layout.addWidget(buttons)
+
+        # نمایش پیش‌نمایش
+        if preview_dialog.exec_() != QDialog.Accepted:
+            return
 
-            # ذخیره تغییرات
-            self.conn.commit()
+        merge = merge_existing.isChecked()
+        if missing_columns_list and not merge:
+            QMessageBox.warning(self, "خطا", f"ستون‌های زیر در فایل وجود ندارند: {', '.join(missing_columns_list)}")
+            return
 
-            # بستن پنجره پیشرفت
+        # حذف داده‌های قبلی در صورت انتخاب (در نخ کارگر و پیش از وارد کردن)
+        clear = False
+        if clear_existing.isChecked() and not merge:
+            confirm = QMessageBox.question(self, "تایید حذف",
+                                         "آیا از حذف تمام محصولات موجود اطمینان دارید؟",
+                                         QMessageBox.Yes | QMessageBox.No)
+            clear = confirm == QMessageBox.Yes
+
+        # پس از حذف محصولات، ادامه وارد کردن قبلی معنا ندارد
+        resume = None
+        if not clear:
+            with self.db.reader() as conn:
+                resume = unfinished_import(conn, file_path, merge)
+        if resume is not None:
+            answer = QMessageBox.question(
+                self,
+                "ادامه وارد کردن",
+                f"وارد کردن قبلی این فایل تا سطر {resume[1]} ({resume[3]} محصول) ثبت شده است.\n"
+                "آیا از همان نقطه ادامه داده شود؟\n"
+                "(با انتخاب «خیر» وارد کردن از ابتدای فایل شروع می‌شود)",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel
+            )
+            if answer == QMessageBox.Cancel:
+                return
+            if answer == QMessageBox.No:
+                resume = None
+
+        # نمایش پیشرفت
+        progress_dialog = QDialog(self)
+        progress_dialog.setWindowTitle("در حال وارد کردن داده‌ها")
+        progress_dialog.setMinimumWidth(400)
+
+        progress_layout = QVBoxLayout(progress_dialog)
+        progress_label = QLabel(f"در حال وارد کردن داده‌ها از فایل {file_type}...")
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, 0)
+        cancel_button = QPushButton("لغو")
+
+        progress_layout.addWidget(progress_label)
+        progress_layout.addWidget(progress_bar)
+        progress_layout.addWidget(cancel_button)
+
+        def work(conn, job):
+            with open_source(file_path) as source:
+                if clear:
+                    with job.manager.bulk_transaction() as write_conn:
+                        write_conn.execute("DELETE FROM products")
+                return run_import_job(job.manager, source, file_path, job, values=lenient_product_values,
+                                      resume=resume, merge=merge, rejected_path=rejected_rows_path(file_path))
+
+        def on_progress(done, total):
+            if total:
+                progress_bar.setRange(0, total)
+                progress_bar.setValue(done)
+
+        def finish():
+            self.import_job = None
             progress_dialog.close()
 
+        def on_result(result):
+            finish()
+            for row_number, message in result.errors[:20]:
+                print(f"Error importing row {row_number}: {message}")
+
             # ثبت فعالیت
-            self.log_activity("import", f"وارد کردن {success_count} محصول از فایل CSV")
+            if merge:
+                self.log_activity("import", f"ادغام فایل {file_type}: {result.imported} محصول جدید، "
+                                            f"{result.updated} به‌روز شده، {result.unchanged} بدون تغییر")
+            else:
+                self.log_activity("import", f"وارد کردن {result.imported} محصول از فایل {file_type}")
 
             # نمایش نتیجه
+            merged_text = (f"تعداد {result.updated} محصول به‌روز شد و {result.unchanged} محصول تغییری نداشت.\n"
+                           if merge else "")
+            rejected_text = (f"\nسطرهای ردشده و دلیل آن‌ها در این فایل ذخیره شد:\n{result.rejected_path}"
+                             if result.rejected_path else "")
             QMessageBox.information(self, "نتیجه وارد کردن",
-                                   f"تعداد {success_count} محصول با موفقیت وارد شد.\n"
-                                   f"تعداد {error_count} خطا رخ داد.")
-        except Exception as e:
-            print(f"Error importing from CSV: {e}")
-            QMessageBox.critical(self, "خطا", f"خطا در وارد کردن از CSV: {str(e)}")
+                                   f"تعداد {result.imported} محصول با موفقیت وارد شد.\n"
+                                   f"{merged_text}"
+                                   f"تعداد {result.failed} خطا رخ داد."
+                                   f"{rejected_text}")
+
+        def on_error(message):
+            finish()
+            print(f"Error importing from {file_type}: {message}")
+            QMessageBox.critical(self, "خطا", f"خطا در وارد کردن از {file_type}: {message}")
+
+        def cancel():
+            # بستن دیالوگ پس از پایان کار هم rejected را می‌فرستد
+            if self.import_job is None:
+                return
+            # بخش ثبت‌نشده برگردانده می‌شود؛ نقاط بازیابی قبلی برای ادامه باقی می‌مانند
+            self.db_worker.cancel('import')
+            finish()
+            QMessageBox.information(
+                self,
+                "وارد کردن محصولات",
+                "وارد کردن لغو شد. با وارد کردن دوباره همین فایل می‌توانید از آخرین نقطه ثبت‌شده ادامه دهید."
+            )
+
+        cancel_button.clicked.connect(cancel)
+        progress_dialog.rejected.connect(cancel)
+
+        self.import_job = self.db_worker.submit(
+            work, on_result=on_result, on_error=on_error, on_progress=on_progress,
+            channel='import', write=True, atomic=False
+        )
+        progress_dialog.show()
 
     def export_to_excel(self, data=None):
         """صادر کردن محصولات به فایل Excel"""
@@ -2346,10 +2224,11 @@ class ProductManager(QMainWindow):
             # اگر داده‌ها از قبل ارسال نشده باشند، از پایگاه داده دریافت می‌کنیم
             if data is None:
                 # دریافت داده‌ها از پایگاه داده
-                self.cursor.execute("""
-                    SELECT id, name, price, category, stock, min_stock, discount_price, barcode, description, created_at, updated_at
-                    FROM products
-                    ORDER BY id
+                self.cursor.execute(f"""
+                    SELECT p.id, p.name, p.price, c.name, p.stock, p.min_stock, p.discount_price, p.barcode,
+                           p.description, p.created_at, p.updated_at
+                    FROM {PRODUCTS_FROM}
+                    ORDER BY p.id
                 """)
 
                 data = self.cursor.fetchall()
@@ -2390,10 +2269,11 @@ class ProductManager(QMainWindow):
         """صادر کردن محصولات به فایل CSV"""
         try:
             # دریافت داده‌ها از پایگاه داده
-            self.cursor.execute("""
-                SELECT id, name, price, category, stock, min_stock, discount_price, barcode, description, created_at, updated_at
-                FROM products
-                ORDER BY id
+            self.cursor.execute(f"""
+                SELECT p.id, p.name, p.price, c.name, p.stock, p.min_stock, p.discount_price, p.barcode,
+                       p.description, p.created_at, p.updated_at
+                FROM {PRODUCTS_FROM}
+                ORDER BY p.id
             """)
 
             data = self.cursor.fetchall()
@@ -2437,10 +2317,10 @@ class ProductManager(QMainWindow):
             # اگر داده‌ها از قبل ارسال نشده باشند، از پایگاه داده دریافت می‌کنیم
             if data is None:
                 # دریافت داده‌ها از پایگاه داده
-                self.cursor.execute("""
-                    SELECT id, name, price, category, stock, min_stock
-                    FROM products
-                    ORDER BY id
+                self.cursor.execute(f"""
+                    SELECT p.id, p.name, p.price, c.name, p.stock, p.min_stock
+                    FROM {PRODUCTS_FROM}
+                    ORDER BY p.id
                 """)
 
                 data = self.cursor.fetchall()
@@ -2626,8 +2506,7 @@ class ProductManager(QMainWindow):
                     image_frame_layout = QVBoxLayout(image_frame)
 
                     image_label = QLabel()
-                    pixmap = QtGui.QPixmap(main_image)
-                    image_label.setPixmap(pixmap.scaled(200, 200, QtCore.Qt.KeepAspectRatio))
+                    set_label_image(image_label, main_image, 200)
 
                     image_frame_layout.addWidget(image_label)
 
@@ -2657,8 +2536,7 @@ class ProductManager(QMainWindow):
                     image_frame_layout = QVBoxLayout(image_frame)
 
                     image_label = QLabel()
-                    pixmap = QtGui.QPixmap(image_path)
-                    image_label.setPixmap(pixmap.scaled(200, 200, QtCore.Qt.KeepAspectRatio))
+                    set_label_image(image_label, image_path, 200)
 
                     image_frame_layout.addWidget(image_label)
 
@@ -2940,8 +2818,7 @@ class ProductManager(QMainWindow):
                 image_frame_layout = QVBoxLayout(image_frame)
 
                 image_label = QLabel()
-                pixmap = QtGui.QPixmap(image_path)
-                image_label.setPixmap(pixmap.scaled(150, 150, QtCore.Qt.KeepAspectRatio))
+                set_label_image(image_label, image_path, 150)
 
                 image_frame_layout.addWidget(image_label)
 
@@ -3842,18 +3719,12 @@ class ProductManager(QMainWindow):
                 QMessageBox.warning(self, "هشدار", "لطفاً عبارت جستجو را وارد کنید.")
                 return
 
-            # جستجو در پایگاه داده
-            self.cursor.execute("""
-                SELECT id, name, category, price, stock, min_stock, description
-                FROM products
-                WHERE id = ? OR name LIKE ? OR barcode = ?
-            """, (search_text, f"%{search_text}%", search_text))
-
-            result = self.cursor.fetchone()
+            # جستجو در پایگاه داده: شناسه و بارکد دقیق، سپس بهترین نتیجه جستجوی متنی
+            result = self.products_repo.find(search_text)
 
             if result:
                 QMessageBox.information(self, "نتیجه جستجو",
-                                       f"محصول یافت شد: {result[1]}\n\n"
+                                       f"محصول یافت شد: {result.name}\n\n"
                                        "اطلاعات محصول در فرم بارگذاری شد.")
 
                 # در یک برنامه واقعی، اینجا اطلاعات محصول در فرم بارگذاری می‌شود
@@ -3881,11 +3752,11 @@ class ProductManager(QMainWindow):
             category_combo = QComboBox()
             category_combo.addItem("همه دسته‌بندی‌ها")
 
-            # دریافت دسته‌بندی‌ها از پایگاه داده
-            self.cursor.execute("SELECT name FROM categories")
+            # دریافت دسته‌بندی‌ها از پایگاه داده (شناسه برای فیلتر روی شاخص category_id)
+            self.cursor.execute("SELECT id, name FROM categories ORDER BY name")
             categories = self.cursor.fetchall()
-            for category in categories:
-                category_combo.addItem(category[0])
+            for category_id, category_name in categories:
+                category_combo.addItem(category_name, category_id)
 
             min_price_input = QLineEdit()
             min_price_input.setValidator(QtGui.QDoubleValidator(0, 1000000000, 2))
@@ -3915,36 +3786,15 @@ class ProductManager(QMainWindow):
 
             # اجرای پنجره
             if dialog.exec_() == QDialog.Accepted:
-                # ساخت پرس‌وجو بر اساس معیارهای جستجو
-                query = "SELECT id, name, category, price, stock FROM products WHERE 1=1"
-                params = []
-
-                if name_input.text():
-                    query += " AND name LIKE ?"
-                    params.append(f"%{name_input.text()}%")
-
-                if category_combo.currentIndex() > 0:
-                    query += " AND category = ?"
-                    params.append(category_combo.currentText())
-
-                if min_price_input.text():
-                    query += " AND price >= ?"
-                    params.append(float(min_price_input.text()))
-
-                if max_price_input.text():
-                    query += " AND price <= ?"
-                    params.append(float(max_price_input.text()))
-
-                if stock_status_combo.currentText() == "موجود":
-                    query += " AND stock > 0"
-                elif stock_status_combo.currentText() == "ناموجود":
-                    query += " AND stock = 0"
-                elif stock_status_combo.currentText() == "کم موجود":
-                    query += " AND stock > 0 AND stock <= min_stock"
-
-                # اجرای پرس‌وجو
-                self.cursor.execute(query, params)
-                results = self.cursor.fetchall()
+                # معیارهای جستجو؛ جستجوی تکراری با همان معیارها از حافظه نهان نتایج خوانده می‌شود
+                search_filter = ProductFilter(
+                    text=name_input.text(),
+                    category_id=category_combo.currentData() if category_combo.currentIndex() > 0 else None,
+                    min_price=min_price_input.text(),
+                    max_price=max_price_input.text(),
+                    stock_status=stock_status_combo.currentText(),
+                )
+                results = search_filter.fetch(self.conn, "p.id, p.name, c.name, p.price, p.stock")
 
                 if results:
                     # نمایش نتایج در یک پنجره جدید
@@ -4264,9 +4114,12 @@ class ProductManager(QMainWindow):
                     event.ignore()
                     return
 
-            # بستن اتصال پایگاه داده
-            if hasattr(self, 'conn') and self.conn:
-                self.conn.close()
+            # لغو پرس‌وجوهای پس‌زمینه و ثبت تغییرات در انتظار؛ مدیر اتصال میان پنجره‌ها
+            # مشترک است و هنگام خروج برنامه (atexit) بسته می‌شود
+            if hasattr(self, 'db_worker'):
+                self.db_worker.shutdown()
+            if hasattr(self, 'db') and self.db:
+                self.db.flush()
 
             # پذیرش رویداد بستن
             event.accept()
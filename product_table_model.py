@@ -0,0 +1,357 @@
+"""
+ماژول مدل و نمای جدول محصولات
+سطرها به صورت تدریجی (canFetchMore/fetchMore) و در پس‌زمینه خوانده می‌شوند و رنگ‌ها و
+قلم‌ها در data() محاسبه می‌شوند، بنابراین برای هر سلول هیچ شیء Qt جداگانه‌ای ساخته نمی‌شود
+"""
+
+import bisect
+
+from PyQt5 import QtGui
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt5.QtWidgets import QTableView
+
+from repository import page_key, product_changes_since
+
+
+# ترتیب ستون‌های هر سطر: (id, name, price, discount_price, category, stock, min_stock)؛
+# ستون‌های بعدی (مثلاً کلید صفحه‌بندی) نمایش داده نمی‌شوند
+ID, NAME, PRICE, DISCOUNT_PRICE, CATEGORY, STOCK, MIN_STOCK = range(7)
+
+HEADERS = ['شناسه', 'نام', 'قیمت', 'قیمت با تخفیف', 'دسته‌بندی', 'موجودی']
+
+# تعداد سطرهایی که در هر بار fetchMore خوانده می‌شود
+DEFAULT_BATCH_SIZE = 500
+
+# اگر تعداد محصولات تغییر یافته بیشتر از این مقدار باشد، به جای به‌روزرسانی سطر به سطر
+# داده‌ها از ابتدا بارگذاری می‌شوند
+PATCH_LIMIT = 500
+
+
+class ProductTableModel(QAbstractTableModel):
+    """مدل جدول محصولات با بارگذاری تدریجی
+
+    منبع داده تابعی با امضای fetch_page(conn, last_row, limit) است که در نخ کارگر
+    پایگاه داده اجرا می‌شود و صفحه بعد از آخرین سطر بارگذاری‌شده (یا None برای
+    صفحه اول) را برمی‌گرداند. هر بار که نما به انتهای سطرهای بارگذاری‌شده برسد،
+    صفحه بعدی درخواست می‌شود. کارها روی کانال channel کارگر ثبت می‌شوند تا
+    با تغییر منبع داده، صفحه در حال خواندن منبع قبلی لغو شود.
+
+    سطرها به ترتیب page_key (دو ستون آخر) هستند. اگر تابع fetch_rows(conn, ids)
+    هم داده شود، refresh_changed() فقط سطرهای محصولات تغییر یافته (بر اساس جدول
+    product_changes) را درج، به‌روز یا حذف می‌کند و انتخاب و موقعیت پیمایش حفظ می‌شود.
+    """
+
+    # پس از رسیدن هر صفحه: (تعداد کل سطرهای بارگذاری‌شده، آیا اولین صفحه است)
+    page_loaded = pyqtSignal(int, bool)
+    load_failed = pyqtSignal(str)
+    # پس از به‌روزرسانی تدریجی: تعداد محصولات تغییر یافته
+    rows_changed = pyqtSignal(int)
+
+    def __init__(self, worker, parent=None, batch_size=DEFAULT_BATCH_SIZE, channel='product_table'):
+        super().__init__(parent)
+        self.worker = worker
+        self.batch_size = batch_size
+        self.channel = channel
+
+        self._rows = []
+        self._fetch_page = None
+        self._fetch_rows = None
+        self._exhausted = True
+        self._fetching = False
+        self._generation = 0
+        # آخرین شماره تغییر product_changes که سطرهای جدول با آن هماهنگ هستند
+        self._change_seq = None
+
+        # اشیای رنگ و قلم یک بار ساخته می‌شوند و برای همه سلول‌ها استفاده می‌شوند
+        self._discount_foreground = QtGui.QBrush(QtGui.QColor(0, 128, 0))
+        self._discount_background = QtGui.QBrush(QtGui.QColor(240, 255, 240))
+        self._struck_foreground = QtGui.QBrush(QtGui.QColor(128, 128, 128))
+        self._low_stock_background = QtGui.QBrush(QtGui.QColor(255, 200, 200))
+        self._struck_font = QtGui.QFont()
+        self._struck_font.setStrikeOut(True)
+
+    # ---- منبع داده ----
+
+    def set_source(self, fetch_page, fetch_rows=None):
+        """تعیین منبع داده جدید و بارگذاری اولین صفحه"""
+        self._generation += 1
+        self.beginResetModel()
+        self._rows = []
+        self._fetch_page = fetch_page
+        self._fetch_rows = fetch_rows
+        self._change_seq = None
+        self._exhausted = False
+        self._fetching = False
+        self.endResetModel()
+        self._request_page()
+
+    def reload(self):
+        """بارگذاری دوباره منبع داده فعلی از ابتدا"""
+        if self._fetch_page is not None:
+            self.set_source(self._fetch_page, self._fetch_rows)
+
+    def set_rows(self, rows):
+        """نمایش مجموعه کاملی از سطرها (مثلاً نتایج جستجو) بدون بارگذاری تدریجی"""
+        self._generation += 1
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._fetch_page = None
+        self._fetch_rows = None
+        self._change_seq = None
+        self._exhausted = True
+        self._fetching = False
+        self.endResetModel()
+        self.page_loaded.emit(len(self._rows), True)
+
+    def _request_page(self):
+        if self._fetching or self._exhausted or self._fetch_page is None:
+            return
+        self._fetching = True
+        generation = self._generation
+        fetch_page = self._fetch_page
+        last_row = self._rows[-1] if self._rows else None
+        limit = self.batch_size
+        track_changes = last_row is None and self._fetch_rows is not None
+
+        def job(conn, job):
+            # شماره تغییر پیش از صفحه اول خوانده می‌شود تا تغییرات بعدی از دست نروند
+            seq = product_changes_since(conn, None)[0] if track_changes else None
+            return seq, fetch_page(conn, last_row, limit)
+
+        self.worker.submit(
+            job,
+            on_result=lambda result: self._append_page(generation, *result),
+            on_error=lambda message: self._page_failed(generation, message),
+            channel=self.channel
+        )
+
+    def _append_page(self, generation, seq, rows):
+        # نتیجه صفحه‌ای که پس از تغییر منبع داده رسیده است کنار گذاشته می‌شود
+        if generation != self._generation:
+            return
+        self._fetching = False
+        if seq is not None:
+            self._change_seq = seq
+        if len(rows) < self.batch_size:
+            self._exhausted = True
+        first_page = not self._rows
+        if rows:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+        self.page_loaded.emit(len(self._rows), first_page)
+
+    def _page_failed(self, generation, message):
+        if generation != self._generation:
+            return
+        self._fetching = False
+        self._exhausted = True
+        self.load_failed.emit(message)
+
+    # ---- به‌روزرسانی تدریجی ----
+
+    def refresh_changed(self):
+        """به‌روزرسانی سطرهای محصولاتی که از آخرین بارگذاری تغییر کرده‌اند
+
+        اگر منبع داده از این کار پشتیبانی نکند یا تعداد تغییرات زیاد باشد، داده‌ها
+        از ابتدا بارگذاری می‌شوند.
+        """
+        if self._fetch_page is None:
+            return
+        if self._fetch_rows is None or self._change_seq is None:
+            self.reload()
+            return
+
+        generation = self._generation
+        since = self._change_seq
+        fetch_rows = self._fetch_rows
+
+        def job(conn, job):
+            seq, ids = product_changes_since(conn, since)
+            if ids is None or len(ids) > PATCH_LIMIT:
+                return seq, None, None
+            return seq, ids, (fetch_rows(conn, ids) if ids else [])
+
+        self.worker.submit(
+            job,
+            on_result=lambda result: self._apply_changes(generation, *result),
+            on_error=lambda message: self._page_failed(generation, message),
+            channel=self.channel + '_changes'
+        )
+
+    def _apply_changes(self, generation, seq, ids, rows):
+        if generation != self._generation or self._change_seq is None:
+            return
+        if ids is None:
+            self.reload()
+            return
+
+        fresh = {row[ID]: row for row in rows}
+        changed = set(ids)
+        for position in range(len(self._rows) - 1, -1, -1):
+            product_id = self._rows[position][ID]
+            if product_id not in changed:
+                continue
+            row = fresh.get(product_id)
+            if row is not None and page_key(row) == page_key(self._rows[position]):
+                # کلید مرتب‌سازی تغییر نکرده است: به‌روزرسانی در همان محل
+                self._rows[position] = row
+                self.dataChanged.emit(self.index(position, 0), self.index(position, self.columnCount() - 1))
+                del fresh[product_id]
+            else:
+                self.beginRemoveRows(QModelIndex(), position, position)
+                del self._rows[position]
+                self.endRemoveRows()
+
+        # سطرهای جدید یا جابه‌جاشده در محل مرتب خود درج می‌شوند؛ سطرهایی که بعد از
+        # آخرین سطر بارگذاری‌شده قرار می‌گیرند با صفحه‌های بعدی خوانده می‌شوند
+        if fresh:
+            try:
+                keys = [page_key(row) for row in self._rows]
+                for row in sorted(fresh.values(), key=page_key):
+                    key = page_key(row)
+                    if not self._exhausted and (not keys or key > keys[-1]):
+                        continue
+                    position = bisect.bisect_left(keys, key)
+                    self.beginInsertRows(QModelIndex(), position, position)
+                    self._rows.insert(position, row)
+                    keys.insert(position, key)
+                    self.endInsertRows()
+            except TypeError:
+                # کلیدهای ناهمگون (مثلاً قیمت متنی در داده‌های قدیمی) در پایتون قابل مقایسه نیستند
+                self.reload()
+                return
+
+        self._change_seq = seq
+        self.rows_changed.emit(len(ids))
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid():
+            self._request_page()
+
+    # ---- دسترسی به داده ----
+
+    def row_values(self, row):
+        """مقادیر خام یک سطر (id, name, price, discount_price, category, stock, min_stock)"""
+        return self._rows[row]
+
+    def rows(self):
+        return self._rows
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def display_text(self, row, column):
+        product = self._rows[row]
+        if column == STOCK:
+            return str(product[STOCK]) if product[STOCK] is not None else "0"
+        value = product[column]
+        return str(value) if value is not None else ""
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        product = self._rows[row]
+
+        if role == Qt.DisplayRole:
+            return self.display_text(row, column)
+
+        has_discount = product[DISCOUNT_PRICE] is not None
+        if role == Qt.ForegroundRole:
+            if column == DISCOUNT_PRICE and has_discount:
+                return self._discount_foreground
+            if column == PRICE and has_discount:
+                # قیمت اصلی محصولات تخفیف‌دار خاکستری و خط خورده نمایش داده می‌شود
+                return self._struck_foreground
+        elif role == Qt.FontRole:
+            if column == PRICE and has_discount:
+                return self._struck_font
+        elif role == Qt.BackgroundRole:
+            if column == DISCOUNT_PRICE and has_discount:
+                return self._discount_background
+            if column == STOCK:
+                stock, min_stock = product[STOCK], product[MIN_STOCK]
+                # اگر موجودی کمتر از حداقل موجودی باشد، با رنگ قرمز نمایش داده می‌شود
+                if stock is not None and min_stock is not None and stock < min_stock:
+                    return self._low_stock_background
+        return None
+
+
+class _Cell:
+    """متن یک سلول؛ جایگزین سبک QTableWidgetItem برای کدهایی که item(row, column).text() می‌خوانند"""
+
+    __slots__ = ('_text', '_row', '_column')
+
+    def __init__(self, text, row, column):
+        self._text = text
+        self._row = row
+        self._column = column
+
+    def text(self):
+        return self._text
+
+    def row(self):
+        return self._row
+
+    def column(self):
+        return self._column
+
+
+class ProductTableView(QTableView):
+    """نمای جدول محصولات با رابط سازگار با QTableWidget
+
+    متدهای item، currentRow، rowCount، selectedItems و سیگنال cellClicked همانند
+    QTableWidget رفتار می‌کنند تا کدهای موجود بدون تغییر کار کنند.
+    """
+
+    cellClicked = pyqtSignal(int, int)
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setSelectionBehavior(QTableView.SelectRows)
+        # ارتفاع ثابت سطرها محاسبه اندازه را برای جدول‌های بزرگ ارزان می‌کند
+        self.verticalHeader().setSectionResizeMode(self.verticalHeader().Fixed)
+        self.verticalHeader().setDefaultSectionSize(24)
+        self.clicked.connect(lambda index: self.cellClicked.emit(index.row(), index.column()))
+
+    def rowCount(self):
+        return self.model().rowCount()
+
+    def columnCount(self):
+        return self.model().columnCount()
+
+    def currentRow(self):
+        index = self.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def item(self, row, column):
+        model = self.model()
+        if 0 <= row < model.rowCount() and 0 <= column < model.columnCount():
+            return _Cell(model.display_text(row, column), row, column)
+        return None
+
+    def selectedItems(self):
+        model = self.model()
+        return [_Cell(model.display_text(index.row(), index.column()), index.row(), index.column())
+                for index in self.selectedIndexes()]
+
+    def find_row(self, product_id):
+        """شماره سطر یک محصول در سطرهای بارگذاری‌شده یا -1"""
+        for row, product in enumerate(self.model().rows()):
+            if str(product[ID]) == str(product_id):
+                return row
+        return -1
@@ -0,0 +1,235 @@
+"""
+ماژول پروفایل پرس‌وجوهای SQLite
+زمان اجرا، تعداد سطرها و محل فراخوانی هر دستور SQL ثبت می‌شود؛ دستورات کند همراه با
+EXPLAIN QUERY PLAN در یک فایل گزارش چرخشی نوشته می‌شوند
+"""
+
+import logging
+import logging.handlers
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+
+# دستوراتی که طولانی‌تر از این مقدار (میلی‌ثانیه) باشند کند محسوب می‌شوند
+DEFAULT_SLOW_THRESHOLD_MS = 50
+
+SLOW_LOG_PATH = os.path.join('logs', 'slow_queries.log')
+
+# فایل‌هایی که در تعیین محل فراخوانی نادیده گرفته می‌شوند (لایه‌های دسترسی به داده)
+_INTERNAL_FILES = {
+    'query_profiler.py', 'db_connection.py', 'database.py', 'repository.py',
+    'db_worker.py', 'contextlib.py',
+}
+
+# فقط برای این دستورات EXPLAIN QUERY PLAN معنا دارد
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+class StatementStats:
+    """آمار تجمعی یک دستور SQL"""
+
+    __slots__ = ('sql', 'calls', 'total_ms', 'max_ms', 'rows', 'slow_calls', 'call_site', 'plan')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow_calls = 0
+        self.call_site = None
+        self.plan = None
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+def _normalize(sql):
+    return " ".join(sql.split())
+
+
+def _call_site():
+    """اولین فریم خارج از لایه‌های پایگاه داده (فایل:خط تابع)"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        if filename not in _INTERNAL_FILES:
+            return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class QueryProfiler:
+    """جمع‌آوری آمار اجرای پرس‌وجوها برای همه اتصال‌های برنامه"""
+
+    def __init__(self, slow_threshold_ms=DEFAULT_SLOW_THRESHOLD_MS, log_path=SLOW_LOG_PATH,
+                 max_bytes=1024 * 1024, backup_count=3):
+        self.enabled = os.environ.get('PRODUCTS_DB_PROFILE', '1') != '0'
+        self.slow_threshold_ms = slow_threshold_ms
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def _slow_logger(self):
+        """ایجاد گزارش‌گر فایل چرخشی در اولین دستور کند"""
+        if self._logger is None:
+            directory = os.path.dirname(self.log_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            logger = logging.getLogger('products.slow_queries')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def _explain(self, conn, sql, params):
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        try:
+            # Connection.execute پایه از مکان‌نمای بدون پروفایل استفاده می‌کند
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except sqlite3.Error as e:
+            return f"(plan unavailable: {e})"
+        return "; ".join(row[-1] for row in rows)
+
+    def record(self, conn, sql, params, elapsed_ms, rows):
+        """ثبت یک اجرای دستور
+
+        Args:
+            conn (sqlite3.Connection): اتصالی که دستور روی آن اجرا شد
+            sql (str): متن دستور
+            params: پارامترهای دستور (برای EXPLAIN دستورات کند)
+            elapsed_ms (float): زمان اجرا به میلی‌ثانیه
+            rows (int): تعداد سطرهای تغییر یافته یا خوانده‌شده
+        """
+        slow = elapsed_ms >= self.slow_threshold_ms
+        with self._lock:
+            stats = self._stats.get(sql)
+            if stats is None:
+                stats = self._stats[sql] = StatementStats(sql)
+                stats.call_site = _call_site()
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.rows += max(rows, 0)
+            if not slow:
+                return
+            stats.slow_calls += 1
+            stats.call_site = _call_site() or stats.call_site
+            need_plan = stats.plan is None
+
+        # طرح اجرا فقط یک بار برای هر دستور گرفته می‌شود
+        if need_plan:
+            stats.plan = self._explain(conn, sql, params) or ''
+        try:
+            self._slow_logger().info(
+                "%.1f ms rows=%d site=%s sql=%s plan=%s",
+                elapsed_ms, max(rows, 0), stats.call_site, _normalize(sql), stats.plan
+            )
+        except OSError as e:
+            print(f"Error writing slow query log: {e}")
+
+    def add_rows(self, sql, elapsed_ms, rows):
+        """افزودن زمان و تعداد سطرهای خوانده‌شده با fetch به آمار دستور"""
+        with self._lock:
+            stats = self._stats.get(sql)
+            if stats is not None:
+                stats.total_ms += elapsed_ms
+                stats.rows += rows
+
+    def summary(self, limit=50, key='total_ms'):
+        """فهرست آمار دستورات به ترتیب نزولی کلید داده‌شده"""
+        with self._lock:
+            stats = list(self._stats.values())
+        stats.sort(key=lambda s: getattr(s, key), reverse=True)
+        return stats[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_profiler = QueryProfiler()
+
+
+def get_profiler():
+    """دریافت پروفایلر مشترک برنامه"""
+    return _profiler
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """مکان‌نمایی که زمان اجرای هر دستور را در پروفایلر ثبت می‌کند"""
+
+    _profiled_sql = None
+
+    def execute(self, sql, parameters=()):
+        if not _profiler.enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._profiled_sql = sql
+            _profiler.record(self.connection, sql, parameters,
+                             (time.perf_counter() - start) * 1000, self.rowcount)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _profiler.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._profiled_sql = sql
+            _profiler.record(self.connection, sql, seq_of_parameters[0] if seq_of_parameters else (),
+                             (time.perf_counter() - start) * 1000, self.rowcount)
+
+    def _timed_fetch(self, fetch, *args):
+        if not _profiler.enabled or self._profiled_sql is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        result = fetch(*args)
+        if isinstance(result, list):
+            count = len(result)
+        else:
+            count = 0 if result is None else 1
+        _profiler.add_rows(self._profiled_sql, (time.perf_counter() - start) * 1000, count)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(super().fetchmany)
+        return self._timed_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """اتصالی که همه مکان‌نماهای آن (و execute مستقیم) پروفایل می‌شوند"""
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,859 @@
+"""
+ماژول مخزن داده محصولات و موجودی
+دسترسی به جداول products و inventory_history از طریق این ماژول انجام می‌شود تا
+پرس‌وجوها در یک محل نگهداری و بهینه شوند و نتایج به صورت اشیای نام‌دار برگردانده شوند
+"""
+
+import datetime
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+
+# ستون‌های جدول محصولات به ترتیبی که در اشیای ProductRow نگهداری می‌شوند
+PRODUCT_COLUMNS = (
+    'id', 'name', 'price', 'category', 'image', 'stock', 'min_stock',
+    'discount_price', 'barcode', 'description', 'category_id',
+)
+
+# منبع سطرهای محصولات در پرس‌وجوها؛ نام فعلی دسته‌بندی با c.name خوانده می‌شود (ستون
+# متنی products.category پس از تغییر نام دسته‌بندی به‌روز نمی‌شود، مهاجرت 11). اگر c
+# استفاده نشود SQLite این اتصال را حذف می‌کند.
+CATEGORY_JOIN = "LEFT JOIN categories c ON c.id = p.category_id"
+PRODUCTS_FROM = f"products p {CATEGORY_JOIN}"
+
+# عبارت انتخاب هر ستون PRODUCT_COLUMNS از PRODUCTS_FROM
+PRODUCT_SELECT = ", ".join("c.name" if name == 'category' else f"p.{name}" for name in PRODUCT_COLUMNS)
+
+# ستون‌های جداول خلاصه product_summary و category_summary (مهاجرت 4)
+SUMMARY_COLUMNS = (
+    'product_count', 'stock_total', 'price_sum', 'price_count', 'low_stock_count',
+    'discounted_count', 'status_0_count', 'status_1_count', 'status_2_count', 'status_3_count',
+)
+
+INVENTORY_COLUMNS = (
+    'id', 'product_id', 'change_amount', 'change_type', 'change_date', 'notes',
+)
+
+# اندازه‌های مجاز فهرست IN؛ شناسه‌ها تا نزدیک‌ترین اندازه تکمیل می‌شوند تا تعداد
+# متن‌های SQL متفاوت (و در نتیجه دستورات آماده‌شده) محدود بماند
+_IN_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# عبارت مرتب‌سازی فهرست محصولات برای هر حالت؛ عبارت‌ها مقدار NULL ندارند تا مقایسه
+# کلید صفحه‌بندی همیشه معتبر باشد و دقیقاً با شاخص‌های مهاجرت 6 یکسان هستند
+SORT_EXPRESSIONS = {
+    'name': "IFNULL(p.name, '')",
+    'price': "COALESCE(p.discount_price, p.price, 0)",
+    'stock': "IFNULL(p.stock, 0)",
+}
+
+DEFAULT_PAGE_SIZE = 500
+
+# عبارت‌های مجاز در مرتب‌سازی چندستونی ProductFilter (بدون NULL، مانند SORT_EXPRESSIONS)
+FILTER_SORT_EXPRESSIONS = dict(SORT_EXPRESSIONS, category="IFNULL(c.name, '')", id="p.id")
+
+# شرط هر وضعیت موجودی؛ بخش اول هر شرط همان عبارت شاخص‌دار مرتب‌سازی موجودی
+# (مهاجرت 6) است تا SQLite بتواند آن را با جستجوی محدوده در شاخص اجرا کند
+STOCK_STATUS_CONDITIONS = {
+    'in_stock': f"{SORT_EXPRESSIONS['stock']} > 0",
+    'out_of_stock': f"{SORT_EXPRESSIONS['stock']} <= 0",
+    'low_stock': f"{SORT_EXPRESSIONS['stock']} > 0 AND p.stock <= p.min_stock",
+}
+
+# برچسب‌های وضعیت موجودی در فرم‌ها ("همه" یعنی بدون فیلتر)
+STOCK_STATUS_LABELS = {'موجود': 'in_stock', 'ناموجود': 'out_of_stock', 'کم موجود': 'low_stock'}
+
+# تعداد صفحه‌های نتیجه‌ای که برای هر اتصال نگه داشته می‌شوند
+FILTER_PAGE_CACHE_SIZE = 64
+
+
+class ProductRow:
+    """یک سطر از جدول محصولات با دسترسی نام‌دار به ستون‌ها"""
+
+    __slots__ = PRODUCT_COLUMNS
+
+    def __init__(self, *values):
+        for name, value in zip(PRODUCT_COLUMNS, values):
+            setattr(self, name, value)
+
+    @property
+    def effective_price(self):
+        """قیمت نهایی محصول (قیمت تخفیف‌دار در صورت وجود)"""
+        return self.discount_price if self.discount_price is not None else self.price
+
+    def __repr__(self):
+        return f"ProductRow(id={self.id!r}, name={self.name!r}, stock={self.stock!r})"
+
+
+class SummaryRow:
+    """آمار تجمیعی محصولات (کل یا یک دسته‌بندی) از جداول خلاصه"""
+
+    __slots__ = ('name',) + SUMMARY_COLUMNS
+
+    def __init__(self, name, *values):
+        self.name = name
+        for column, value in zip(SUMMARY_COLUMNS, values):
+            setattr(self, column, value)
+
+    @property
+    def avg_price(self):
+        return self.price_sum / self.price_count if self.price_count else 0
+
+    @property
+    def stock_status_counts(self):
+        """تعداد محصولات در وضعیت‌های بدون موجودی، کم، متوسط و کافی"""
+        return (self.status_0_count, self.status_1_count, self.status_2_count, self.status_3_count)
+
+    def __repr__(self):
+        return f"SummaryRow(name={self.name!r}, product_count={self.product_count!r})"
+
+
+class InventoryRow:
+    """یک سطر از تاریخچه موجودی"""
+
+    __slots__ = INVENTORY_COLUMNS
+
+    def __init__(self, *values):
+        for name, value in zip(INVENTORY_COLUMNS, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return (f"InventoryRow(product_id={self.product_id!r}, "
+                f"change_amount={self.change_amount!r}, change_type={self.change_type!r})")
+
+
+def _product_factory(cursor, row):
+    return ProductRow(*row)
+
+
+def _summary_factory(cursor, row):
+    return SummaryRow(*row)
+
+
+def _inventory_factory(cursor, row):
+    return InventoryRow(*row)
+
+
+def _chunks(ids):
+    """تقسیم شناسه‌ها به بخش‌هایی با اندازه‌های ثابت _IN_BUCKETS"""
+    largest = _IN_BUCKETS[-1]
+    for start in range(0, len(ids), largest):
+        chunk = ids[start:start + largest]
+        size = next(b for b in _IN_BUCKETS if b >= len(chunk))
+        # تکرار آخرین شناسه نتیجه را تغییر نمی‌دهد ولی متن SQL را ثابت نگه می‌دارد
+        yield chunk + [chunk[-1]] * (size - len(chunk)), size
+
+
+def _discount_expression(discount_type):
+    """عبارت SQL محاسبه قیمت تخفیف‌دار از ستون price (مقدار تخفیف پارامتر ? است)"""
+    if discount_type == "percentage":
+        return "price - price * (? / 100.0)"
+    return "MAX(0, price - ?)"  # fixed_amount
+
+
+def fts_match_expression(text):
+    """تبدیل متن جستجوی کاربر به عبارت MATCH در FTS5
+
+    هر کلمه به صورت پیشوندی جستجو می‌شود و همه کلمات باید در محصول وجود داشته
+    باشند؛ کاراکترهای خاص FTS5 در ورودی کاربر نادیده گرفته می‌شوند.
+
+    Returns:
+        str: عبارت MATCH یا None اگر متن هیچ کلمه‌ای نداشته باشد
+    """
+    tokens = re.findall(r'\w+', text or '')
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def has_search_index(conn):
+    """بررسی وجود جدول products_fts (در SQLite بدون FTS5 ایجاد نمی‌شود)"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+    ).fetchone() is not None
+
+
+def search_query(conn, text, columns, limit=None):
+    """ساخت پرس‌وجوی جستجوی مرتب‌شده بر اساس میزان تطابق
+
+    Args:
+        conn (sqlite3.Connection): اتصال (برای بررسی وجود شاخص جستجو)
+        text (str): متن جستجوی کاربر
+        columns (str): ستون‌های products با پیشوند p. و نام دسته‌بندی با c.name (مثلاً "p.id, c.name")
+        limit (int): حداکثر تعداد نتایج
+
+    Returns:
+        tuple: (sql, params) یا None اگر متن جستجو خالی باشد
+    """
+    suffix = f" LIMIT {int(limit)}" if limit else ""
+    if has_search_index(conn):
+        expression = fts_match_expression(text)
+        if expression is None:
+            return None
+        return (f"SELECT {columns} FROM products_fts JOIN products p ON p.id = products_fts.rowid "
+                f"{CATEGORY_JOIN} WHERE products_fts MATCH ? ORDER BY products_fts.rank{suffix}", (expression,))
+
+    text = (text or '').strip()
+    if not text:
+        return None
+    return (f"SELECT {columns} FROM {PRODUCTS_FROM} WHERE p.name LIKE ? OR p.barcode = ? ORDER BY p.name{suffix}",
+            (f"%{text}%", text))
+
+
+def _keyset_condition(key_expression, id_expression):
+    """شرط ادامه از آخرین کلید دیده‌شده؛ بخش اول (>=) با شاخص جستجو می‌شود و بخش دوم
+    سطرهای هم‌کلید را با شناسه از هم جدا می‌کند"""
+    return f"{key_expression} >= ? AND ({key_expression} > ? OR {id_expression} > ?)"
+
+
+def _id_condition(ids, id_expression="p.id"):
+    """شرط محدود کردن به فهرست شناسه‌ها (حداکثر به اندازه بزرگ‌ترین بخش _IN_BUCKETS)"""
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    if not ids or len(ids) > _IN_BUCKETS[-1]:
+        raise ValueError(f"Expected 1 to {_IN_BUCKETS[-1]} product ids, got {len(ids)}")
+    chunk, size = next(_chunks(ids))
+    return f"{id_expression} IN (" + ", ".join("?" * size) + ")", chunk
+
+
+def page_key(row):
+    """کلید صفحه‌بندی یک سطر از page_query یا search_page_query (دو ستون آخر)"""
+    return tuple(row[-2:])
+
+
+def page_query(columns, sort='name', category_id=None, after=None, limit=DEFAULT_PAGE_SIZE, ids=None):
+    """ساخت پرس‌وجوی یک صفحه از فهرست محصولات با صفحه‌بندی کلیدی (keyset)
+
+    به جای OFFSET، صفحه بعد از آخرین کلید مرتب‌سازی دیده‌شده ادامه می‌یابد؛ پس
+    هزینه هر صفحه مستقل از عمق آن است. سطرهای هم‌کلید با شناسه مرتب می‌شوند.
+
+    Args:
+        columns (str): ستون‌های products با پیشوند p. و نام دسته‌بندی با c.name (مثلاً "p.id, c.name")
+        sort (str): یکی از کلیدهای SORT_EXPRESSIONS
+        category_id (int): محدود کردن به یک دسته‌بندی یا None برای همه
+        after (tuple): کلید آخرین سطر صفحه قبل (page_key) یا None برای صفحه اول
+        limit (int): تعداد سطرهای صفحه
+        ids (list): محدود کردن به این شناسه‌ها (برای به‌روزرسانی سطرهای تغییر یافته)
+
+    Returns:
+        tuple: (sql, params)؛ دو ستون آخر هر سطر کلید صفحه‌بندی هستند
+    """
+    sort = sort if sort in SORT_EXPRESSIONS else 'name'
+    return ProductFilter(category_id=category_id, sort=sort).query(
+        None, columns, after=after, limit=limit, ids=ids, with_key=True
+    )
+
+
+def search_page_query(conn, text, columns, after=None, limit=DEFAULT_PAGE_SIZE, ids=None):
+    """ساخت پرس‌وجوی یک صفحه از نتایج جستجو به ترتیب میزان تطابق
+
+    Args:
+        conn (sqlite3.Connection): اتصال (برای بررسی وجود شاخص جستجو)
+        text (str): متن جستجوی کاربر
+        columns (str): ستون‌های products با پیشوند p. و نام دسته‌بندی با c.name
+        after (tuple): کلید آخرین سطر صفحه قبل (page_key) یا None
+        limit (int): تعداد سطرهای صفحه
+        ids (list): محدود کردن به این شناسه‌ها
+
+    Returns:
+        tuple: (sql, params) یا None اگر متن جستجو خالی باشد؛ دو ستون آخر هر
+            سطر کلید صفحه‌بندی هستند
+    """
+    if has_search_index(conn):
+        expression = fts_match_expression(text)
+        if expression is None:
+            return None
+        key = "products_fts.rank"
+        sql = (f"SELECT {columns}, {key}, p.id FROM products_fts JOIN products p ON p.id = products_fts.rowid "
+               f"{CATEGORY_JOIN} WHERE products_fts MATCH ?")
+        params = [expression]
+    else:
+        text = (text or '').strip()
+        if not text:
+            return None
+        key = SORT_EXPRESSIONS['name']
+        sql = f"SELECT {columns}, {key}, p.id FROM {PRODUCTS_FROM} WHERE (p.name LIKE ? OR p.barcode = ?)"
+        params = [f"%{text}%", text]
+
+    if after is not None:
+        sql += " AND " + _keyset_condition(key, "p.id")
+        params.extend((after[0], after[0], after[1]))
+    if ids is not None:
+        condition, id_params = _id_condition(ids)
+        sql += " AND " + condition
+        params.extend(id_params)
+    sql += f" ORDER BY {key}, p.id LIMIT ?"
+    params.append(int(limit))
+    return sql, tuple(params)
+
+
+def _sort_terms(sort):
+    """نرمال‌سازی مرتب‌سازی به تاپل (نام ستون، نزولی)
+
+    ورودی می‌تواند یک نام، فهرستی از نام‌ها یا تاپل‌های (نام، نزولی) باشد؛ پیشوند
+    '-' یعنی نزولی. ستون‌های تکراری و هر چیزی پس از شناسه (یکتا) حذف می‌شوند.
+    """
+    if isinstance(sort, str):
+        sort = (sort,)
+    terms, seen = [], set()
+    for term in sort or ('name',):
+        if isinstance(term, str):
+            name, descending = term.lstrip('-'), term.startswith('-')
+        else:
+            name, descending = term[0], bool(term[1])
+        if name not in FILTER_SORT_EXPRESSIONS:
+            raise ValueError(f"Unknown sort column: {name}")
+        if name in seen:
+            continue
+        seen.add(name)
+        terms.append((name, descending))
+        if name == 'id':
+            break
+    return tuple(terms) or (('name', False),)
+
+
+def _optional_float(value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return float(value)
+
+
+# متن SQL هر شکل پرس‌وجو (بدون مقادیر پارامترها)؛ فیلترهای هم‌شکل یک متن یکسان
+# و در نتیجه یک دستور آماده‌شده مشترک در حافظه نهان sqlite3 دارند
+_filter_statements = {}
+
+
+class ProductFilter:
+    """معیارهای فیلتر و مرتب‌سازی محصولات به شکل نرمال‌شده
+
+    جدول اصلی، جستجوی پیشرفته، گزارش موجودی و خروجی‌ها پرس‌وجوی خود را از این
+    کلاس می‌سازند. معیارها هنگام ساخت نرمال می‌شوند (فاصله‌های متن، ترتیب بازه قیمت،
+    برچسب وضعیت موجودی)، پس فیلترهای یکسان کلید یکسان دارند و متن SQL و صفحه‌های
+    نتیجه آن‌ها دوباره استفاده می‌شود. شرط‌ها به شکلی نوشته می‌شوند که با شاخص‌های
+    موجود (category_id، price، عبارت‌های مهاجرت 6 و شاخص متن کامل) اجرا شوند.
+    """
+
+    __slots__ = ('text', 'category_id', 'min_price', 'max_price', 'stock_status', 'sort')
+
+    def __init__(self, text=None, category_id=None, min_price=None, max_price=None,
+                 stock_status=None, sort='name'):
+        """
+        Args:
+            text (str): متن جستجو در نام و بارکد
+            category_id (int): شناسه دسته‌بندی
+            min_price (float): حداقل قیمت
+            max_price (float): حداکثر قیمت
+            stock_status (str): یکی از کلیدهای STOCK_STATUS_CONDITIONS یا برچسب فارسی آن
+            sort: ستون یا ستون‌های مرتب‌سازی (نگاه کنید به _sort_terms)
+        """
+        text = " ".join((text or '').split()).lower()
+        self.text = text or None
+        self.category_id = int(category_id) if category_id is not None else None
+
+        min_price, max_price = _optional_float(min_price), _optional_float(max_price)
+        if min_price is not None and max_price is not None and min_price > max_price:
+            min_price, max_price = max_price, min_price
+        self.min_price = min_price
+        self.max_price = max_price
+
+        stock_status = STOCK_STATUS_LABELS.get(stock_status, stock_status)
+        self.stock_status = stock_status if stock_status in STOCK_STATUS_CONDITIONS else None
+        self.sort = _sort_terms(sort)
+
+    @property
+    def key(self):
+        """کلید قابل هش معیارها برای حافظه نهان نتایج"""
+        return (self.text, self.category_id, self.min_price, self.max_price, self.stock_status, self.sort)
+
+    def __eq__(self, other):
+        return isinstance(other, ProductFilter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"ProductFilter{self.key!r}"
+
+    def _order_terms(self):
+        """عبارت‌های مرتب‌سازی به همراه شناسه برای جدا کردن سطرهای هم‌کلید"""
+        terms = [(FILTER_SORT_EXPRESSIONS[name], descending) for name, descending in self.sort]
+        if self.sort[-1][0] != 'id':
+            # جهت شناسه همان جهت اولین ستون است تا شاخص تک‌ستونی از یک سمت خوانده شود
+            terms.append(("p.id", self.sort[0][1]))
+        return terms
+
+    def key_length(self):
+        """تعداد ستون‌های کلید صفحه‌بندی در انتهای سطرهای with_key"""
+        return len(self._order_terms())
+
+    def page_key(self, row):
+        """کلید صفحه‌بندی یک سطر از query(..., with_key=True)"""
+        return tuple(row[-self.key_length():])
+
+    def _keyset_condition(self, terms):
+        """شرط ادامه پس از کلید قبلی برای چند ستون
+
+        ستون اول با >= (یا <= برای نزولی) محدود می‌شود تا با شاخص جستجو شود؛ برای یک
+        ستون و شناسه، همان شکل _keyset_condition ساخته می‌شود.
+        """
+        def after(index):
+            expression, descending = terms[index]
+            op = '<' if descending else '>'
+            if index == len(terms) - 1:
+                return f"{expression} {op} ?"
+            return f"{expression} {op} ? OR ({expression} = ? AND ({after(index + 1)}))"
+
+        expression, descending = terms[0]
+        op = '<' if descending else '>'
+        if len(terms) == 1:
+            return f"{expression} {op} ?"
+        return f"{expression} {op}= ? AND ({expression} {op} ? OR {after(1)})"
+
+    @staticmethod
+    def _keyset_params(key):
+        # هر ستون به جز آخرین دو بار در شرط می‌آید (محدوده/برابری و مقایسه اکید)
+        params = []
+        for value in key[:-1]:
+            params.extend((value, value))
+        params.append(key[-1])
+        return params
+
+    def query(self, conn, columns, after=None, limit=None, ids=None, with_key=False):
+        """ساخت پرس‌وجوی محصولات مطابق معیارها
+
+        Args:
+            conn (sqlite3.Connection): اتصال (فقط برای جستجوی متنی لازم است)
+            columns (str): ستون‌های products با پیشوند p. و نام دسته‌بندی با c.name
+            after (tuple): کلید آخرین سطر صفحه قبل (page_key) یا None
+            limit (int): تعداد سطرها یا None برای همه
+            ids (list): محدود کردن به این شناسه‌ها
+            with_key (bool): افزودن ستون‌های کلید صفحه‌بندی به انتهای هر سطر
+
+        Returns:
+            tuple: (sql, params)
+        """
+        terms = self._order_terms()
+        params = []
+        fts = None
+
+        text_condition = None
+        if self.text is not None:
+            text_condition, text_params = search_condition(conn, self.text, alias='p')
+            fts = text_condition.startswith("p.id IN")
+            params.extend(text_params)
+        if self.category_id is not None:
+            params.append(self.category_id)
+        if self.min_price is not None:
+            params.append(self.min_price)
+        if self.max_price is not None:
+            params.append(self.max_price)
+        if after is not None:
+            after = tuple(after)
+            if len(after) != len(terms):
+                raise ValueError(f"Expected a page key of {len(terms)} values, got {len(after)}")
+            params.extend(self._keyset_params(after))
+        id_size = None
+        if ids is not None:
+            id_condition, id_params = _id_condition(ids)
+            id_size = len(id_params)
+            params.extend(id_params)
+        if limit is not None:
+            params.append(int(limit))
+
+        shape = (columns, fts, self.category_id is not None, self.min_price is not None,
+                 self.max_price is not None, self.stock_status, self.sort, after is not None,
+                 id_size, limit is not None, with_key)
+        sql = _filter_statements.get(shape)
+        if sql is None:
+            conditions = []
+            if text_condition is not None:
+                conditions.append(f"({text_condition})")
+            if self.category_id is not None:
+                conditions.append("p.category_id = ?")
+            # بازه قیمت به صورت یک BETWEEN روی شاخص idx_products_price
+            if self.min_price is not None and self.max_price is not None:
+                conditions.append("p.price BETWEEN ? AND ?")
+            elif self.min_price is not None:
+                conditions.append("p.price >= ?")
+            elif self.max_price is not None:
+                conditions.append("p.price <= ?")
+            if self.stock_status is not None:
+                conditions.append(STOCK_STATUS_CONDITIONS[self.stock_status])
+            if after is not None:
+                conditions.append(self._keyset_condition(terms))
+            if ids is not None:
+                conditions.append(id_condition)
+
+            selected = columns
+            if with_key:
+                selected += ", " + ", ".join(expression for expression, _ in terms)
+            sql = f"SELECT {selected} FROM {PRODUCTS_FROM}"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY " + ", ".join(
+                expression + (" DESC" if descending else "") for expression, descending in terms)
+            if limit is not None:
+                sql += " LIMIT ?"
+            _filter_statements[shape] = sql
+        return sql, tuple(params)
+
+    def fetch(self, conn, columns, after=None, limit=None, with_key=False):
+        """اجرای پرس‌وجو با استفاده از حافظه نهان صفحه‌های نتیجه
+
+        Returns:
+            list: سطرهای نتیجه
+        """
+        sql, params = self.query(conn, columns, after=after, limit=limit, with_key=with_key)
+        key = (self.key, columns, None if after is None else tuple(after), limit, with_key)
+        return _page_cache.fetch(conn, key, sql, params)
+
+
+class _FilterPageCache:
+    """صفحه‌های نتیجه ProductFilter برای هر اتصال، معتبر تا تغییر بعدی محصولات
+
+    اعتبار صفحه‌ها با آخرین شماره product_changes (مهاجرت 7) که فقط یک جستجوی کلید
+    اصلی است و نام دسته‌بندی‌ها (جدول کوچک categories) سنجیده می‌شود؛ هر تغییری در
+    محصولات یا تغییر نام یک دسته‌بندی همه صفحه‌ها را باطل می‌کند.
+    """
+
+    def __init__(self, size=FILTER_PAGE_CACHE_SIZE):
+        self.size = size
+        self._pages = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def fetch(self, conn, key, sql, params):
+        # در میانه یک تراکنش ممکن است تغییرات برگردانده شوند
+        if conn.in_transaction:
+            return conn.execute(sql, params).fetchall()
+
+        # تغییر نام دسته‌بندی سطری از products را تغییر نمی‌دهد (مهاجرت 11)
+        version = conn.execute(
+            "SELECT (SELECT MAX(seq) FROM product_changes), "
+            "(SELECT group_concat(id || ':' || name, char(31)) FROM categories)"
+        ).fetchone()
+        with self._lock:
+            try:
+                pages = self._pages.get(conn)
+            except TypeError:
+                # اتصال‌های sqlite3 پایه ارجاع ضعیف نمی‌پذیرند
+                return conn.execute(sql, params).fetchall()
+            if pages is None or pages[0] != version:
+                pages = self._pages[conn] = (version, OrderedDict())
+            rows = pages[1].get(key)
+            if rows is not None:
+                pages[1].move_to_end(key)
+                return list(rows)
+
+        rows = conn.execute(sql, params).fetchall()
+        with self._lock:
+            pages = self._pages.get(conn)
+            if pages is not None and pages[0] == version:
+                pages[1][key] = rows
+                if len(pages[1]) > self.size:
+                    pages[1].popitem(last=False)
+        return list(rows)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+_page_cache = _FilterPageCache()
+
+
+def product_changes_since(conn, seq):
+    """شناسه محصولاتی که پس از یک شماره تغییر در product_changes ثبت شده‌اند
+
+    Args:
+        conn (sqlite3.Connection): اتصال
+        seq (int): آخرین شماره تغییر دیده‌شده یا None
+
+    Returns:
+        tuple: (آخرین شماره تغییر، فهرست شناسه‌ها)؛ اگر seq برابر None باشد یا
+            تغییرات پس از آن دیگر در جدول نباشند، به جای فهرست None برگردانده می‌شود
+    """
+    # دو زیرپرس‌وجوی جدا هر کدام فقط یک جستجوی کلید اصلی هستند
+    max_seq, min_seq = conn.execute(
+        "SELECT (SELECT MAX(seq) FROM product_changes), (SELECT MIN(seq) FROM product_changes)"
+    ).fetchone()
+    max_seq = max_seq or 0
+
+    if seq is None or max_seq < seq or (min_seq is not None and min_seq > seq + 1):
+        return max_seq, None
+    if max_seq == seq:
+        return max_seq, []
+    ids = [row[0] for row in conn.execute(
+        "SELECT DISTINCT product_id FROM product_changes WHERE seq > ? AND seq <= ?", (seq, max_seq)
+    )]
+    return max_seq, ids
+
+
+def search_condition(conn, text, alias='products'):
+    """شرط WHERE برای محدود کردن یک پرس‌وجوی دیگر به نتایج جستجو
+
+    Returns:
+        tuple: (sql, params) برای افزودن به بخش WHERE
+    """
+    if has_search_index(conn):
+        expression = fts_match_expression(text)
+        if expression is not None:
+            return (f"{alias}.id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)", (expression,))
+    return (f"{alias}.name LIKE ?", (f"%{(text or '').strip()}%",))
+
+
+class _Repository:
+    """پایه مشترک مخزن‌ها: نگهداری اتصال و حافظه نهان متن دستورات"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._statements = {}
+
+    def _sql(self, key, build):
+        """دریافت متن SQL از حافظه نهان یا ساخت آن در اولین استفاده
+
+        ماژول sqlite3 دستورات آماده‌شده را بر اساس متن SQL نگه می‌دارد، پس
+        استفاده دوباره از یک متن یکسان از تجزیه مجدد دستور جلوگیری می‌کند.
+        """
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = build()
+            self._statements[key] = sql
+        return sql
+
+    def _cursor(self, row_factory=None):
+        cursor = self.conn.cursor()
+        cursor.row_factory = row_factory
+        return cursor
+
+
+class ProductRepository(_Repository):
+    """دسترسی به جدول محصولات"""
+
+    _select = f"SELECT {PRODUCT_SELECT} FROM {PRODUCTS_FROM}"
+
+    def get(self, product_id):
+        """دریافت یک محصول با شناسه
+
+        Returns:
+            ProductRow: محصول یا None در صورت عدم وجود
+        """
+        cursor = self._cursor(_product_factory)
+        cursor.execute(self._select + " WHERE p.id = ?", (product_id,))
+        return cursor.fetchone()
+
+    def get_many(self, ids):
+        """دریافت چند محصول با یک پرس‌وجو برای هر بخش از شناسه‌ها
+
+        Args:
+            ids (iterable): شناسه‌های محصولات
+
+        Returns:
+            dict: نگاشت شناسه به ProductRow (شناسه‌های ناموجود حذف می‌شوند)
+        """
+        ids = list(dict.fromkeys(int(i) for i in ids))
+        result = {}
+        if not ids:
+            return result
+
+        cursor = self._cursor(_product_factory)
+        for chunk, size in _chunks(ids):
+            sql = self._sql(('get_many', size), lambda: (
+                self._select + " WHERE p.id IN (" + ", ".join("?" * size) + ")"))
+            for row in cursor.execute(sql, chunk):
+                result[row.id] = row
+        return result
+
+    def get_by_barcode(self, barcode):
+        cursor = self._cursor(_product_factory)
+        cursor.execute(self._select + " WHERE p.barcode = ?", (barcode,))
+        return cursor.fetchone()
+
+    def search(self, text, limit=100):
+        """جستجوی محصولات با شاخص متن کامل، به ترتیب میزان تطابق
+
+        Returns:
+            list: فهرست ProductRow
+        """
+        query = search_query(self.conn, text, PRODUCT_SELECT, limit)
+        if query is None:
+            return []
+        cursor = self._cursor(_product_factory)
+        cursor.execute(*query)
+        return cursor.fetchall()
+
+    def find(self, text):
+        """یافتن بهترین محصول مطابق متن: ابتدا بارکد و شناسه دقیق، سپس جستجوی متنی
+
+        بارکدها معمولاً فقط رقم هستند، پس بارکد پیش از شناسه بررسی می‌شود تا بارکدی
+        که با شناسه محصول دیگری برابر است به آن محصول نرسد.
+        """
+        text = (text or '').strip()
+        product = self.get_by_barcode(text)
+        if product is not None:
+            return product
+        if text.isdigit():
+            product = self.get(int(text))
+            if product is not None:
+                return product
+        results = self.search(text, limit=1)
+        return results[0] if results else None
+
+    def ids_in_category(self, category_id):
+        """شناسه محصولات یک دسته‌بندی (بر اساس شناسه دسته‌بندی)"""
+        cursor = self._cursor()
+        cursor.execute("SELECT id FROM products WHERE category_id = ?", (category_id,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def update_many(self, column_values):
+        """به‌روزرسانی گروهی محصولات با یک دستور آماده‌شده
+
+        Args:
+            column_values (list): فهرست (شناسه، دیکشنری ستون به مقدار)؛ همه
+                دیکشنری‌ها باید ستون‌های یکسانی داشته باشند
+
+        Returns:
+            int: تعداد سطرهای به‌روزشده
+        """
+        if not column_values:
+            return 0
+
+        columns = tuple(sorted(column_values[0][1]))
+        for name in columns:
+            if name not in PRODUCT_COLUMNS or name == 'id':
+                raise ValueError(f"Unknown product column: {name}")
+
+        sql = self._sql(('update_many', columns), lambda: (
+            "UPDATE products SET " + ", ".join(f"{c} = ?" for c in columns) + " WHERE id = ?"))
+        params = [tuple(values[c] for c in columns) + (product_id,)
+                  for product_id, values in column_values]
+        cursor = self._cursor()
+        cursor.executemany(sql, params)
+        return cursor.rowcount
+
+    def adjust_stock(self, product_id, delta):
+        """تغییر موجودی یک محصول به صورت اتمی
+
+        Returns:
+            tuple: (موجودی قبلی، موجودی جدید) یا None اگر محصول وجود نداشته باشد
+        """
+        cursor = self._cursor()
+        cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        old_stock = row[0] or 0
+        new_stock = old_stock + delta
+        cursor.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
+        return old_stock, new_stock
+
+    def summary(self):
+        """آمار کلی محصولات از جدول خلاصه (یک سطر، مستقل از تعداد محصولات)"""
+        cursor = self._cursor(_summary_factory)
+        cursor.execute("SELECT NULL, " + ", ".join(SUMMARY_COLUMNS) + " FROM product_summary WHERE id = 1")
+        row = cursor.fetchone()
+        return row if row is not None else SummaryRow(None, *([0] * len(SUMMARY_COLUMNS)))
+
+    def category_summaries(self, include_empty=False):
+        """آمار هر دسته‌بندی به ترتیب نزولی تعداد محصولات
+
+        Args:
+            include_empty (bool): دسته‌بندی‌های بدون محصول نیز برگردانده شوند
+        """
+        columns = ", ".join(f"IFNULL(s.{c}, 0)" for c in SUMMARY_COLUMNS)
+        join = "LEFT JOIN" if include_empty else "JOIN"
+        cursor = self._cursor(_summary_factory)
+        cursor.execute(
+            f"SELECT c.name, {columns} FROM categories c {join} category_summary s ON s.category_id = c.id "
+            + ("" if include_empty else "WHERE s.product_count > 0 ")
+            + "ORDER BY IFNULL(s.product_count, 0) DESC"
+        )
+        return cursor.fetchall()
+
+    def price_range(self):
+        """کمترین و بیشترین قیمت (با استفاده از شاخص قیمت)"""
+        cursor = self._cursor()
+        # هر تجمیع در یک زیرپرس‌وجوی جدا تا SQLite فقط دو سر شاخص را بخواند
+        cursor.execute("SELECT (SELECT MIN(price) FROM products), (SELECT MAX(price) FROM products)")
+        return cursor.fetchone()
+
+    def clear_discount_prices(self):
+        # فقط محصولات تخفیف‌دار به‌روز می‌شوند تا تریگرها برای بقیه اجرا نشوند
+        self._cursor().execute("UPDATE products SET discount_price = NULL WHERE discount_price IS NOT NULL")
+
+    def apply_discount(self, ids, discount_type, discount_value):
+        """محاسبه و ذخیره قیمت تخفیف‌دار برای مجموعه‌ای از محصولات
+
+        محاسبه در خود SQLite و با یک دستور UPDATE برای هر بخش از شناسه‌ها انجام
+        می‌شود و نیازی به خواندن قیمت هر محصول به صورت جداگانه نیست.
+
+        Args:
+            ids (iterable): شناسه‌های محصولات
+            discount_type (str): "percentage" یا "fixed_amount"
+            discount_value (float): مقدار تخفیف
+
+        Returns:
+            int: تعداد محصولات به‌روزشده
+        """
+        ids = list(dict.fromkeys(int(i) for i in ids))
+        if not ids:
+            return 0
+
+        expression = _discount_expression(discount_type)
+
+        cursor = self._cursor()
+        updated = 0
+        for chunk, size in _chunks(ids):
+            sql = self._sql(('apply_discount', discount_type == "percentage", size), lambda: (
+                f"UPDATE products SET discount_price = {expression} "
+                "WHERE id IN (" + ", ".join("?" * size) + ")"))
+            cursor.execute(sql, [discount_value] + chunk)
+            updated += cursor.rowcount
+        return updated
+
+
+    def apply_category_discount(self, category_id, discount_type, discount_value):
+        """محاسبه قیمت تخفیف‌دار همه محصولات یک دسته‌بندی با یک دستور UPDATE
+
+        Returns:
+            int: تعداد محصولات به‌روزشده
+        """
+        expression = _discount_expression(discount_type)
+
+        cursor = self._cursor()
+        cursor.execute(
+            f"UPDATE products SET discount_price = {expression} WHERE category_id = ?",
+            (discount_value, category_id)
+        )
+        return cursor.rowcount
+
+
+class InventoryRepository(_Repository):
+    """دسترسی به تاریخچه موجودی"""
+
+    _insert = ("INSERT INTO inventory_history (product_id, change_amount, change_type, change_date, notes) "
+               "VALUES (?, ?, ?, ?, ?)")
+
+    def add(self, product_id, change_amount, change_type, notes=""):
+        self.add_many([(product_id, change_amount, change_type, notes)])
+
+    def add_many(self, entries):
+        """ثبت گروهی تغییرات موجودی
+
+        Args:
+            entries (iterable): فهرست (شناسه محصول، مقدار تغییر، نوع تغییر، توضیحات)
+        """
+        current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        params = [(product_id, amount, change_type, current_date, notes)
+                  for product_id, amount, change_type, notes in entries]
+        if params:
+            self._cursor().executemany(self._insert, params)
+
+    def history(self, product_id, limit=100):
+        """تاریخچه تغییرات موجودی یک محصول از جدیدترین به قدیمی‌ترین"""
+        cursor = self._cursor(_inventory_factory)
+        cursor.execute(
+            "SELECT " + ", ".join(INVENTORY_COLUMNS) + " FROM inventory_history "
+            "WHERE product_id = ? ORDER BY change_date DESC LIMIT ?",
+            (product_id, limit)
+        )
+        return cursor.fetchall()
@@ -0,0 +1,37 @@
+"""
+ابزارهای مشترک آزمون‌ها: پایگاه داده موقت روی فایل و ساخت فایل‌های CSV ورودی
+"""
+
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connection import ConnectionManager  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """مدیر اتصال یک پایگاه داده موقت با آخرین نسخه طرح"""
+    manager = ConnectionManager(str(tmp_path / "products.db"))
+    run_migrations(manager.writer)
+    manager.writer.commit()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """ساخت یک فایل CSV از سرستون‌ها و سطرها و برگرداندن مسیر آن"""
+    def write(header, rows, name="feed.csv"):
+        path = tmp_path / name
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return str(path)
+    return write
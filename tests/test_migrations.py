@@ -0,0 +1,67 @@
+"""
+آزمون مهاجرت‌های طرح پایگاه داده روی پایگاه داده خالی و پایگاه داده قدیمی
+"""
+
+import sqlite3
+
+from migrations import SCHEMA_VERSION, get_schema_version, run_migrations
+from repository import PRODUCTS_FROM, ProductRepository
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+
+
+def test_empty_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "empty.db"))
+
+    assert run_migrations(conn) == SCHEMA_VERSION
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    assert {'products', 'categories', 'inventory_history', 'category_summary', 'product_changes',
+            'import_jobs', 'products_search'} <= _tables(conn)
+
+    # اجرای دوباره فقط نسخه طرح را می‌خواند
+    assert run_migrations(conn) == SCHEMA_VERSION
+    conn.close()
+
+
+def test_legacy_database(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    # طرح نسخه‌های اولیه برنامه: دسته‌بندی فقط به صورت نام و بدون ستون‌های جدیدتر
+    conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, price REAL, category TEXT, image TEXT)")
+    conn.execute("CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("INSERT INTO categories (name) VALUES ('fruit')")
+    conn.executemany("INSERT INTO products (name, price, category, image) VALUES (?, ?, ?, '')",
+                     [('apple', 10, 'fruit'), ('milk', 5, 'dairy'), ('pear', 7, 'fruit'), ('salt', 1, None)])
+    conn.commit()
+    conn.close()
+
+    conn = sqlite3.connect(path)
+    assert run_migrations(conn) == SCHEMA_VERSION
+
+    # دسته‌بندی‌های موجود فقط در products ساخته و با category_id ارجاع داده می‌شوند
+    rows = conn.execute(f"SELECT p.name, c.name FROM {PRODUCTS_FROM} ORDER BY p.id").fetchall()
+    assert rows == [('apple', 'fruit'), ('milk', 'dairy'), ('pear', 'fruit'), ('salt', None)]
+
+    # جداول خلاصه از داده‌های موجود پر می‌شوند
+    summaries = {row.name: (row.product_count, row.price_sum) for row in ProductRepository(conn).category_summaries()}
+    assert summaries == {'fruit': (2, 17.0), 'dairy': (1, 5.0)}
+
+    # ستون‌های اضافه‌شده مقدار پیش‌فرض دارند
+    assert conn.execute("SELECT stock, min_stock FROM products WHERE name = 'apple'").fetchone() == (0, 5)
+    conn.close()
+
+
+def test_legacy_duplicate_barcodes(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, price REAL, category TEXT, barcode TEXT)")
+    conn.executemany("INSERT INTO products (name, price, barcode) VALUES (?, 1, ?)", [('a', 'B1'), ('b', 'B1')])
+    conn.commit()
+
+    # بارکد تکراری مانع باز شدن برنامه نمی‌شود؛ فقط شاخص یکتا ساخته نمی‌شود
+    assert run_migrations(conn) == SCHEMA_VERSION
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'idx_products_barcode_unique' not in indexes
+    conn.close()
@@ -0,0 +1,156 @@
+"""
+آزمون وارد کردن محصولات: لغو و ادامه از نقطه بازیابی، ادغام بر اساس بارکد و فایل سطرهای ردشده
+"""
+
+import csv
+import os
+
+import pytest
+
+from product_import import CsvSource, rejected_rows_path, run_import_job, unfinished_import
+from repository import PRODUCTS_FROM
+
+HEADER = ['name', 'price', 'category', 'stock', 'min_stock', 'barcode']
+
+
+class Cancelled(Exception):
+    pass
+
+
+class FakeJob:
+    """کار پس‌زمینه با همان رابط DatabaseJob که پس از چند بررسی لغو می‌شود"""
+
+    def __init__(self, cancel_after=None):
+        self.cancel_after = cancel_after
+        self.checks = 0
+
+    def check_cancelled(self):
+        self.checks += 1
+        if self.cancel_after is not None and self.checks > self.cancel_after:
+            raise Cancelled()
+
+    def report_progress(self, done, total):
+        pass
+
+
+def _import(manager, path, job=None, resume=None, merge=False, rejected=False, chunk_size=10):
+    with CsvSource(path, chunk_size=chunk_size) as source:
+        return run_import_job(manager, source, path, job, resume=resume, merge=merge, checkpoint_rows=10,
+                              checkpoint_seconds=60, rejected_path=rejected_rows_path(path) if rejected else None)
+
+
+def _products(manager):
+    with manager.reader() as conn:
+        return conn.execute(f"SELECT p.name, p.price, c.name, p.stock, p.barcode FROM {PRODUCTS_FROM} "
+                            "ORDER BY p.id").fetchall()
+
+
+def _feed(count):
+    rows = [[f"p{i}", i, f"c{i % 3}", i % 7, 1, f"B{i}"] for i in range(count)]
+    # سطرهای نامعتبر در میانه فایل
+    rows[12][1] = 'abc'
+    rows[25][0] = ''
+    rows[31][3] = -4
+    return rows
+
+
+def test_cancel_and_resume(manager, write_csv):
+    path = write_csv(HEADER, _feed(50))
+
+    # لغو در شروع سومین نقطه بازیابی (دو بررسی برای هر نقطه)
+    with pytest.raises(Cancelled):
+        _import(manager, path, FakeJob(cancel_after=4))
+
+    with manager.reader() as conn:
+        resume = unfinished_import(conn, path)
+    assert resume is not None
+    import_id, last_row = resume[:2]
+    # فقط سطرهای نقاط بازیابی ثبت‌شده باقی می‌مانند
+    assert last_row == 21
+    assert len(_products(manager)) == 19  # سطر 14 (قیمت نامعتبر) رد شده است
+    assert resume[2:5] == (20, 19, 1)
+
+    result = _import(manager, path, FakeJob(), resume=resume)
+    assert (result.total, result.imported, result.failed) == (50, 47, 3)
+
+    products = _products(manager)
+    assert [name for name, *_ in products] == [f"p{i}" for i in range(50) if i not in (12, 25, 31)]
+    with manager.reader() as conn:
+        assert unfinished_import(conn, path) is None
+        assert conn.execute("SELECT status, last_row, imported, failed FROM import_jobs WHERE id = ?",
+                            (import_id,)).fetchone() == ('done', 51, 47, 3)
+
+
+def test_resume_does_not_repeat_rejected_rows(manager, write_csv):
+    path = write_csv(HEADER, _feed(50))
+
+    with pytest.raises(Cancelled):
+        _import(manager, path, FakeJob(cancel_after=4), rejected=True)
+    with manager.reader() as conn:
+        resume = unfinished_import(conn, path)
+    result = _import(manager, path, FakeJob(), resume=resume, rejected=True)
+
+    assert result.rejected_path == rejected_rows_path(path)
+    with open(result.rejected_path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['row', 'reason'] + HEADER
+    # شماره سطر فایل (سرستون سطر 1 است)، دلیل و مقادیر اصلی، هر کدام فقط یک بار
+    assert [(row[0], row[2], row[3], row[5]) for row in rows[1:]] == [
+        ('14', 'p12', 'abc', '5'), ('27', '', '25', '4'), ('33', 'p31', '31', '-4')
+    ]
+    assert all(row[1] for row in rows[1:])
+
+
+def test_no_rejected_file_without_rejected_rows(manager, write_csv):
+    path = write_csv(HEADER, [['a', 1, 'x', 1, 1, 'B1']])
+    result = _import(manager, path, rejected=True)
+
+    assert result.rejected_path is None
+    assert not os.path.exists(rejected_rows_path(path))
+
+
+def test_merge_counts_and_inventory_history(manager, write_csv):
+    initial = write_csv(HEADER, [['apple', 10, 'fruit', 5, 1, 'B1'], ['milk', 4, 'dairy', 2, 1, 'B2'],
+                                 ['salt', 1, 'misc', 9, 1, 'B3']], name="initial.csv")
+    _import(manager, initial)
+    with manager.transaction() as conn:
+        conn.execute("UPDATE categories SET name = 'fresh fruit' WHERE name = 'fruit'")
+
+    # B1: تغییر قیمت و موجودی، B2: بدون تغییر (خانه خالی مقدار فعلی را نگه می‌دارد)،
+    # B3: فقط نام جدید دسته‌بندی تغییرنام‌یافته، B4: محصول جدید، B5: محصول جدید بدون قیمت
+    path = write_csv(['barcode', 'name', 'price', 'category', 'stock'], [
+        ['B1', 'apple', 12, 'fresh fruit', 8],
+        ['B2', '', '', 'dairy', 2],
+        ['B3', 'salt', 1, 'misc', 3],
+        ['B4', 'bread', 3, 'bakery', 4],
+        ['B5', 'jam', '', '', ''],
+    ], name="merge.csv")
+    result = _import(manager, path, merge=True)
+
+    assert (result.total, result.imported, result.updated, result.unchanged, result.failed) == (5, 1, 2, 1, 1)
+    assert _products(manager) == [
+        ('apple', 12.0, 'fresh fruit', 8, 'B1'),
+        ('milk', 4.0, 'dairy', 2, 'B2'),
+        ('salt', 1.0, 'misc', 3, 'B3'),
+        ('bread', 3.0, 'bakery', 4, 'B4'),
+    ]
+
+    with manager.reader() as conn:
+        history = conn.execute(
+            "SELECT p.barcode, h.change_amount, h.change_type FROM inventory_history h "
+            "JOIN products p ON p.id = h.product_id ORDER BY h.id"
+        ).fetchall()
+    # فقط تغییر موجودی محصولات موجود ثبت می‌شود
+    assert history == [('B1', 3, 'increase'), ('B3', 6, 'decrease')]
+
+
+def test_merge_unchanged_after_category_rename(manager, write_csv):
+    initial = write_csv(HEADER, [['apple', 10, 'fruit', 5, 1, 'B1']], name="initial.csv")
+    _import(manager, initial)
+    with manager.transaction() as conn:
+        conn.execute("UPDATE categories SET name = 'fresh fruit' WHERE name = 'fruit'")
+
+    path = write_csv(['barcode', 'name', 'category'], [['B1', 'apple', 'fresh fruit']], name="merge.csv")
+    result = _import(manager, path, merge=True)
+
+    assert (result.updated, result.unchanged) == (0, 1)
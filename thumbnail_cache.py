@@ -0,0 +1,131 @@
+"""
+ماژول حافظه نهان تصاویر کوچک‌شده محصولات
+برای هر تصویر اصلی چند نسخه کوچک‌شده (64، 200 و 800 پیکسل) در پوشه product_images/.thumbs
+ذخیره می‌شود تا گالری‌ها و فهرست‌ها به جای رمزگشایی عکس‌های چند مگاپیکسلی، فایل کوچکی بخوانند.
+کلید هر فایل از مسیر، زمان تغییر و اندازه تصویر اصلی ساخته می‌شود، پس تغییر تصویر اصلی
+به طور خودکار نسخه‌های جدید می‌سازد.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    ImageOps = None
+    PIL_AVAILABLE = False
+
+
+THUMBNAIL_DIR = os.path.join('product_images', '.thumbs')
+
+# اندازه‌های ذخیره‌شده (بیشترین ضلع به پیکسل)، از کوچک به بزرگ
+THUMBNAIL_SIZES = (64, 200, 800)
+
+JPEG_QUALITY = 85
+
+
+def thumbnail_size(size):
+    """کوچک‌ترین اندازه ذخیره‌شده که از اندازه درخواستی کوچک‌تر نباشد"""
+    for candidate in THUMBNAIL_SIZES:
+        if candidate >= size:
+            return candidate
+    return THUMBNAIL_SIZES[-1]
+
+
+def _thumbnail_base(image_path, stat):
+    """مسیر فایل نسخه کوچک‌شده بدون اندازه و پسوند"""
+    key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return digest[:2], digest
+
+
+def _existing(directory, digest):
+    for extension in ('.jpg', '.png'):
+        path = os.path.join(directory, digest + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _save(image, path):
+    """ذخیره اتمی (فایل موقت و جایگزینی) تا خواننده‌ها هرگز فایل نیمه‌کاره نبینند"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if path.endswith('.png'):
+                image.save(f, 'PNG', optimize=False)
+            else:
+                image.save(f, 'JPEG', quality=JPEG_QUALITY)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _generate(image_path, prefix, digest):
+    """ساخت همه اندازه‌ها با یک بار رمزگشایی تصویر اصلی"""
+    with Image.open(image_path) as image:
+        # رمزگشایی JPEG با مقیاس کوچک‌تر (تا دو برابر بزرگ‌ترین اندازه) بسیار سریع‌تر است
+        largest = THUMBNAIL_SIZES[-1]
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        extension = '.png' if has_alpha else '.jpg'
+
+        paths = {}
+        # هر اندازه از اندازه بزرگ‌تر قبلی ساخته می‌شود
+        for size in reversed(THUMBNAIL_SIZES):
+            image.thumbnail((size, size), Image.LANCZOS)
+            path = os.path.join(THUMBNAIL_DIR, str(size), prefix, digest + extension)
+            _save(image, path)
+            paths[size] = path
+        return paths
+
+
+def get_thumbnail(image_path, size=200):
+    """مسیر نسخه کوچک‌شده یک تصویر، در صورت نیاز با ساخت آن
+
+    Args:
+        image_path (str): مسیر تصویر اصلی
+        size (int): بیشترین ضلع مورد نیاز به پیکسل؛ نزدیک‌ترین اندازه بزرگ‌تر از
+            THUMBNAIL_SIZES برگردانده می‌شود
+
+    Returns:
+        str: مسیر فایل قابل نمایش؛ اگر Pillow نصب نباشد یا تصویر خوانده نشود خود
+            تصویر اصلی برگردانده می‌شود و اگر تصویر وجود نداشته باشد None
+    """
+    if not image_path:
+        return None
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return None
+    if not PIL_AVAILABLE:
+        return image_path
+
+    size = thumbnail_size(size)
+    prefix, digest = _thumbnail_base(image_path, stat)
+    path = _existing(os.path.join(THUMBNAIL_DIR, str(size), prefix), digest)
+    if path is not None:
+        return path
+
+    try:
+        return _generate(image_path, prefix, digest)[size]
+    except Exception as e:
+        print(f"Error creating thumbnail for {image_path}: {e}")
+        return image_path
+
+
+def clear_thumbnails():
+    """حذف همه نسخه‌های کوچک‌شده (در استفاده بعدی دوباره ساخته می‌شوند)"""
+    if os.path.exists(THUMBNAIL_DIR):
+        shutil.rmtree(THUMBNAIL_DIR)